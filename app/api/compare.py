@@ -1,28 +1,238 @@
 """Compare endpoint for image quality metrics."""
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, status
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from PIL import Image
-from pathlib import Path
 import io
 
 from app.db import get_db, settings
+from app.executor import run_compare, memory_budget, compare_limiter, Overloaded
 from app.models import Asset, Rendition
-from app.utils import compare_images, RENDITION_PRESETS
-from app.hashing import compute_perceptual_hash
+from app.quality import METRICS, compare as compare_metrics, compare_batch as compare_metrics_batch, evaluation_size
+from app.renditions import load_image_reduced, probe_source, estimate_render_bytes, decoded_bytes
+from app.storage import storage
+from app.utils import compare_images
+from app.hashing import compute_perceptual_hash, compute_perceptual_hashes, hash_distance
 
 router = APIRouter(prefix="/compare", tags=["compare"])
 
+MAX_BATCH_ASSETS = 100
+
+
+def _max_side(requested: Optional[int]) -> int:
+    """Metric resolution for a request: the requested side, capped at COMPARE_MAX_SIDE."""
+    return min(requested or settings.compare_max_side, settings.compare_max_side)
+
+
+@asynccontextmanager
+async def _compare_slot():
+    """
+    Hold a compare slot, or answer 429 with Retry-After when the queue is full.
+    Yields hold(future) for compare work left running when the request returns.
+    """
+    try:
+        async with compare_limiter.slot() as hold:
+            yield hold
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many compare requests in progress",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+
+def _fingerprint_upload(content: bytes, max_side: int) -> tuple:
+    """
+    Decode the upload once: average hash, pHash, and a copy scaled to fit
+    max_side that metrics are computed against.
+    """
+    image = Image.open(io.BytesIO(content))
+    image.draft("RGB", (max_side, max_side))
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    image.load()
+    perceptual_hash = compute_perceptual_hash(image)
+    phash = compute_perceptual_hashes(image)["phash"]
+    image.thumbnail((max_side, max_side), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    return image, perceptual_hash, phash
+
+
+def _score_original(relative_path: str, size: tuple, upload: Image.Image, metrics: List[str],
+                    deadline: float) -> Optional[dict]:
+    """
+    Decode an original (reduced towards size) and score the upload against it;
+    None if the time budget ran out while this waited for a pool thread.
+    """
+    if time.monotonic() >= deadline:
+        return None
+    reference = load_image_reduced(relative_path, size)
+    return compare_metrics(reference, upload, metrics, max(size))
+
+
+def _compare_original(relative_path: str, size: tuple, upload: Image.Image,
+                      original_hash: str, uploaded_hash: str) -> dict:
+    reference = load_image_reduced(relative_path, size)
+    return compare_images(reference, upload, original_hash, uploaded_hash, max(size))
+
+
+def _score_renditions(relative_paths: List[str], upload: Image.Image, max_side: int) -> List[tuple]:
+    """
+    (PSNR of each rendition vs the upload, its perceptual hash), with the
+    PSNRs computed in one batched metrics call.
+    """
+    images = []
+    for relative_path in relative_paths:
+        image = Image.open(io.BytesIO(storage.read_file(relative_path)))
+        images.append(image if image.mode in ("RGB", "L") else image.convert("RGB"))
+    scores = compare_metrics_batch([(upload, image) for image in images], ("psnr",), max_side)
+    return [(score["psnr"], compute_perceptual_hash(image)) for score, image in zip(scores, images)]
+
+
+async def _score_candidate(asset: Asset, upload: Image.Image, metrics: List[str], max_side: int,
+                           deadline: float) -> Optional[dict]:
+    relative_path = asset.original_file
+    size = evaluation_size((asset.width, asset.height), max_side)
+    draft_size, mode = await run_compare(probe_source, relative_path, size)
+    # Held until the pool thread is done with the decode, even past the deadline
+    async with memory_budget.reserve(estimate_render_bytes(draft_size, mode, size)):
+        return await run_compare(_score_original, relative_path, size, upload, metrics, deadline)
+
+
+async def _score_candidates(requested, assets, upload, uploaded_hash, uploaded_phash,
+                            max_distance, metric_names, max_side, budget, hold=None) -> dict:
+    """
+    Hash pre-filter, then score the survivors in parallel until budget
+    (seconds) runs out. Scores still running then are reported as skipped but
+    not cancelled: cancelling would only stop the await, not the pool thread,
+    and drop its memory reservation early. They finish (or, if their thread
+    hasn't started, return at once) in the background; each is passed to
+    hold, so the request's compare slot stays taken until they are done.
+    """
+    deadline = time.monotonic() + max(budget, 0)
+    results = {}
+    tasks = {}
+    for asset_id in requested:
+        asset = assets.get(asset_id)
+        if asset is None:
+            results[asset_id] = {"asset_id": asset_id, "skipped": "not found"}
+            continue
+        entry = {
+            "asset_id": asset_id,
+            "perceptual_hash_distance": hash_distance(uploaded_hash, asset.perceptual_hash),
+        }
+        if asset.phash is not None:
+            entry["phash_distance"] = ((asset.phash ^ uploaded_phash) & ((1 << 64) - 1)).bit_count()
+        results[asset_id] = entry
+        if entry["perceptual_hash_distance"] > max_distance:
+            entry["skipped"] = "hash distance above max_distance"
+        else:
+            tasks[asyncio.ensure_future(_score_candidate(asset, upload, metric_names, max_side, deadline))] = entry
+
+    if tasks:
+        done, pending = await asyncio.wait(tasks, timeout=max(deadline - time.monotonic(), 0))
+        for task in pending:
+            # Nobody awaits these any more; retrieve their errors so they aren't logged
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            if hold is not None:
+                hold(task)
+            tasks[task]["skipped"] = "time budget exceeded"
+        for task in done:
+            entry = tasks[task]
+            try:
+                scores = task.result()
+            except Exception as e:
+                entry["skipped"] = f"scoring failed: {e}"
+                continue
+            if scores is None:
+                entry["skipped"] = "time budget exceeded"
+                continue
+            entry.update({("psnr_db" if name == "psnr" else name): value for name, value in scores.items()})
+    return results
+
+
+@router.post("/batch")
+async def compare_batch(
+    file: UploadFile = File(...),
+    asset_ids: List[int] = Query(..., description="Candidate assets (repeat the parameter)"),
+    max_distance: int = Query(10, ge=0, le=64, description="Only score candidates within this perceptual hash distance"),
+    metrics: str = Query("psnr,ssim", description="Comma-separated: psnr, ssim, ms_ssim"),
+    time_budget: float = Query(None, gt=0, description="Seconds to spend scoring (capped at COMPARE_TIME_BUDGET)"),
+    max_side: Optional[int] = Query(None, ge=16, description="Longest side metrics are evaluated at (capped at COMPARE_MAX_SIDE)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Compare one uploaded image against many candidate assets.
+    The upload is decoded and fingerprinted once. Candidates whose perceptual
+    hash is further than max_distance are reported without pixel metrics;
+    the rest are scored against their originals in parallel on the compare pool.
+    Candidates not scored within the time budget are reported as skipped.
+    Answers 429 with Retry-After when too many compares are queued.
+    """
+    requested = list(dict.fromkeys(asset_ids))
+    if len(requested) > MAX_BATCH_ASSETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_ASSETS} assets per batch"
+        )
+    metric_names = [m.strip() for m in metrics.split(",") if m.strip()]
+    unknown = [m for m in metric_names if m not in METRICS]
+    if unknown or not metric_names:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"metrics must be a comma-separated subset of {', '.join(METRICS)}"
+        )
+    budget = min(time_budget or settings.compare_time_budget, settings.compare_time_budget)
+    max_side = _max_side(max_side)
+
+    content = await file.read()
+    result = await db.execute(select(Asset).where(Asset.id.in_(requested)))
+    assets = {asset.id: asset for asset in result.scalars().all()}
+
+    async with _compare_slot() as hold:
+        # The time budget starts once the request is admitted
+        started = time.monotonic()
+        try:
+            upload, uploaded_hash, uploaded_phash = await run_compare(_fingerprint_upload, content, max_side)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid image file: {str(e)}"
+            )
+        results = await _score_candidates(
+            requested, assets, upload, uploaded_hash, uploaded_phash,
+            max_distance, metric_names, max_side, budget - (time.monotonic() - started), hold
+        )
+
+    ordered = sorted(results.values(), key=lambda r: (r.get("perceptual_hash_distance", 65), r["asset_id"]))
+    return {
+        "perceptual_hash": uploaded_hash,
+        "candidates": len(requested),
+        "scored": sum(1 for r in ordered if "skipped" not in r),
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+        "results": ordered,
+    }
+
 
 @router.post("/{asset_id}")
 async def compare_image(
     asset_id: int,
     file: UploadFile = File(...),
+    max_side: Optional[int] = Query(None, ge=16, description="Longest side metrics are evaluated at (capped at COMPARE_MAX_SIDE)"),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Compare uploaded image against renditions of an asset.
-    Returns per-preset file size and quality metrics (PSNR + perceptual hash distance).
+    Compare uploaded image against an asset and its renditions.
+    Returns file size and quality metrics: PSNR, SSIM and hash distance of the
+    upload vs the original; per rendition, its stored size, PSNR and hash
+    distance vs the upload, and the render-time PSNR (vs its resized source)
+    stored on the row.
+    Decoding and metrics run on the compare pool; answers 429 with
+    Retry-After when too many compares are queued.
     """
     # Get asset
     result = await db.execute(
@@ -36,78 +246,67 @@ async def compare_image(
             detail=f"Asset {asset_id} not found"
         )
     
-    # Read uploaded image
-    content = await file.read()
-    try:
-        uploaded_image = Image.open(io.BytesIO(content))
-        if uploaded_image.mode not in ("RGB", "RGBA"):
-            uploaded_image = uploaded_image.convert("RGB")
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid image file: {str(e)}"
-        )
-    
-    # Get original asset image
-    from app.storage import storage
-    original_path = f"originals/{asset.filename}"
+    original_path = asset.original_file
     if not storage.file_exists(original_path):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Original asset file not found"
         )
     
-    original_bytes = storage.read_file(original_path)
-    original_image = Image.open(io.BytesIO(original_bytes))
-    if original_image.mode not in ("RGB", "RGBA"):
-        original_image = original_image.convert("RGB")
-    
     # Get renditions
     result = await db.execute(
         select(Rendition).where(Rendition.asset_id == asset_id)
     )
     renditions = result.scalars().all()
     
-    # Compare uploaded image with original
-    uploaded_hash = compute_perceptual_hash(uploaded_image)
-    original_hash = asset.perceptual_hash
-    
+    content = await file.read()
+    max_side = _max_side(max_side)
     comparison_results = {}
     
-    # Compare with original
-    original_comparison = compare_images(
-        original_image, uploaded_image, original_hash, uploaded_hash
-    )
-    comparison_results["original"] = {
-        "file_size_bytes": len(content),
-        **original_comparison
-    }
-    
-    # Compare with each rendition
-    for rendition in renditions:
-        rendition_path = Path(settings.storage_path) / rendition.file_path
-        if not rendition_path.exists():
-            continue
-        
-        rendition_bytes = rendition_path.read_bytes()
-        rendition_image = Image.open(io.BytesIO(rendition_bytes))
-        if rendition_image.mode not in ("RGB", "RGBA"):
-            rendition_image = rendition_image.convert("RGB")
-        
-        rendition_hash = compute_perceptual_hash(rendition_image)
+    async with _compare_slot():
+        # Read uploaded image
+        try:
+            uploaded_image, uploaded_hash, _ = await run_compare(_fingerprint_upload, content, max_side)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid image file: {str(e)}"
+            )
         
-        comparison = compare_images(
-            uploaded_image, rendition_image, uploaded_hash, rendition_hash
-        )
-        
-        comparison_results[rendition.preset] = {
-            "file_size_bytes": rendition.bytes,
-            **comparison
+        # Compare with original (decoded reduced to the evaluation size)
+        size = evaluation_size((asset.width, asset.height), max_side)
+        draft_size, mode = await run_compare(probe_source, original_path, size)
+        async with memory_budget.reserve(estimate_render_bytes(draft_size, mode, size)):
+            original_comparison = await run_compare(
+                _compare_original, original_path, size, uploaded_image, asset.perceptual_hash, uploaded_hash
+            )
+        comparison_results["original"] = {
+            "file_size_bytes": len(content),
+            **original_comparison
         }
+        
+        # Renditions are decoded and scored against the upload in one batch
+        renditions = [r for r in renditions if storage.file_exists(r.file_path)]
+        scores = []
+        if renditions:
+            reserved = sum(decoded_bytes((r.width, r.height), "RGB") for r in renditions)
+            async with memory_budget.reserve(reserved):
+                scores = await run_compare(
+                    _score_renditions, [r.file_path for r in renditions], uploaded_image, max_side
+                )
+        for rendition, (psnr_db, file_hash) in zip(renditions, scores):
+            # JPEG keeps the plain preset key; other formats are suffixed
+            key = rendition.preset if rendition.format == "jpeg" else f"{rendition.preset}_{rendition.format}"
+            comparison_results[key] = {
+                "file_size_bytes": rendition.bytes,
+                "psnr_db": psnr_db,
+                "render_psnr_db": rendition.psnr_db,
+                "perceptual_hash_distance": hash_distance(uploaded_hash, rendition.perceptual_hash or file_hash),
+            }
     
     return {
         "asset_id": asset_id,
         "comparisons": comparison_results,
-        "note": "PSNR > 30 dB indicates good quality. Lower perceptual_hash_distance = more similar."
+        "note": "PSNR > 30 dB indicates good quality (render_psnr_db: rendition vs its resized source). "
+                "Lower perceptual_hash_distance = more similar."
     }
-
@@ -1,63 +1,112 @@
 """Metrics endpoint for tenant usage statistics."""
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select
 
 from app.db import get_db
-from app.models import Tenant, Asset, Rendition, TenantMetrics
+from app.models import Tenant
+from app.tenant_metrics import tenant_metrics_query, tenant_counters_query
+from app.usage import usage_buckets, as_utc, GRANULARITIES, COUNTERS, HOUR
 
 router = APIRouter(prefix="/metrics", tags=["metrics"])
 
+EXACT_DESCRIPTION = "Recompute from the assets/renditions tables instead of reading the maintained counters"
 
 
+def _metrics_row(row) -> dict:
+    return {
+        "tenant_id": row.id,
+        "tenant_name": row.name,
+        "asset_count": row.asset_count,
+        "rendition_count": row.rendition_count,
+        "total_bytes": row.total_bytes
+    }
 
 
 @router.get("/")
 async def get_all_metrics(
+    after: int = Query(0, ge=0, description="Return tenants with id greater than this (next_after of the previous page)"),
+    limit: int = Query(100, ge=1, le=1000),
+    exact: bool = Query(False, description=EXACT_DESCRIPTION),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get metrics for all tenants."""
-    # Get all tenants
-    result = await db.execute(select(Tenant))
-    tenants = result.scalars().all()
-    
-    metrics = []
-    for tenant in tenants:
-        # Count assets
-        result = await db.execute(
-            select(func.count(Asset.id)).where(Asset.tenant_id == tenant.id)
-        )
-        asset_count = result.scalar_one()
-        
-        # Count renditions
-        result = await db.execute(
-            select(func.count(Rendition.id))
-            .join(Asset)
-            .where(Asset.tenant_id == tenant.id)
-        )
-        rendition_count = result.scalar_one()
-        
-        # Sum bytes
-        result = await db.execute(
-            select(func.sum(Asset.original_bytes)).where(Asset.tenant_id == tenant.id)
-        )
-        asset_bytes = result.scalar_one() or 0
-        
-        result = await db.execute(
-            select(func.sum(Rendition.bytes))
-            .join(Asset)
-            .where(Asset.tenant_id == tenant.id)
+    """
+    Get metrics for all tenants, a page at a time (ordered by tenant id).
+    Reads the incrementally maintained TenantMetrics counters; exact=true
+    aggregates the page's tenants instead (one query either way).
+    """
+    page = (
+        select(Tenant.id, Tenant.name)
+        .where(Tenant.id > after)
+        .order_by(Tenant.id)
+        .limit(limit)
+        .subquery()
+    )
+    query = tenant_metrics_query(page) if exact else tenant_counters_query(page)
+    result = await db.execute(query)
+    metrics = [_metrics_row(row) for row in result.all()]
+
+    return {
+        "tenants": metrics,
+        "next_after": metrics[-1]["tenant_id"] if len(metrics) == limit else None
+    }
+
+
+@router.get("/tenant/{tenant_name}")
+async def get_tenant_metrics(
+    tenant_name: str,
+    exact: bool = Query(False, description=EXACT_DESCRIPTION),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get metrics for one tenant. Tenants are created by their first upload,
+    so an unknown name reports zero usage.
+    """
+    tenant = select(Tenant.id, Tenant.name).where(Tenant.name == tenant_name).subquery()
+    query = tenant_metrics_query(tenant) if exact else tenant_counters_query(tenant)
+    result = await db.execute(query)
+    row = result.one_or_none()
+    if row is None:
+        return {"tenant_id": None, "tenant_name": tenant_name, "asset_count": 0, "rendition_count": 0, "total_bytes": 0}
+    return _metrics_row(row)
+
+
+@router.get("/usage/{tenant_name}")
+async def get_tenant_usage(
+    tenant_name: str,
+    granularity: str = Query(HOUR, description="hour or day"),
+    start: Optional[datetime] = Query(None, description="Range start (UTC if no offset); default one day/month before end"),
+    end: Optional[datetime] = Query(None, description="Range end, exclusive (UTC if no offset); default now"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Usage of one tenant over time: uploads, renditions created, bytes stored
+    and CPU seconds per bucket, oldest first (empty buckets are omitted).
+    Hourly buckets are kept for USAGE_HOURLY_DAYS days, then folded into
+    days; the last USAGE_FLUSH_INTERVAL seconds may not be written yet.
+    """
+    if granularity not in GRANULARITIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"granularity must be one of: {', '.join(GRANULARITIES)}"
         )
-        rendition_bytes = result.scalar_one() or 0
-        
-        metrics.append({
-            "tenant_id": tenant.id,
-            "tenant_name": tenant.name,
-            "asset_count": asset_count,
-            "rendition_count": rendition_count,
-            "total_bytes": asset_bytes + rendition_bytes
-        })
-    
-    return {"tenants": metrics}
+    end = as_utc(end) if end else datetime.now(timezone.utc)
+    start = as_utc(start) if start else end - (timedelta(days=1) if granularity == HOUR else timedelta(days=30))
+    if start >= end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must be before end")
+
+    tenant_id = (await db.execute(select(Tenant.id).where(Tenant.name == tenant_name))).scalar_one_or_none()
+    buckets = await usage_buckets(db, tenant_id, start, end, granularity) if tenant_id is not None else []
 
+    return {
+        "tenant_id": tenant_id,
+        "tenant_name": tenant_name,
+        "granularity": granularity,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "buckets": [{**bucket, "bucket_start": bucket["bucket_start"].isoformat()} for bucket in buckets],
+        "totals": {name: sum(bucket[name] for bucket in buckets) for name in COUNTERS}
+    }
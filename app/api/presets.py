@@ -0,0 +1,141 @@
+"""Preset endpoints for managing global and per-tenant rendition presets."""
+import re
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app.db import get_db
+from app.models import RenditionPreset, Tenant
+from app.presets import preset_registry
+from app.schemas import PresetRequest
+from app.utils import ENCODER_PROFILES
+
+router = APIRouter(prefix="/presets", tags=["presets"])
+
+# Preset names end up in file names, so keep them simple
+PRESET_NAME = re.compile(r"^[a-z0-9_-]{1,32}$")
+
+
+async def _get_tenant_id(db: AsyncSession, tenant_name: Optional[str]) -> Optional[int]:
+    """Resolve tenant_name to an id (None = global defaults)."""
+    if tenant_name is None:
+        return None
+    result = await db.execute(
+        select(Tenant.id).where(Tenant.name == tenant_name)
+    )
+    tenant_id = result.scalar_one_or_none()
+    if tenant_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Tenant {tenant_name} not found"
+        )
+    return tenant_id
+
+
+async def _get_row(db: AsyncSession, tenant_id: Optional[int], name: str) -> Optional[RenditionPreset]:
+    tenant_filter = (
+        RenditionPreset.tenant_id.is_(None) if tenant_id is None
+        else RenditionPreset.tenant_id == tenant_id
+    )
+    result = await db.execute(
+        select(RenditionPreset).where(tenant_filter, RenditionPreset.name == name)
+    )
+    return result.scalars().first()
+
+
+@router.get("/")
+async def list_presets(
+    tenant_name: Optional[str] = Query(None, description="Tenant to resolve presets for (omit for global defaults)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """List the effective presets for a tenant (built-ins + global + tenant overrides)."""
+    tenant_id = await _get_tenant_id(db, tenant_name)
+    presets = await preset_registry.get_presets(db, tenant_id)
+    return {
+        "tenant_name": tenant_name,
+        "presets": {
+            name: {
+                "width": config["size"][0],
+                "height": config["size"][1],
+                "fit": config["fit"],
+                "profile": config.get("profile", "balanced"),
+                "max_bytes": config.get("max_bytes"),
+            }
+            for name, config in presets.items()
+        }
+    }
+
+
+@router.put("/{name}")
+async def put_preset(
+    name: str,
+    preset: PresetRequest,
+    tenant_name: Optional[str] = Query(None, description="Tenant override (omit to change the global default)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Create or update a preset. enabled=false hides an inherited preset for the tenant."""
+    if not PRESET_NAME.match(name):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Preset name must match [a-z0-9_-]{1,32}"
+        )
+    if preset.profile not in ENCODER_PROFILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid profile. Must be one of: {list(ENCODER_PROFILES.keys())}"
+        )
+    if preset.width <= 0 or preset.height <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="width and height must be positive"
+        )
+
+    tenant_id = await _get_tenant_id(db, tenant_name)
+    row = await _get_row(db, tenant_id, name)
+    if not row:
+        row = RenditionPreset(tenant_id=tenant_id, name=name)
+        db.add(row)
+
+    row.width = preset.width
+    row.height = preset.height
+    row.fit = preset.fit
+    row.profile = preset.profile
+    row.max_bytes = preset.max_bytes
+    row.enabled = preset.enabled
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Another request created the same preset between _get_row and commit
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Preset {name} was saved concurrently, retry"
+        )
+
+    await preset_registry.notify_change(tenant_id)
+    return {"name": name, "tenant_name": tenant_name, "status": "saved"}
+
+
+@router.delete("/{name}")
+async def delete_preset(
+    name: str,
+    tenant_name: Optional[str] = Query(None, description="Tenant override to remove (omit for the global default)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Delete a preset override so the inherited definition applies again."""
+    tenant_id = await _get_tenant_id(db, tenant_name)
+    row = await _get_row(db, tenant_id, name)
+    if not row:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Preset {name} not found"
+        )
+
+    await db.delete(row)
+    await db.commit()
+
+    await preset_registry.notify_change(tenant_id)
+    return {"name": name, "tenant_name": tenant_name, "status": "deleted"}
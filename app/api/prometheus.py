@@ -0,0 +1,54 @@
+"""Prometheus exposition endpoint: HTTP metrics, job queue and DB pool stats."""
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.db import engine
+from app.queue_stats import queue_stats
+from app.telemetry import render_http_metrics, metric_family
+
+router = APIRouter(tags=["monitoring"])
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _job_lines(stats: dict) -> list:
+    lines = metric_family("jobs", "gauge", "Rendition jobs by status", [
+        ({"status": job_status}, count) for job_status, count in stats["counts"].items()
+    ])
+    lines += metric_family(
+        "jobs_oldest_pending_age_seconds", "gauge", "Age of the oldest pending job (0 if none)",
+        [({}, stats["oldest_pending_age_seconds"] or 0.0)]
+    )
+    lines += metric_family(
+        "jobs_oldest_processing_age_seconds", "gauge", "Time the longest-running job has been processing (0 if none)",
+        [({}, stats["oldest_processing_age_seconds"] or 0.0)]
+    )
+    return lines
+
+
+def _pool_lines() -> list:
+    pool = engine.sync_engine.pool
+    # QueuePool-style pools only (NullPool/StaticPool keep no statistics)
+    stats = {
+        "size": "Configured connection pool size",
+        "checkedout": "Connections in use",
+        "checkedin": "Idle connections in the pool",
+        "overflow": "Connections beyond the pool size (negative while below it)",
+    }
+    lines = []
+    for name, help in stats.items():
+        if hasattr(pool, name):
+            lines += metric_family(f"db_pool_{name}", "gauge", help, [({}, getattr(pool, name)())])
+    return lines
+
+
+@router.get("/prometheus")
+async def prometheus_metrics():
+    """
+    Metrics in Prometheus text format. HTTP metrics are per process; job
+    gauges come from the cached queue stats (see /queue).
+    """
+    lines = render_http_metrics()
+    lines += _job_lines(await queue_stats.get())
+    lines += _pool_lines()
+    return Response(content="\n".join(lines) + "\n", media_type=CONTENT_TYPE)
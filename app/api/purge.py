@@ -7,6 +7,7 @@ from datetime import datetime, timedelta
 from app.db import get_db, settings
 from app.models import Rendition, Asset
 from app.storage import storage
+from app.variants import variant_cache
 
 router = APIRouter(prefix="/purge", tags=["purge"])
 
@@ -20,6 +21,7 @@ async def purge_renditions(
     """
     Safely purge unreferenced renditions older than specified days.
     Only deletes renditions that are not referenced by any asset.
+    Cached resize variants of assets that no longer exist go too, whatever their age.
     """
     purge_days = days or settings.purge_days
     cutoff_date = datetime.utcnow() - timedelta(days=purge_days)
@@ -49,11 +51,33 @@ async def purge_renditions(
     deleted_bytes = 0
     errors = []
     
+    # Files still referenced by renditions we keep (linked perceptual duplicates)
+    shared_paths = set()
+    if to_delete:
+        result = await db.execute(
+            select(Rendition.file_path).where(
+                Rendition.file_path.in_({r.file_path for r in to_delete}),
+                Rendition.id.notin_([r.id for r in to_delete])
+            )
+        )
+        shared_paths = set(result.scalars().all())
+    
+    # Variant file names start with their asset id (VariantSpec.cache_name)
+    await variant_cache.load()
+    variant_asset_ids = variant_cache.asset_ids()
+    orphaned_variants = []
+    if variant_asset_ids:
+        result = await db.execute(
+            select(Asset.id).where(Asset.id.in_(variant_asset_ids))
+        )
+        orphaned_variants = variant_cache.variants_of(variant_asset_ids - set(result.scalars().all()))
+    
     if not dry_run:
+        variant_bytes = variant_cache.remove(name for name, _ in orphaned_variants)
         for rendition in to_delete:
             try:
-                # Delete file from storage
-                if storage.delete_file(rendition.file_path):
+                # Delete file from storage (unless another rendition row shares it)
+                if rendition.file_path not in shared_paths and storage.delete_file(rendition.file_path):
                     deleted_bytes += rendition.bytes
                 
                 # Delete database record
@@ -66,7 +90,9 @@ async def purge_renditions(
     else:
         # Dry run - just calculate
         deleted_count = len(to_delete)
-        deleted_bytes = sum(r.bytes for r in to_delete)
+        deletable = {r.file_path: r.bytes for r in to_delete if r.file_path not in shared_paths}
+        deleted_bytes = sum(deletable.values())
+        variant_bytes = sum(size for _, size in orphaned_variants)
     
     return {
         "dry_run": dry_run,
@@ -76,6 +102,8 @@ async def purge_renditions(
         "renditions_to_delete": len(to_delete),
         "deleted_count": deleted_count,
         "deleted_bytes": deleted_bytes,
+        "variants_deleted": len(orphaned_variants),
+        "variant_bytes": variant_bytes,
         "errors": errors if errors else None
     }
 
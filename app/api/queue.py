@@ -0,0 +1,17 @@
+"""Job queue depth and lag endpoint."""
+from fastapi import APIRouter
+
+from app.queue_stats import queue_stats
+
+router = APIRouter(prefix="/queue", tags=["queue"])
+
+
+@router.get("/")
+async def get_queue_stats():
+    """
+    Job counts by status, oldest pending and processing job ages, the
+    tenants with the largest backlog, and throughput and permanent failure
+    rate over the last five minutes. Cached for QUEUE_STATS_TTL seconds
+    (see generated_at), so it is cheap to poll.
+    """
+    return await queue_stats.get()
@@ -0,0 +1,109 @@
+"""Dynamic resize endpoint with a derived-variant cache."""
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from starlette.background import BackgroundTask
+
+from app.db import get_db
+from app.models import Asset, Rendition
+from app.storage import storage
+from app.executor import run_cpu
+from app.responses import RangeFileResponse
+from app.singleflight import SingleFlight
+from app.variants import validate_spec, choose_source, render_variant, variant_cache
+
+router = APIRouter(prefix="/resize", tags=["resize"])
+
+# Variants are immutable per (asset, parameters), so CDNs may cache them forever
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_variant_flight = SingleFlight()
+
+
+def _pinned_response(name: str, relative_path: str, media_type: str, headers: dict) -> RangeFileResponse:
+    """Serve a variant pinned by variant_cache.acquire(); the pin is released once the response is done."""
+    try:
+        return RangeFileResponse(
+            path=str(storage.local_path(relative_path)),
+            media_type=media_type,
+            headers=headers,
+            background=BackgroundTask(variant_cache.release, name)
+        )
+    except BaseException:
+        variant_cache.release(name)
+        raise
+
+
+@router.get("/{asset_id}")
+async def resize_image(
+    asset_id: int,
+    w: Optional[int] = Query(None, description="Target width (must be in the allow-list)"),
+    h: Optional[int] = Query(None, description="Target height (must be in the allow-list)"),
+    fit: str = Query("contain", description="contain (fit inside box) or cover (fill and crop)"),
+    format: str = Query("jpeg", description="jpeg, webp or png"),
+    q: int = Query(85, description="Encoder quality (must be in the allow-list)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Serve a dynamically resized variant of an asset.
+    Renders from the smallest existing rendition that is large enough (falling
+    back to the original) and caches the result in storage with LRU eviction.
+    """
+    try:
+        spec = validate_spec(w, h, fit=fit, format=format, quality=q)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    name = spec.cache_name(asset_id)
+    headers = {"Cache-Control": CACHE_CONTROL}
+    await variant_cache.load()
+
+    result = await db.execute(
+        select(Asset).where(Asset.id == asset_id)
+    )
+    asset = result.scalar_one_or_none()
+
+    if not asset:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Asset {asset_id} not found"
+        )
+
+    # Cache hit: no decode (and the variant stays on disk while it is sent)
+    cached_path = variant_cache.acquire(name)
+    if cached_path:
+        return _pinned_response(name, cached_path, spec.media_type, headers)
+
+    result = await db.execute(
+        select(Rendition).where(Rendition.asset_id == asset_id)
+    )
+    renditions = result.scalars().all()
+
+    source = choose_source(asset, renditions, spec)
+    source_path = source.file_path if source else asset.original_file
+    if not storage.file_exists(source_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Original asset file not found"
+        )
+
+    async def render():
+        source_bytes = storage.read_file(source_path)
+        content = await run_cpu(render_variant, source_bytes, spec)
+        variant_cache.put(name, content)
+        return content
+
+    # Concurrent misses for the same variant share one render
+    content = await _variant_flight.do(name, render)
+
+    relative_path = variant_cache.acquire(name)
+    if relative_path is None:
+        # Already evicted again by other puts; serve the bytes we rendered
+        return Response(content=content, media_type=spec.media_type, headers=headers)
+    return _pinned_response(name, relative_path, spec.media_type, headers)
@@ -1,13 +1,16 @@
 """Retrieve endpoint for assets and renditions."""
-from fastapi import APIRouter, Depends, HTTPException, status, Response
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Request, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from pathlib import Path
+from typing import Optional
 
 from app.db import get_db, settings
 from app.models import Asset, Rendition
 from app.storage import storage
+from app.responses import RangeFileResponse
+from app.renditions import generate_rendition, RENDITION_FORMATS
+from app.utils import OUTPUT_FORMATS, negotiate_format
+from app.presets import preset_registry
 
 router = APIRouter(prefix="/retrieve", tags=["retrieve"])
 
@@ -53,7 +56,8 @@ async def get_asset(
                 "width": r.width,
                 "height": r.height,
                 "bytes": r.bytes,
-                "quality": r.quality
+                "quality": r.quality,
+                "format": r.format
             }
             for r in renditions
         ]
@@ -64,25 +68,54 @@ async def get_asset(
 async def get_rendition(
     asset_id: int,
     preset: str,
+    request: Request,
+    format: Optional[str] = Query(None, description="Force a format (jpeg, webp, avif); default negotiates from Accept"),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get rendition file."""
-    # Validate preset
-    from app.utils import RENDITION_PRESETS
-    if preset not in RENDITION_PRESETS:
+    """Get rendition file in the best format the client accepts."""
+    result = await db.execute(
+        select(Asset.tenant_id).where(Asset.id == asset_id)
+    )
+    tenant_id = result.scalar_one_or_none()
+    
+    if tenant_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Asset {asset_id} not found"
+        )
+    
+    # Validate preset against the tenant's configured presets
+    presets = await preset_registry.get_presets(db, tenant_id)
+    if preset not in presets:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid preset. Must be one of: {list(presets.keys())}"
+        )
+    if format is not None and format not in RENDITION_FORMATS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid preset. Must be one of: {list(RENDITION_PRESETS.keys())}"
+            detail=f"Invalid format. Must be one of: {RENDITION_FORMATS}"
         )
     
-    # Get rendition
+    # Get renditions of this preset (one per format)
     result = await db.execute(
         select(Rendition).where(
             Rendition.asset_id == asset_id,
             Rendition.preset == preset
         )
     )
-    rendition = result.scalar_one_or_none()
+    by_format = {r.format: r for r in result.scalars().all()}
+    
+    if format is None:
+        # On-demand mode can produce any configured format; otherwise pick among stored ones
+        candidates = RENDITION_FORMATS if settings.on_demand_renditions else list(by_format)
+        format = negotiate_format(request.headers.get("accept", ""), candidates)
+    rendition = by_format.get(format)
+    
+    if not rendition and settings.on_demand_renditions:
+        # Render now instead of making the client poll for the worker;
+        # concurrent requests for the same rendition share one render
+        rendition = await generate_rendition(asset_id, preset, format)
     
     if not rendition:
         raise HTTPException(
@@ -90,17 +123,54 @@ async def get_rendition(
             detail=f"Rendition {preset} not found for asset {asset_id}"
         )
     
-    # Read file and return
-    file_path = Path(settings.storage_path) / rendition.file_path
+    # Serve file (supports Range/If-Range for resumable downloads)
+    file_path = storage.local_path(rendition.file_path)
     if not file_path.exists():
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Rendition file not found on disk"
         )
     
-    return FileResponse(
+    _, media_type, extension = OUTPUT_FORMATS[rendition.format]
+    return RangeFileResponse(
+        path=str(file_path),
+        media_type=media_type,
+        filename=f"{asset_id}_{preset}.{extension}",
+        # Caches must key on Accept since the same URL serves different formats
+        headers={"Vary": "Accept"}
+    )
+
+
+@router.get("/original/{asset_id}")
+async def get_original(
+    asset_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """Download the original uploaded file (supports Range/If-Range)."""
+    result = await db.execute(
+        select(Asset).where(Asset.id == asset_id)
+    )
+    asset = result.scalar_one_or_none()
+    
+    if not asset:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Asset {asset_id} not found"
+        )
+    
+    file_path = storage.local_path(asset.original_file)
+    if not file_path.exists():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Original file not found on disk"
+        )
+    
+    # A content-addressed file never changes, so its hash is a strong validator
+    # for If-Range; files stored by filename (older assets) may be replaced by
+    # a same-named upload, so those get the mtime/size validator
+    return RangeFileResponse(
         path=str(file_path),
-        media_type="image/jpeg",
-        filename=f"{asset_id}_{preset}.jpg"
+        filename=asset.filename,
+        etag=asset.content_hash if asset.original_path else None
     )
 
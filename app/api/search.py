@@ -0,0 +1,104 @@
+"""Near-duplicate search over perceptual hashes."""
+import re
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+
+from app.db import get_db, settings, hamming_distance
+from app.hashing import to_signed64
+from app.models import Asset, Tenant
+from app.similarity import similarity_index
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+HEX_HASH = re.compile(r"^[0-9a-fA-F]{16}$")
+
+HASH_COLUMNS = {
+    "ahash": Asset.perceptual_hash,
+    "phash": Asset.phash,
+    "dhash": Asset.dhash,
+    "whash": Asset.whash,
+}
+
+
+@router.get("/similar")
+async def search_similar(
+    asset_id: Optional[int] = Query(None, description="Find assets similar to this asset"),
+    hash: Optional[str] = Query(None, description="...or to this 16-char hex hash (of the chosen algorithm)"),
+    k: int = Query(4, ge=0, le=16, description="Max Hamming distance"),
+    algorithm: str = Query("ahash", description="ahash (in-memory index) or phash, dhash, whash (filtered in the database)"),
+    tenant_name: Optional[str] = Query(None, description="Restrict results to a tenant (omit for all)"),
+    limit: int = Query(50, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Assets whose perceptual hash is within Hamming distance k, nearest first.
+    ahash is served from the in-memory index, which picks up assets uploaded
+    through other processes every SIMILARITY_REFRESH seconds; phash, dhash
+    and whash are filtered in the database.
+    """
+    if algorithm not in HASH_COLUMNS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"algorithm must be one of: {list(HASH_COLUMNS)}"
+        )
+    if (asset_id is None) == (hash is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide exactly one of asset_id or hash"
+        )
+    if hash is not None and not HEX_HASH.match(hash):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="hash must be 16 hex characters"
+        )
+
+    column = HASH_COLUMNS[algorithm]
+    if asset_id is not None:
+        result = await db.execute(
+            select(column).where(Asset.id == asset_id)
+        )
+        value = result.scalar_one_or_none()
+        if value is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Asset {asset_id} not found (or has no {algorithm})"
+            )
+        hash = value if algorithm == "ahash" else f"{value & 0xFFFFFFFFFFFFFFFF:016x}"
+
+    tenant_id = None
+    if tenant_name is not None:
+        result = await db.execute(
+            select(Tenant.id).where(Tenant.name == tenant_name)
+        )
+        tenant_id = result.scalar_one_or_none()
+        if tenant_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Tenant {tenant_name} not found"
+            )
+
+    if algorithm == "ahash":
+        if similarity_index.loaded_at is None or time.monotonic() - similarity_index.loaded_at > settings.similarity_refresh:
+            await similarity_index.refresh(db)
+        # One extra so the query asset itself can be dropped
+        matches = similarity_index.search(hash, k, tenant_id=tenant_id, limit=limit + 1)
+    else:
+        distance = hamming_distance(column, to_signed64(int(hash, 16)))
+        query = select(Asset.id, distance.label("distance")).where(distance <= k)
+        if tenant_id is not None:
+            query = query.where(Asset.tenant_id == tenant_id)
+        result = await db.execute(query.order_by(distance, Asset.id).limit(limit + 1))
+        matches = [(row.id, row.distance) for row in result.all()]
+    matches = [(match_id, distance) for match_id, distance in matches if match_id != asset_id][:limit]
+
+    return {
+        "hash": hash,
+        "k": k,
+        "algorithm": algorithm,
+        "tenant_name": tenant_name,
+        "results": [{"asset_id": match_id, "distance": distance} for match_id, distance in matches]
+    }
@@ -0,0 +1,58 @@
+"""Deep Zoom tile endpoints for pan/zoom viewers (e.g. OpenSeadragon)."""
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import Response
+
+from app.pyramid import read_index, read_tile, dzi_descriptor
+from app.utils import OUTPUT_FORMATS
+
+router = APIRouter(prefix="/tiles", tags=["tiles"])
+
+# Packs are built once from an immutable original, so tiles can be cached forever
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/{asset_id}.dzi")
+async def get_descriptor(asset_id: int):
+    """
+    Deep Zoom descriptor for an asset's tile pyramid.
+    Viewers then request tiles from /tiles/{asset_id}_files/{level}/{col}_{row}.jpg.
+    """
+    index = read_index(asset_id)
+    if index is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No tile pyramid for asset {asset_id}"
+        )
+    return Response(
+        content=dzi_descriptor(index),
+        media_type="application/xml",
+        headers={"Cache-Control": CACHE_CONTROL}
+    )
+
+
+@router.get("/{asset_id}_files/{level}/{col}_{row}.{extension}")
+async def get_tile(asset_id: int, level: int, col: int, row: int, extension: str):
+    """Serve one tile straight out of the asset's tile pack."""
+    index = read_index(asset_id)
+    if index is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No tile pyramid for asset {asset_id}"
+        )
+
+    _, media_type, tile_extension = OUTPUT_FORMATS[index["format"]]
+    content = read_tile(asset_id, level, col, row) if extension == tile_extension else None
+    if content is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Tile {level}/{col}_{row}.{extension} not found"
+        )
+
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={
+            "Cache-Control": CACHE_CONTROL,
+            "ETag": f'"{asset_id}-{level}-{col}-{row}-{len(content):x}"',
+        }
+    )
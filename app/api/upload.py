@@ -6,13 +6,54 @@ from PIL import Image
 import io
 
 from app.db import get_db, settings
+from app.executor import run_cpu, memory_budget, CpuMeter, metering
 from app.models import Asset, Job, Tenant
 from app.storage import storage
-from app.hashing import compute_content_hash
+from app.hashing import compute_content_hash, compute_perceptual_hashes
+from app.presets import preset_registry
+from app.dedupe import find_link_source, link_renditions
+from app.similarity import similarity_index
+from app.renditions import render_preset, build_rendition, estimate_render_bytes, RENDITION_FORMATS
+from app.pyramid import wants_pyramid, PYRAMID_PRESET, PYRAMID_PRIORITY
+from app.workers import enqueue_jobs
+from app.tenant_metrics import record_usage
+from app.usage import usage_buffer
 
 router = APIRouter(prefix="/upload", tags=["upload"])
 
 
+async def _render_inline(db: AsyncSession, asset: Asset, image: Image.Image, presets: dict) -> list:
+    """
+    Render presets from the already-decoded upload on the CPU pool, smallest
+    first so thumb is ready even if a later preset fails. Only runs if the
+    estimated peak fits in the memory budget right now (an upload never
+    waits for room).
+    Returns the presets that are ready and the rendition rows added; the rest
+    are left to the worker.
+    """
+    ready, added = [], []
+    cost = min(estimate_render_bytes(image.size, image.mode), memory_budget.total_bytes)
+    if not memory_budget.try_acquire(cost):
+        print(f"⚠ No memory budget to render asset {asset.id} inline, queueing it")
+        return ready, added
+    try:
+        ordered = sorted(presets.items(), key=lambda item: item[1]["size"][0] * item[1]["size"][1])
+        for preset, config in ordered:
+            try:
+                rendition_image, encoded = await run_cpu(render_preset, image, preset, RENDITION_FORMATS, config)
+            except Exception as e:
+                print(f"⚠ Inline {preset} rendition failed for asset {asset.id}, queueing it: {e}")
+                continue
+            for fmt, result in encoded.items():
+                rendition = build_rendition(asset, preset, rendition_image, result, fmt)
+                db.add(rendition)
+                added.append(rendition)
+            ready.append(preset)
+    finally:
+        memory_budget.release(cost)
+    return ready, added
+
+
 @router.post("/")
 async def upload_image(
     file: UploadFile = File(...),
@@ -20,8 +61,9 @@ async def upload_image(
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Upload an image file. Creates asset record and queues processing job.
-    Returns asset ID and status.
+    Upload an image file. Creates asset record and queues processing jobs.
+    Images up to INLINE_RENDER_MAX_PIXELS get their renditions during the
+    request (listed in ready_presets). Returns asset ID and status.
     """
     # Validate file type
     if not file.content_type or not file.content_type.startswith("image/"):
@@ -74,15 +116,22 @@ async def upload_image(
         db.add(tenant)
         await db.flush()  # Get tenant.id
     
+    # pHash/dHash/wHash share one reduced grayscale copy (CPU pool)
+    cpu = CpuMeter()
+    with metering(cpu):
+        perceptual_hashes = await run_cpu(compute_perceptual_hashes, image)
+    
     # Save original file
-    file_path = storage.save_original(content, file.filename)
+    file_path = storage.save_original(content, file.filename, sha256)
     
     # Create asset record
     asset = Asset(
         tenant_id=tenant.id,
         filename=file.filename,
         content_hash=sha256,
+        original_path=file_path,
         perceptual_hash=perceptual_hash,
+        **perceptual_hashes,
         original_bytes=len(content),
         width=image.width,
         height=image.height,
@@ -91,34 +140,85 @@ async def upload_image(
     db.add(asset)
     await db.flush()  # Get asset.id
     
-    # Create processing job
-    job = Job(
-        asset_id=asset.id,
-        status="pending",
-        retry_count=0,
-        max_retries=3
-    )
-    db.add(job)
+    presets = await preset_registry.get_presets(db, tenant.id)
+    ready_presets = []
+    
+    # Re-exports of an existing image share its renditions instead of re-rendering
+    linked_from = None
+    linked = []
+    if settings.perceptual_dedupe:
+        linked_from = await find_link_source(db, asset, settings.perceptual_dedupe_distance)
+        if linked_from:
+            linked = await link_renditions(db, asset, linked_from)
+            linked_formats = {(r.preset, r.format) for r in linked}
+            ready_presets = [
+                preset for preset in presets
+                if all((preset, fmt) in linked_formats for fmt in RENDITION_FORMATS)
+            ]
+    
+    # Small images are cheap to render: do it now instead of waiting for the worker
+    # (partially linked presets are left to the worker, which renders only missing formats)
+    inline = []
+    if 0 < image.width * image.height <= settings.inline_render_max_pixels:
+        linked_presets = {r.preset for r in linked}
+        unrendered = {preset: config for preset, config in presets.items() if preset not in linked_presets}
+        with metering(cpu):
+            rendered, inline = await _render_inline(db, asset, image, unrendered)
+        ready_presets += rendered
     
-    await db.commit()
+    # One processing job per remaining preset so presets are retried independently
+    jobs = [
+        Job(
+            asset_id=asset.id,
+            preset=preset,
+            status="pending",
+            retry_count=0,
+            max_retries=3
+        )
+        for preset in presets
+        if preset not in ready_presets
+    ]
+    if wants_pyramid(asset.width, asset.height):
+        jobs.append(Job(
+            asset_id=asset.id,
+            preset=PYRAMID_PRESET,
+            status="pending",
+            priority=PYRAMID_PRIORITY,
+            retry_count=0,
+            max_retries=3
+        ))
+    db.add_all(jobs)
     
-    # If Redis is available, add job to queue
-    # Note: In production, you might want to use a connection pool
+    # Usage counters commit together with the asset and its renditions
+    added = linked + inline
     try:
-        import aioredis
-        if settings.redis_url:
-            redis = await aioredis.from_url(settings.redis_url, decode_responses=True)
-            await redis.lpush("image_jobs", f'{{"job_id": {job.id}}}')
-            await redis.close()
-    except Exception:
-        # Fallback to database polling (worker will pick it up)
-        pass
+        await record_usage(
+            db, tenant.id, assets=1, renditions=len(added),
+            bytes=len(content) + sum(r.bytes for r in added)
+        )
+        await db.commit()
+    except BaseException:
+        # Inline files were written before the commit; don't leave them behind
+        # (linked renditions point at another asset's files and stay)
+        await db.rollback()
+        for rendition in inline:
+            storage.delete_file(rendition.file_path)
+        raise
+    usage_buffer.add(tenant.id, uploads=1, renditions=len(added),
+                     bytes=len(content) + sum(r.bytes for r in added), cpu_seconds=cpu.seconds)
+    similarity_index.add(asset.id, asset.tenant_id, asset.perceptual_hash)
+    
+    # If Redis is available, add jobs to queue
+    await enqueue_jobs([job.id for job in jobs])
     
     return {
         "asset_id": asset.id,
         "status": "uploaded",
-        "message": "Image uploaded and queued for processing",
+        "message": "Image uploaded and queued for processing" if jobs else "Image uploaded and processed",
         "content_hash": sha256,
-        "job_id": job.id
+        "job_id": jobs[0].id if jobs else None,
+        "job_ids": [job.id for job in jobs],
+        "ready_presets": ready_presets,
+        "linked_asset_id": linked_from.id if linked_from else None
     }
 
@@ -0,0 +1,256 @@
+"""Throttled, checkpointed backfill of missing renditions across existing assets."""
+import asyncio
+import json
+import re
+import time
+from dataclasses import dataclass, asdict, field
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import AsyncSessionLocal
+from app.models import Asset, Rendition, Job, Tenant
+from app.presets import preset_registry
+from app.storage import storage
+
+# Backfill jobs run after live uploads (see worker polling order)
+BACKFILL_PRIORITY = -10
+
+
+@dataclass
+class BackfillCheckpoint:
+    """Resumable progress of a backfill run, saved after every batch."""
+    name: str
+    last_asset_id: int = 0
+    scanned: int = 0
+    enqueued_assets: int = 0
+    missing_pairs: int = 0
+    started_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    finished: bool = False
+
+    @staticmethod
+    def path(name: str) -> str:
+        return f"backfill/{name}.json"
+
+    @classmethod
+    def load(cls, name: str) -> "BackfillCheckpoint":
+        """Load a saved checkpoint, or start a fresh one."""
+        if storage.file_exists(cls.path(name)):
+            return cls(**json.loads(storage.read_file(cls.path(name))))
+        return cls(name=name)
+
+    def save(self):
+        file_path = storage.local_path(self.path(self.name))
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write-then-rename so a crash never leaves a truncated checkpoint
+        tmp_path = file_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(asdict(self)))
+        tmp_path.replace(file_path)
+
+
+class RateLimiter:
+    """Token bucket limiting how many jobs per second the backfill enqueues."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+
+    async def acquire(self, count: int = 1):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= count or self.tokens >= self.rate:
+                self.tokens -= count
+                return
+            await asyncio.sleep((count - self.tokens) / self.rate)
+
+
+class CpuBudget:
+    """
+    Average CPU cores backfill jobs may use for rendering, measured from the
+    CPU seconds workers record on backfill jobs finished in the last window.
+    """
+
+    def __init__(self, cores: float, window: int = 60):
+        self.cores = cores
+        self.window = window
+
+    async def used(self, session: AsyncSession) -> float:
+        """CPU seconds of backfill jobs finished in the last window."""
+        since = datetime.now(timezone.utc) - timedelta(seconds=self.window)
+        result = await session.execute(
+            select(func.coalesce(func.sum(Job.cpu_seconds), 0.0)).where(
+                Job.status.in_(("completed", "failed")),
+                Job.updated_at >= since,
+                Job.priority == BACKFILL_PRIORITY,
+            )
+        )
+        return result.scalar_one()
+
+    async def wait(self, session: AsyncSession):
+        """Return once the recent backfill CPU is within budget."""
+        while await self.used(session) > self.cores * self.window:
+            await asyncio.sleep(1)
+
+
+async def _pending_jobs(session: AsyncSession) -> int:
+    result = await session.execute(
+        select(func.count(Job.id)).where(Job.status.in_(("pending", "processing")))
+    )
+    return result.scalar_one()
+
+
+async def _enqueue(session: AsyncSession, units: List[Tuple[int, str]]) -> List[Job]:
+    """Create low-priority jobs, one per missing (asset_id, preset) unit."""
+    jobs = [
+        Job(asset_id=asset_id, preset=preset, status="pending", priority=BACKFILL_PRIORITY,
+            retry_count=0, max_retries=3)
+        for asset_id, preset in units
+    ]
+    session.add_all(jobs)
+    await session.commit()
+
+    from app.workers import enqueue_jobs, BACKFILL_QUEUE_NAME
+    await enqueue_jobs([job.id for job in jobs], BACKFILL_QUEUE_NAME)
+    return jobs
+
+
+def checkpoint_name(presets: Optional[List[str]] = None, tenant_name: Optional[str] = None) -> str:
+    """
+    Default checkpoint name for a preset set (and tenant), so a run for
+    other presets never resumes a finished checkpoint of an earlier one.
+    """
+    name = "+".join(sorted(set(presets))) if presets else "all"
+    if tenant_name:
+        name += f"@{tenant_name}"
+    return re.sub(r"[^A-Za-z0-9_.+@-]", "-", name)
+
+
+async def run_backfill(
+    name: Optional[str] = None,
+    presets: Optional[List[str]] = None,
+    tenant_name: Optional[str] = None,
+    batch_size: int = 500,
+    rate: float = 20.0,
+    max_pending: int = 200,
+    cpu_budget: Optional[float] = None,
+    dry_run: bool = False,
+    reset: bool = False,
+) -> BackfillCheckpoint:
+    """
+    Walk assets by keyset pagination (id > last_asset_id) and enqueue one job
+    per (asset, preset) that is missing and not already queued. Throttled by a token
+    bucket (rate jobs/s), by queue depth (waits while more than max_pending
+    jobs are outstanding) and, with cpu_budget, by the render CPU of recent
+    backfill jobs (waits while they used more than cpu_budget cores on
+    average over the last minute), so live uploads keep getting worker time.
+    Progress is checkpointed after every batch; rerun with the same name to
+    resume (by default the name follows presets and tenant_name, see
+    checkpoint_name). A dry run starts from the saved checkpoint but never
+    writes it.
+    """
+    name = name or checkpoint_name(presets, tenant_name)
+    checkpoint = BackfillCheckpoint(name=name) if reset else BackfillCheckpoint.load(name)
+    if checkpoint.finished:
+        print(f"✓ Backfill '{name}' already finished (use reset to run again)")
+        return checkpoint
+
+    limiter = RateLimiter(rate)
+    cpu = CpuBudget(cpu_budget) if cpu_budget else None
+    started = time.monotonic()
+    scanned_at_start = checkpoint.scanned
+
+    async with AsyncSessionLocal() as session:
+        tenant_id = None
+        if tenant_name:
+            result = await session.execute(select(Tenant.id).where(Tenant.name == tenant_name))
+            tenant_id = result.scalar_one_or_none()
+            if tenant_id is None:
+                raise ValueError(f"Tenant {tenant_name} not found")
+
+        count_query = select(func.count(Asset.id)).where(Asset.id > checkpoint.last_asset_id)
+        if tenant_id is not None:
+            count_query = count_query.where(Asset.tenant_id == tenant_id)
+        remaining_total = (await session.execute(count_query)).scalar_one()
+        print(f"Backfill '{name}': {remaining_total} asset(s) to scan after id {checkpoint.last_asset_id}")
+
+        while True:
+            query = select(Asset.id, Asset.tenant_id).where(Asset.id > checkpoint.last_asset_id)
+            if tenant_id is not None:
+                query = query.where(Asset.tenant_id == tenant_id)
+            result = await session.execute(query.order_by(Asset.id).limit(batch_size))
+            page = result.all()
+            if not page:
+                break
+
+            asset_ids = [row.id for row in page]
+
+            # Presets already rendered for this page (any format counts)
+            result = await session.execute(
+                select(Rendition.asset_id, Rendition.preset)
+                .where(Rendition.asset_id.in_(asset_ids))
+                .distinct()
+            )
+            existing = {(row.asset_id, row.preset) for row in result.all()}
+
+            # Units that already have outstanding work (preset NULL = whole asset)
+            result = await session.execute(
+                select(Job.asset_id, Job.preset)
+                .where(Job.asset_id.in_(asset_ids), Job.status.in_(("pending", "processing")))
+                .distinct()
+            )
+            queued = {(row.asset_id, row.preset) for row in result.all()}
+
+            to_enqueue = []
+            enqueued_assets = 0
+            for asset_id, asset_tenant_id in page:
+                if (asset_id, None) in queued:
+                    continue
+                wanted = await preset_registry.get_presets(session, asset_tenant_id)
+                names = [p for p in wanted if presets is None or p in presets]
+                missing = [p for p in names if (asset_id, p) not in existing and (asset_id, p) not in queued]
+                if missing:
+                    to_enqueue.extend((asset_id, p) for p in missing)
+                    enqueued_assets += 1
+                    checkpoint.missing_pairs += len(missing)
+
+            if to_enqueue and not dry_run:
+                # Back off while the queue is deep so live jobs aren't starved
+                while await _pending_jobs(session) > max_pending:
+                    await asyncio.sleep(1)
+                for start in range(0, len(to_enqueue), 50):
+                    chunk = to_enqueue[start:start + 50]
+                    await limiter.acquire(len(chunk))
+                    if cpu is not None:
+                        await cpu.wait(session)
+                    await _enqueue(session, chunk)
+
+            checkpoint.enqueued_assets += enqueued_assets
+            checkpoint.scanned += len(page)
+            checkpoint.last_asset_id = asset_ids[-1]
+            if not dry_run:
+                checkpoint.save()
+
+            # Progress and ETA from this run's scan rate
+            scanned_now = checkpoint.scanned - scanned_at_start
+            elapsed = time.monotonic() - started
+            per_second = scanned_now / elapsed if elapsed > 0 else 0.0
+            left = max(remaining_total - scanned_now, 0)
+            eta = left / per_second if per_second > 0 else 0.0
+            print(
+                f"  scanned {scanned_now}/{remaining_total} "
+                f"(last id {checkpoint.last_asset_id}), "
+                f"enqueued {checkpoint.enqueued_assets} asset(s) / {checkpoint.missing_pairs} missing rendition(s), "
+                f"{per_second:.0f} assets/s, ETA {eta:.0f}s"
+            )
+
+    checkpoint.finished = True
+    if not dry_run:
+        checkpoint.save()
+    print(f"✓ Backfill '{name}' finished: {checkpoint.enqueued_assets} asset(s) enqueued"
+          + (" (dry run)" if dry_run else ""))
+    return checkpoint
@@ -1,6 +1,11 @@
 """Database connection and session management."""
 import os
+from typing import Literal
+from sqlalchemy import BigInteger, Integer, event, literal
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
 from sqlalchemy.orm import declarative_base
 from pydantic_settings import BaseSettings
 
@@ -15,6 +20,36 @@ class Settings(BaseSettings):
     storage_path: str = os.getenv("STORAGE_PATH", "./storage")
     secret_key: str = os.getenv("SECRET_KEY", "change_me")
     purge_days: int = int(os.getenv("PURGE_DAYS", "30"))
+    rendition_formats: str = os.getenv("RENDITION_FORMATS", "jpeg,webp")
+    # Encoder quality: fixed (per-format default), psnr (TARGET_PSNR) or bytes (preset max_bytes);
+    # anything else fails at startup
+    quality_mode: Literal["fixed", "psnr", "bytes"] = os.getenv("QUALITY_MODE", "fixed")
+    target_psnr: float = float(os.getenv("TARGET_PSNR", "38"))
+    preset_cache_ttl: int = int(os.getenv("PRESET_CACHE_TTL", "30"))  # seconds
+    worker_concurrency: int = int(os.getenv("WORKER_CONCURRENCY", "4"))  # jobs in flight per worker
+    perceptual_dedupe: bool = os.getenv("PERCEPTUAL_DEDUPE", "false").lower() == "true"  # share renditions of look-alike uploads
+    perceptual_dedupe_distance: int = int(os.getenv("PERCEPTUAL_DEDUPE_DISTANCE", "0"))  # max perceptual hash distance
+    similarity_refresh: int = int(os.getenv("SIMILARITY_REFRESH", "10"))  # seconds between similarity index refreshes
+    compare_time_budget: float = float(os.getenv("COMPARE_TIME_BUDGET", "10"))  # seconds of scoring per batch compare
+    compare_workers: int = int(os.getenv("COMPARE_WORKERS", "2"))  # threads in the dedicated compare pool
+    compare_concurrency: int = int(os.getenv("COMPARE_CONCURRENCY", "2"))  # compare requests running at once
+    compare_queue: int = int(os.getenv("COMPARE_QUEUE", "8"))  # compare requests waiting before 429s
+    compare_max_side: int = int(os.getenv("COMPARE_MAX_SIDE", "1024"))  # longest side metrics are evaluated at
+    usage_flush_interval: int = int(os.getenv("USAGE_FLUSH_INTERVAL", "10"))  # seconds between usage rollup flushes
+    usage_hourly_days: int = int(os.getenv("USAGE_HOURLY_DAYS", "7"))  # hourly buckets kept before folding into days
+    queue_stats_ttl: float = float(os.getenv("QUEUE_STATS_TTL", "5"))  # seconds queue stats are cached
+    metrics_reconcile_interval: int = int(os.getenv("METRICS_RECONCILE_INTERVAL", "3600"))  # seconds (0 = off)
+    inline_render_max_pixels: int = int(os.getenv("INLINE_RENDER_MAX_PIXELS", "0"))  # render at upload, e.g. 1000000 (0 = always queue)
+    zoom_pyramid: bool = os.getenv("ZOOM_PYRAMID", "false").lower() == "true"  # build Deep Zoom tile packs
+    pyramid_min_size: int = int(os.getenv("PYRAMID_MIN_SIZE", "2048"))  # longer edge needed for a pyramid
+    memory_budget_mb: int = int(os.getenv("MEMORY_BUDGET_MB", "1024"))  # estimated decode memory for concurrent renders
+    source_cache_size: int = int(os.getenv("SOURCE_CACHE_SIZE", "4"))  # decoded sources kept per worker
+    cpu_workers: int = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 2)))
+    on_demand_renditions: bool = os.getenv("ON_DEMAND_RENDITIONS", "false").lower() == "true"
+    # Dynamic resize allow-lists (comma-separated) and variant cache size
+    resize_widths: str = os.getenv("RESIZE_WIDTHS", "64,100,160,200,320,400,480,640,800,1024,1200,1600,2048")
+    resize_qualities: str = os.getenv("RESIZE_QUALITIES", "60,70,80,85,90")
+    variant_cache_mb: int = int(os.getenv("VARIANT_CACHE_MB", "512"))
     
     class Config:
         env_file = ".env"
@@ -24,6 +59,47 @@ class Settings(BaseSettings):
 
 settings = Settings()
 
+class hamming_distance(FunctionElement):
+    """
+    SQL Hamming distance between two 64-bit hash columns/values:
+    bit_count() on Postgres (14+), a registered Python function on SQLite.
+    """
+    type = Integer()
+    name = "hamming_distance"
+    inherit_cache = True
+
+    def __init__(self, left, right):
+        # Plain ints are bound as BIGINT (the default INTEGER overflows)
+        super().__init__(*(
+            literal(arg, BigInteger) if isinstance(arg, int) else arg
+            for arg in (left, right)
+        ))
+
+
+@compiles(hamming_distance)
+def _compile_hamming_distance(element, compiler, **kw):
+    return "hamming_distance(%s)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(hamming_distance, "postgresql")
+def _compile_hamming_distance_postgresql(element, compiler, **kw):
+    left, right = list(element.clauses)
+    return "bit_count(CAST((%s # %s) AS BIT(64)))" % (compiler.process(left, **kw), compiler.process(right, **kw))
+
+
+def _sqlite_hamming_distance(left, right):
+    if left is None or right is None:
+        return None
+    return ((left ^ right) & 0xFFFFFFFFFFFFFFFF).bit_count()
+
+
+@event.listens_for(Engine, "connect")
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    # Only SQLite connections (sqlite3/aiosqlite) support create_function
+    if hasattr(dbapi_connection, "create_function"):
+        dbapi_connection.create_function("hamming_distance", 2, _sqlite_hamming_distance, deterministic=True)
+
+
 # Create async engine
 # For SQLite, use aiosqlite; for PostgreSQL, use asyncpg
 # The URL format determines which driver to use:
@@ -53,12 +129,12 @@ async def get_db():
 
 
 async def init_db():
-    """Initialize database tables (call after importing all models)."""
+    """Create or migrate the database schema to the current models (Alembic, see app.migrate)."""
+    from app.migrate import upgrade
     try:
         async with engine.begin() as conn:
-            # Create all tables
-            await conn.run_sync(Base.metadata.create_all)
-        print("✓ Database tables created")
+            await conn.run_sync(upgrade)
+        print("✓ Database schema up to date")
     except Exception as e:
         print(f"✗ Database initialization failed: {e}")
         print(f"  Check your DATABASE_URL: {settings.database_url[:50]}...")
@@ -0,0 +1,85 @@
+"""Perceptual dedupe: let re-exports of an existing image share its renditions."""
+from typing import List, Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import hamming_distance
+from app.hashing import hash_distance
+from app.models import Asset, Rendition
+
+
+async def find_link_source(session: AsyncSession, asset: Asset, max_distance: int = 0) -> Optional[Asset]:
+    """
+    Existing asset of the same tenant with identical dimensions whose
+    average hash, pHash and dHash are each within max_distance of asset's and
+    that has renditions. One 64-bit hash agreeing is weak evidence (flat or
+    low-detail images collide easily); three hashes of different kinds
+    (mean, DCT, gradient) agreeing is what makes a re-export safe to link.
+    Assets without pHash/dHash are never linked. Same tenant only:
+    renditions were rendered with that tenant's presets.
+    """
+    if asset.phash is None or asset.dhash is None:
+        return None
+    query = (
+        select(Asset)
+        .join(Rendition, Rendition.asset_id == Asset.id)
+        .where(
+            Asset.tenant_id == asset.tenant_id,
+            Asset.width == asset.width,
+            Asset.height == asset.height,
+            Asset.id != asset.id,
+        )
+        .group_by(Asset.id)
+        .order_by(func.count(Rendition.id).desc(), Asset.id)
+    )
+    if max_distance == 0:
+        # Exact matches use the perceptual_hash and phash indexes
+        query = query.where(
+            Asset.perceptual_hash == asset.perceptual_hash,
+            Asset.phash == asset.phash,
+            Asset.dhash == asset.dhash,
+        )
+    else:
+        query = query.where(
+            hamming_distance(Asset.phash, asset.phash) <= max_distance,
+            hamming_distance(Asset.dhash, asset.dhash) <= max_distance,
+        )
+    result = await session.execute(query)
+
+    for candidate in result.scalars():
+        if hash_distance(candidate.perceptual_hash, asset.perceptual_hash) <= max_distance:
+            return candidate
+    return None
+
+
+async def link_renditions(session: AsyncSession, asset: Asset, source: Asset) -> List[Rendition]:
+    """
+    Give asset rendition rows pointing at source's files, shared copy-on-write:
+    rendition files are never rewritten in place (StorageAdapter.save_rendition
+    names them by asset and content), so a later render of source, or of asset
+    itself, writes a new file and the linked rows keep describing theirs.
+    Purge only deletes a file once no rendition row references it.
+    """
+    result = await session.execute(
+        select(Rendition).where(Rendition.asset_id == source.id)
+    )
+    linked = [
+        Rendition(
+            asset_id=asset.id,
+            preset=r.preset,
+            format=r.format,
+            file_path=r.file_path,
+            bytes=r.bytes,
+            width=r.width,
+            height=r.height,
+            quality=r.quality,
+            color_space=r.color_space,
+            psnr_db=r.psnr_db,
+            perceptual_hash=r.perceptual_hash,
+        )
+        for r in result.scalars().all()
+    ]
+    session.add_all(linked)
+    asset.linked_asset_id = source.id
+    return linked
@@ -0,0 +1,223 @@
+"""Thread pool for CPU-bound image work, so decoding/encoding doesn't block the event loop."""
+import asyncio
+import math
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from functools import partial
+from typing import Callable, List, Optional
+
+from app.db import settings
+
+
+# Pillow releases the GIL while decoding, resampling and encoding,
+# so threads give real parallelism without pickling images across processes.
+cpu_executor = ThreadPoolExecutor(
+    max_workers=settings.cpu_workers,
+    thread_name_prefix="cpu-pool",
+)
+
+
+# Separate pool for /compare QA work, so expensive comparisons queue among
+# themselves instead of delaying uploads, renders and retrieves
+compare_executor = ThreadPoolExecutor(
+    max_workers=settings.compare_workers,
+    thread_name_prefix="compare-pool",
+)
+
+
+class CpuMeter:
+    """CPU seconds used on the pool by run_cpu calls made while metering (see metering())."""
+
+    def __init__(self):
+        self.seconds = 0.0
+
+
+_meter: ContextVar[Optional[CpuMeter]] = ContextVar("cpu_meter", default=None)
+
+
+@contextmanager
+def metering(meter: CpuMeter):
+    """
+    Charge the pool CPU time of run_cpu calls made inside the block (and by
+    tasks started from it) to meter, e.g. to bill a job's work to its tenant.
+    """
+    token = _meter.set(meter)
+    try:
+        yield meter
+    finally:
+        _meter.reset(token)
+
+
+def _thread_timed(call):
+    # Thread CPU time only counts this call, not other pool threads' work
+    started = time.thread_time()
+    result = call()
+    return result, time.thread_time() - started
+
+
+async def run_cpu(func, *args, **kwargs):
+    """Run a CPU-bound callable on the shared pool and await its result."""
+    loop = asyncio.get_running_loop()
+    call = partial(func, *args, **kwargs)
+    meter = _meter.get()
+    if meter is None:
+        return await loop.run_in_executor(cpu_executor, call)
+    result, seconds = await loop.run_in_executor(cpu_executor, partial(_thread_timed, call))
+    meter.seconds += seconds
+    return result
+
+
+async def run_compare(func, *args, **kwargs):
+    """Run compare work on the dedicated compare pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(compare_executor, partial(func, *args, **kwargs))
+
+
+class Overloaded(Exception):
+    """Raised when a limiter's queue is full; retry_after is a hint in seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Overloaded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """
+    Concurrency limit with a bounded wait queue. Requests beyond
+    concurrency + max_waiting are rejected immediately (Overloaded) rather
+    than piling up; the retry hint comes from recent request durations.
+    """
+
+    def __init__(self, concurrency: int, max_waiting: int):
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._avg_seconds = 1.0  # moving average of slot hold times
+
+    def retry_after(self) -> int:
+        backlog = self.active + self.waiting
+        return max(1, math.ceil(self._avg_seconds * backlog / self.concurrency))
+
+    def _release(self, started: float):
+        self.active -= 1
+        self._avg_seconds += 0.2 * (time.monotonic() - started - self._avg_seconds)
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold one slot for the block; raises Overloaded if the queue is full.
+        The block gets a hold(future) callable for work it leaves running
+        (e.g. pool threads past a time budget): the slot is only freed once
+        the block has exited and every held future is done.
+        """
+        if self.active >= self.concurrency and self.waiting >= self.max_waiting:
+            raise Overloaded(self.retry_after())
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        started = time.monotonic()
+        held = []
+        try:
+            yield held.append
+        finally:
+            running = [future for future in held if not future.done()]
+            if not running:
+                self._release(started)
+            else:
+                remaining = len(running)
+
+                def finished(_):
+                    nonlocal remaining
+                    remaining -= 1
+                    if remaining == 0:
+                        self._release(started)
+
+                for future in running:
+                    future.add_done_callback(finished)
+
+
+compare_limiter = AdmissionLimiter(settings.compare_concurrency, settings.compare_queue)
+
+
+class MemoryBudget:
+    """
+    Weighted semaphore over an estimated memory budget (bytes).
+    Work reserves its estimated peak before decoding; reservations are granted
+    in FIFO order so a large job isn't starved by a stream of small ones.
+    A reservation larger than the whole budget is clamped and runs alone.
+    Caches holding budget (see try_acquire) register a reclaimer, asked to
+    give bytes back before a reservation has to wait.
+    """
+
+    def __init__(self, total_bytes: int):
+        self.total_bytes = total_bytes
+        self.available = total_bytes
+        self._waiters = deque()  # (nbytes, future)
+        self._reclaimers: List[Callable[[int], None]] = []
+
+    def add_reclaimer(self, reclaim: Callable[[int], None]):
+        """reclaim(nbytes) should release up to nbytes it holds (more is fine)."""
+        self._reclaimers.append(reclaim)
+
+    def try_acquire(self, nbytes: int) -> bool:
+        """Take nbytes only if they are free right now and nobody is waiting."""
+        if self._waiters or self.available < nbytes:
+            return False
+        self.available -= nbytes
+        return True
+
+    async def acquire(self, nbytes: int) -> int:
+        nbytes = min(nbytes, self.total_bytes)
+        if not self._waiters and self.available < nbytes:
+            for reclaim in self._reclaimers:
+                reclaim(nbytes - self.available)
+        if not self._waiters and self.available >= nbytes:
+            self.available -= nbytes
+            return nbytes
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((nbytes, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Hand back bytes granted just as we were cancelled, and let
+            # waiters queued behind us proceed
+            granted = future.done() and not future.cancelled()
+            self.release(nbytes if granted else 0)
+            raise
+        return nbytes
+
+    def release(self, nbytes: int):
+        self.available += nbytes
+        while self._waiters:
+            waiting, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if self.available < waiting:
+                break
+            self._waiters.popleft()
+            self.available -= waiting
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int):
+        """Hold nbytes of the budget for the duration of the block."""
+        granted = await self.acquire(nbytes)
+        try:
+            yield
+        finally:
+            self.release(granted)
+
+
+# Shared by the worker and on-demand renders (they run in the same process as the API)
+memory_budget = MemoryBudget(settings.memory_budget_mb * 1024 * 1024)
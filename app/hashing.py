@@ -16,6 +16,32 @@ def compute_perceptual_hash(image: Image.Image) -> str:
     return str(phash)
 
 
+# Side of the shared grayscale thumbnail the 64-bit hashes are computed from
+HASH_IMAGE_SIZE = 64
+
+
+def to_signed64(value: int) -> int:
+    """Map an unsigned 64-bit hash onto a signed BIGINT (same bits, two's complement)."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def compute_perceptual_hashes(image: Image.Image) -> dict:
+    """
+    Compute pHash (DCT), dHash (gradient) and wHash (Haar wavelet) from one
+    reduced grayscale copy, so the full-size image is resampled only once.
+    pHash and wHash are robust to gamma/compression changes, dHash to small
+    crops and shifts. Returns signed 64-bit ints ready for BigInteger columns.
+    """
+    gray = image.resize(
+        (HASH_IMAGE_SIZE, HASH_IMAGE_SIZE), Image.Resampling.LANCZOS, reducing_gap=2.0
+    ).convert("L")
+    return {
+        "phash": to_signed64(int(str(imagehash.phash(gray)), 16)),
+        "dhash": to_signed64(int(str(imagehash.dhash(gray)), 16)),
+        "whash": to_signed64(int(str(imagehash.whash(gray)), 16)),
+    }
+
+
 def compute_content_hash(image: Image.Image, content_bytes: bytes) -> tuple[str, str]:
     """
     Compute both SHA256 and perceptual hash for idempotency.
@@ -4,8 +4,13 @@ from fastapi.middleware.cors import CORSMiddleware
 import asyncio
 import os
 
-from app.db import init_db, close_db, settings
-from app.api import upload, retrieve, compare, metrics, purge
+from app.db import init_db, close_db, settings, AsyncSessionLocal
+from app.presets import preset_registry
+from app.similarity import similarity_index
+from app.tenant_metrics import reconcile_loop
+from app.usage import usage_buffer
+from app.telemetry import HTTPMetricsMiddleware
+from app.api import upload, retrieve, compare, metrics, purge, resize, presets, tiles, search, prometheus, queue
 
 # Create FastAPI app
 app = FastAPI(
@@ -23,16 +28,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency/size/status metrics (outermost, so CORS preflights count too)
+app.add_middleware(HTTPMetricsMiddleware)
+
 # Include routers
 app.include_router(upload.router)
 app.include_router(retrieve.router)
 app.include_router(compare.router)
 app.include_router(metrics.router)
 app.include_router(purge.router)
+app.include_router(resize.router)
+app.include_router(presets.router)
+app.include_router(tiles.router)
+app.include_router(search.router)
+app.include_router(prometheus.router)
+app.include_router(queue.router)
 
 
 # Background task for worker (runs in same process)
 worker_task = None
+preset_listener_task = None
+reconcile_task = None
 
 async def run_worker_background():
     """Run worker in background task (for free tier - no separate worker service needed)."""
@@ -51,6 +67,19 @@ async def startup_event():
     # Initialize database
     await init_db()
     
+    # Load perceptual hashes for near-duplicate search
+    async with AsyncSessionLocal() as session:
+        await similarity_index.refresh(session)
+    print(f"✓ Similarity index loaded ({len(similarity_index)} assets)")
+    
+    # Correct drift in the tenant usage counters now and periodically
+    if settings.metrics_reconcile_interval > 0:
+        global reconcile_task
+        reconcile_task = asyncio.create_task(reconcile_loop())
+    
+    # Flush buffered usage rollups periodically
+    usage_buffer.start()
+    
     # Check Redis connection if available
     try:
         if settings.redis_url:
@@ -59,6 +88,9 @@ async def startup_event():
             await redis.ping()
             await redis.close()
             print("✓ Redis connected")
+            # Drop cached presets when another process changes them
+            global preset_listener_task
+            preset_listener_task = asyncio.create_task(preset_registry.listen())
         else:
             print("⚠ Redis not configured, using fallback queue")
     except Exception as e:
@@ -77,15 +109,17 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown."""
-    # Cancel worker task if running
-    global worker_task
-    if worker_task:
-        worker_task.cancel()
-        try:
-            await worker_task
-        except asyncio.CancelledError:
-            pass
+    # Cancel background tasks if running
+    for task in (worker_task, preset_listener_task, reconcile_task):
+        if task:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
     
+    # Write usage still buffered before the engine goes away
+    await usage_buffer.close()
     await close_db()
     print("Application shut down")
 
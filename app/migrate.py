@@ -0,0 +1,49 @@
+"""Schema migrations (Alembic scripts in migrations/), applied by init_db at startup."""
+from pathlib import Path
+
+from alembic import command, op
+from alembic.config import Config
+from sqlalchemy import inspect
+
+ROOT = Path(__file__).resolve().parent.parent
+# Schema of the first release; databases created before migrations existed are stamped here
+BASELINE_REVISION = "0001"
+
+
+def _config(connection) -> Config:
+    config = Config(str(ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(ROOT / "migrations"))
+    config.attributes["connection"] = connection
+    return config
+
+
+def upgrade(connection, revision: str = "head"):
+    """
+    Migrate the database on a sync connection (run via AsyncConnection.run_sync).
+    Databases without an alembic_version table but with tables predate
+    migrations: they are stamped at the baseline, and the later steps skip
+    whatever create_all already made (has_column/has_index), so both
+    baseline and newer unversioned databases are brought up to date.
+    """
+    config = _config(connection)
+    inspector = inspect(connection)
+    if inspector.has_table("assets") and not inspector.has_table("alembic_version"):
+        command.stamp(config, BASELINE_REVISION)
+    command.upgrade(config, revision)
+
+
+# Helpers for migration scripts, so steps are no-ops where the schema already has them
+
+def has_table(table: str) -> bool:
+    return inspect(op.get_bind()).has_table(table)
+
+
+def has_column(table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(op.get_bind()).get_columns(table))
+
+
+def has_index(table: str, name: str) -> bool:
+    inspector = inspect(op.get_bind())
+    names = {i["name"] for i in inspector.get_indexes(table)}
+    names |= {c["name"] for c in inspector.get_unique_constraints(table)}
+    return name in names
@@ -1,7 +1,7 @@
 """SQLAlchemy async models for the catalog image pipeline."""
-from sqlalchemy import Column, Integer, String, DateTime, BigInteger, ForeignKey, Text, Boolean, Float
+from sqlalchemy import Column, Integer, String, DateTime, BigInteger, ForeignKey, Text, Boolean, Float, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from app.db import Base
 
 
@@ -20,16 +20,28 @@ class Tenant(Base):
 class Asset(Base):
     """Original image asset model."""
     __tablename__ = "assets"
+    __table_args__ = (
+        # Covers per-tenant count/sum aggregates (metrics) without touching rows
+        Index("ix_assets_tenant_bytes", "tenant_id", "original_bytes"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
     filename = Column(String(512), nullable=False)
     content_hash = Column(String(64), unique=True, nullable=False, index=True)  # SHA256 hex
     perceptual_hash = Column(String(16), nullable=False, index=True)  # perceptual hash hex
+    # 64-bit pHash/dHash/wHash stored as signed BIGINT (see hashing.to_signed64)
+    phash = Column(BigInteger, nullable=True, index=True)
+    dhash = Column(BigInteger, nullable=True)
+    whash = Column(BigInteger, nullable=True)
     original_bytes = Column(BigInteger, nullable=False)  # file size in bytes
     width = Column(Integer, nullable=False)
     height = Column(Integer, nullable=False)
     color_space = Column(String(32), nullable=True)
+    # Content-addressed storage path of the original (NULL: stored by filename, before that)
+    original_path = Column(String(600), nullable=True)
+    # Perceptually identical asset whose rendition files this asset shares
+    linked_asset_id = Column(Integer, ForeignKey("assets.id"), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
@@ -37,20 +49,33 @@ class Asset(Base):
     renditions = relationship("Rendition", back_populates="asset", cascade="all, delete-orphan")
     jobs = relationship("Job", back_populates="asset", cascade="all, delete-orphan")
 
+    @property
+    def original_file(self) -> str:
+        """Storage path of the original file."""
+        return self.original_path or f"originals/{self.filename}"
+
 
 class Rendition(Base):
-    """Processed image rendition model."""
+    """Processed image rendition model (one row per preset and output format)."""
     __tablename__ = "renditions"
+    __table_args__ = (
+        UniqueConstraint("asset_id", "preset", "format", name="uq_rendition_asset_preset_format"),
+        # Covers per-asset count/sum aggregates (metrics) without touching rows
+        Index("ix_renditions_asset_bytes", "asset_id", "bytes"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     asset_id = Column(Integer, ForeignKey("assets.id"), nullable=False, index=True)
     preset = Column(String(32), nullable=False, index=True)  # thumb, card, zoom
-    file_path = Column(String(1024), nullable=False, unique=True)
+    format = Column(String(16), nullable=False, default="jpeg", server_default="jpeg")  # jpeg, webp, avif
+    file_path = Column(String(1024), nullable=False, index=True)  # shared by linked renditions
     bytes = Column(BigInteger, nullable=False)
     width = Column(Integer, nullable=False)
     height = Column(Integer, nullable=False)
-    quality = Column(Integer, nullable=True)  # JPEG quality if applicable
+    quality = Column(Integer, nullable=True)  # encoder quality if applicable
     color_space = Column(String(32), nullable=True)
+    psnr_db = Column(Float, nullable=True)  # encoded output vs its resized source, measured at render time
+    perceptual_hash = Column(String(16), nullable=True)  # of the encoded output
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
@@ -60,13 +85,22 @@ class Rendition(Base):
 class Job(Base):
     """Processing job queue model."""
     __tablename__ = "jobs"
+    __table_args__ = (
+        # Oldest pending job and recent completions/failures (queue stats)
+        Index("ix_jobs_status_created", "status", "created_at"),
+        Index("ix_jobs_status_updated", "status", "updated_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     asset_id = Column(Integer, ForeignKey("assets.id"), nullable=False, index=True)
+    preset = Column(String(32), nullable=True)  # one preset per job; NULL = all presets (legacy)
     status = Column(String(32), nullable=False, index=True)  # pending, processing, completed, failed
+    priority = Column(Integer, default=0, server_default="0", nullable=False)  # higher runs first; backfill < 0
     retry_count = Column(Integer, default=0, nullable=False)
     max_retries = Column(Integer, default=3, nullable=False)
     error_message = Column(Text, nullable=True)
+    not_before = Column(DateTime(timezone=True), nullable=True)  # retry backoff: not claimed before this
+    cpu_seconds = Column(Float, default=0.0, server_default="0", nullable=False)  # render CPU, all attempts
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -74,12 +108,37 @@ class Job(Base):
     asset = relationship("Asset", back_populates="jobs")
 
 
+class RenditionPreset(Base):
+    """Rendition preset override: global default (tenant_id NULL) or per-tenant."""
+    __tablename__ = "rendition_presets"
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "name", name="uq_rendition_preset_tenant_name"),
+        # NULLs never compare equal, so the constraint above doesn't cover globals
+        Index(
+            "uq_rendition_preset_global_name", "name", unique=True,
+            sqlite_where=text("tenant_id IS NULL"), postgresql_where=text("tenant_id IS NULL"),
+        ),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=True, index=True)  # NULL = global
+    name = Column(String(32), nullable=False, index=True)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    fit = Column(Boolean, default=True, nullable=False)  # False = max dimension
+    profile = Column(String(16), default="balanced", nullable=False)  # encoder profile
+    max_bytes = Column(Integer, nullable=True)  # byte budget for QUALITY_MODE=bytes
+    enabled = Column(Boolean, default=True, nullable=False)  # False hides an inherited preset
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 class PoisonJob(Base):
     """Permanently failed jobs moved here after max retries."""
     __tablename__ = "poison_jobs"
     
     id = Column(Integer, primary_key=True, index=True)
     asset_id = Column(Integer, nullable=False, index=True)
+    preset = Column(String(32), nullable=True)
     original_job_id = Column(Integer, nullable=True)
     error_message = Column(Text, nullable=False)
     retry_count = Column(Integer, nullable=False)
@@ -100,3 +159,23 @@ class TenantMetrics(Base):
     # Relationship
     tenant = relationship("Tenant")
 
+
+
+class UsageRollup(Base):
+    """Per-tenant usage in one time bucket: hourly, downsampled to daily with age (see app.usage)."""
+    __tablename__ = "usage_rollups"
+    __table_args__ = (
+        # One row per bucket; also serves per-tenant range queries
+        UniqueConstraint("tenant_id", "granularity", "bucket_start", name="uq_usage_rollup_bucket"),
+        # Finds hourly buckets old enough to downsample
+        Index("ix_usage_rollups_granularity_start", "granularity", "bucket_start"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False)
+    granularity = Column(String(8), nullable=False)  # "hour" or "day"
+    bucket_start = Column(DateTime(timezone=True), nullable=False)  # UTC
+    uploads = Column(Integer, default=0, nullable=False)
+    renditions = Column(Integer, default=0, nullable=False)
+    bytes_stored = Column(BigInteger, default=0, nullable=False)  # originals + renditions written
+    cpu_seconds = Column(Float, default=0.0, nullable=False)  # CPU-pool time of uploads and jobs
@@ -0,0 +1,115 @@
+"""Rendition preset registry: built-in defaults + DB overrides, cached per tenant."""
+import asyncio
+import json
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import settings
+from app.models import RenditionPreset
+from app.utils import RENDITION_PRESETS
+
+# Redis channel used to tell other processes to drop cached presets
+PRESET_CHANNEL = "preset_changes"
+
+
+def preset_config(row: RenditionPreset) -> dict:
+    """Convert a DB row into the RENDITION_PRESETS config format."""
+    return {
+        "size": (row.width, row.height),
+        "fit": row.fit,
+        "max_bytes": row.max_bytes,
+        "profile": row.profile,
+    }
+
+
+def _copy(presets: Dict[str, dict]) -> Dict[str, dict]:
+    # Callers may edit what they get; the cached configs must stay as loaded
+    return {name: dict(config) for name, config in presets.items()}
+
+
+class PresetRegistry:
+    """
+    Resolves the effective presets for a tenant:
+    built-in RENDITION_PRESETS, overridden by global rows (tenant_id NULL),
+    overridden by the tenant's rows. Rows with enabled=False remove a preset.
+    Results are cached in-process; writes invalidate locally and notify other
+    processes over Redis when configured (otherwise entries expire after
+    PRESET_CACHE_TTL seconds).
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._cache: Dict[Optional[int], tuple] = {}  # tenant_id -> (loaded_at, presets)
+
+    async def get_presets(self, session: AsyncSession, tenant_id: Optional[int]) -> Dict[str, dict]:
+        """Effective presets (name -> config) for a tenant (None = global only)."""
+        cached = self._cache.get(tenant_id)
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            return _copy(cached[1])
+
+        query = select(RenditionPreset).where(RenditionPreset.tenant_id.is_(None))
+        if tenant_id is not None:
+            query = select(RenditionPreset).where(
+                or_(RenditionPreset.tenant_id.is_(None), RenditionPreset.tenant_id == tenant_id)
+            )
+        result = await session.execute(query)
+        rows = result.scalars().all()
+
+        presets = {name: dict(config) for name, config in RENDITION_PRESETS.items()}
+        # Globals first, then tenant rows so they win
+        for row in sorted(rows, key=lambda r: r.tenant_id is not None):
+            if row.enabled:
+                presets[row.name] = preset_config(row)
+            else:
+                presets.pop(row.name, None)
+
+        self._cache[tenant_id] = (time.monotonic(), presets)
+        return _copy(presets)
+
+    async def get_preset(self, session: AsyncSession, tenant_id: Optional[int], name: str) -> Optional[dict]:
+        """Config for one preset, or None if the tenant doesn't have it."""
+        presets = await self.get_presets(session, tenant_id)
+        return presets.get(name)
+
+    def invalidate(self, tenant_id: Optional[int] = None):
+        """Drop cached presets for a tenant, or everything for global changes."""
+        if tenant_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(tenant_id, None)
+
+    async def notify_change(self, tenant_id: Optional[int] = None):
+        """Invalidate locally and tell other processes (API/workers) to do the same."""
+        self.invalidate(tenant_id)
+        if not settings.redis_url:
+            return
+        try:
+            import aioredis
+            redis = await aioredis.from_url(settings.redis_url, decode_responses=True)
+            await redis.publish(PRESET_CHANNEL, json.dumps({"tenant_id": tenant_id}))
+            await redis.close()
+        except Exception:
+            # Other processes still pick the change up after PRESET_CACHE_TTL
+            pass
+
+    async def listen(self):
+        """Subscribe to preset change notifications (runs as a background task)."""
+        import aioredis
+        redis = await aioredis.from_url(settings.redis_url, decode_responses=True)
+        pubsub = redis.pubsub()
+        await pubsub.subscribe(PRESET_CHANNEL)
+        print("✓ Listening for preset changes")
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message:
+                try:
+                    self.invalidate(json.loads(message["data"]).get("tenant_id"))
+                except (ValueError, AttributeError):
+                    self.invalidate()
+            await asyncio.sleep(0)
+
+
+preset_registry = PresetRegistry(ttl=settings.preset_cache_ttl)
@@ -0,0 +1,174 @@
+"""Deep Zoom tile pyramids, built in one pass and stored as a single pack file per asset."""
+import json
+import math
+import os
+import struct
+from collections import OrderedDict
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from app.db import settings
+from app.executor import run_cpu, memory_budget
+from app.models import Asset
+from app.renditions import load_image, probe_source, estimate_render_bytes
+from app.storage import storage
+from app.utils import OUTPUT_FORMATS, FORMAT_QUALITY, save_rendition
+
+# Job.preset value for pyramid builds; the colon keeps it out of the preset
+# names tenants can create (app.api.presets.PRESET_NAME)
+PYRAMID_PRESET = ":pyramid"
+# Pyramids are queued behind the asset's regular presets
+PYRAMID_PRIORITY = -1
+
+TILE_SIZE = 256
+TILE_FORMAT = "jpeg"
+
+# Pack layout: tile bytes, JSON index, index length (8 bytes) and magic (4 bytes)
+PACK_MAGIC = b"TPK1"
+_TRAILER = struct.Struct(">Q4s")
+
+
+def pyramid_path(asset_id: int) -> str:
+    return f"pyramids/{asset_id}.tpk"
+
+
+def wants_pyramid(width: int, height: int) -> bool:
+    """Whether an asset is large enough (and pyramids enabled) to get one."""
+    return settings.zoom_pyramid and max(width, height) > settings.pyramid_min_size
+
+
+def pyramid_levels(width: int, height: int) -> List[Tuple[int, int]]:
+    """Deep Zoom level sizes, index 0 = 1x1 up to the full size (each halves, rounding up)."""
+    max_level = math.ceil(math.log2(max(width, height, 1)))
+    return [
+        (math.ceil(width / 2 ** (max_level - level)), math.ceil(height / 2 ** (max_level - level)))
+        for level in range(max_level + 1)
+    ]
+
+
+def write_pyramid(image: Image.Image, out: BinaryIO, tile_size: int = TILE_SIZE, format: str = TILE_FORMAT) -> dict:
+    """
+    Tile every level of the pyramid into out (CPU-bound; run via the CPU pool).
+    A single pass from the full-size level down: each level is tiled, written
+    and then halved to produce the next, so only one level is held at a time.
+    Returns the pack index.
+    """
+    pillow_format = OUTPUT_FORMATS[format][0]
+    quality = FORMAT_QUALITY[format]
+    levels = pyramid_levels(image.width, image.height)
+    tiles: Dict[str, List[int]] = {}
+    offset = 0
+
+    level_image = image
+    for level in range(len(levels) - 1, -1, -1):
+        if level_image.size != levels[level]:
+            # reduce(2) rounds up exactly like the Deep Zoom level sizes
+            level_image = level_image.reduce(2)
+        width, height = level_image.size
+        for row in range(math.ceil(height / tile_size)):
+            for col in range(math.ceil(width / tile_size)):
+                box = (col * tile_size, row * tile_size,
+                       min((col + 1) * tile_size, width), min((row + 1) * tile_size, height))
+                content = save_rendition(level_image.crop(box), format=pillow_format, quality=quality)
+                out.write(content)
+                tiles[f"{level}/{col}_{row}"] = [offset, len(content)]
+                offset += len(content)
+
+    index = {
+        "width": image.width,
+        "height": image.height,
+        "tile_size": tile_size,
+        "overlap": 0,
+        "format": format,
+        "tiles": tiles,
+    }
+    index_bytes = json.dumps(index, separators=(",", ":")).encode()
+    out.write(index_bytes)
+    out.write(_TRAILER.pack(len(index_bytes), PACK_MAGIC))
+    return index
+
+
+def _write_pack(source_path: str, relative_path: str) -> dict:
+    image = load_image(source_path)
+    file_path = storage.local_path(relative_path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    # Write-then-rename so readers never see a half-written pack
+    tmp_path = file_path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as out:
+        index = write_pyramid(image, out)
+    tmp_path.replace(file_path)
+    return index
+
+
+async def build_pyramid(asset: Asset) -> dict:
+    """Build (or rebuild) an asset's tile pack from its full-resolution original."""
+    source_path = asset.original_file
+    size, mode = await run_cpu(probe_source, source_path)
+    # Tiles need every pixel, so no reduced decode here (and the full-size
+    # image is not kept in the shared source cache); oversized images run alone
+    async with memory_budget.reserve(estimate_render_bytes(size, mode)):
+        return await run_cpu(_write_pack, source_path, pyramid_path(asset.id))
+
+
+# Parsed pack indexes keyed by (path, inode, mtime), so rebuilt packs are re-read
+_index_cache: "OrderedDict[tuple, dict]" = OrderedDict()
+_INDEX_CACHE_SIZE = 256
+
+
+def _pack_index(f: BinaryIO, file_path: str) -> dict:
+    stat = os.fstat(f.fileno())
+    key = (file_path, stat.st_ino, stat.st_mtime_ns)
+    index = _index_cache.get(key)
+    if index is not None:
+        _index_cache.move_to_end(key)
+        return index
+
+    f.seek(-_TRAILER.size, os.SEEK_END)
+    length, magic = _TRAILER.unpack(f.read(_TRAILER.size))
+    if magic != PACK_MAGIC:
+        raise ValueError(f"Not a tile pack: {file_path}")
+    f.seek(-_TRAILER.size - length, os.SEEK_END)
+    index = json.loads(f.read(length))
+
+    _index_cache[key] = index
+    while len(_index_cache) > _INDEX_CACHE_SIZE:
+        _index_cache.popitem(last=False)
+    return index
+
+
+def read_index(asset_id: int) -> Optional[dict]:
+    """Pack index for an asset, or None if it has no pyramid."""
+    file_path = storage.local_path(pyramid_path(asset_id))
+    try:
+        with open(file_path, "rb") as f:
+            return _pack_index(f, str(file_path))
+    except FileNotFoundError:
+        return None
+
+
+def read_tile(asset_id: int, level: int, col: int, row: int) -> Optional[bytes]:
+    """Encoded tile bytes, or None if the asset has no such tile."""
+    file_path = storage.local_path(pyramid_path(asset_id))
+    try:
+        # Index and tile come from the same open file, even if the pack is rebuilt meanwhile
+        with open(file_path, "rb") as f:
+            entry = _pack_index(f, str(file_path))["tiles"].get(f"{level}/{col}_{row}")
+            if entry is None:
+                return None
+            offset, length = entry
+            return os.pread(f.fileno(), length, offset)
+    except FileNotFoundError:
+        return None
+
+
+def dzi_descriptor(index: dict) -> str:
+    """Deep Zoom (.dzi) XML descriptor for a pack."""
+    extension = OUTPUT_FORMATS[index["format"]][2]
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" '
+        f'TileSize="{index["tile_size"]}" Overlap="{index["overlap"]}" Format="{extension}">'
+        f'<Size Width="{index["width"]}" Height="{index["height"]}"/>'
+        '</Image>'
+    )
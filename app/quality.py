@@ -0,0 +1,207 @@
+"""Vectorized full-reference quality metrics (PSNR, SSIM, MS-SSIM) in float32."""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Reported instead of infinity for identical images (inf is not valid JSON)
+MAX_PSNR_DB = 100.0
+
+# SSIM constants for 8-bit data (Wang et al. 2004)
+_C1 = (0.01 * 255) ** 2
+_C2 = (0.03 * 255) ** 2
+GAUSSIAN_SIZE = 11
+GAUSSIAN_SIGMA = 1.5
+# Per-scale exponents from the MS-SSIM paper (Wang et al. 2003)
+MS_SSIM_WEIGHTS = (0.0448, 0.2856, 0.3001, 0.2363, 0.1333)
+
+METRICS = ("psnr", "ssim", "ms_ssim")
+
+
+def _gaussian_kernel(size: int = GAUSSIAN_SIZE, sigma: float = GAUSSIAN_SIGMA) -> np.ndarray:
+    x = np.arange(size, dtype=np.float32) - (size - 1) / 2
+    kernel = np.exp(-(x ** 2) / (2 * sigma ** 2))
+    return (kernel / kernel.sum()).astype(np.float32)
+
+
+_KERNEL = _gaussian_kernel()
+
+
+def evaluation_size(size: Tuple[int, int], max_side: Optional[int] = None) -> Tuple[int, int]:
+    """Size metrics are evaluated at: size scaled down to fit max_side (never up)."""
+    width, height = size
+    if not max_side or max(width, height) <= max_side:
+        return width, height
+    scale = max_side / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def prepare(image: Image.Image, size: Optional[Tuple[int, int]] = None, mode: str = "RGB") -> np.ndarray:
+    """
+    uint8 pixel array of image in mode ("RGB" or "L"), resized to size if given.
+    Downscaling goes through reduce() first (reducing_gap), so large originals
+    never get a full-resolution resampling pass.
+    """
+    if size is not None and image.size != size:
+        image = image.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+    if image.mode != mode:
+        image = image.convert(mode)
+    return np.asarray(image, dtype=np.uint8)
+
+
+def psnr(reference: np.ndarray, distorted: np.ndarray, batch: bool = False) -> np.ndarray:
+    """
+    PSNR in dB of uint8 arrays; with batch=True the leading axis indexes
+    pairs and one value per pair is returned. Uses a single float32
+    temporary, squared in place; capped at MAX_PSNR_DB.
+    """
+    diff = reference.astype(np.float32)
+    diff -= distorted
+    np.square(diff, out=diff)
+    axes = tuple(range(1, diff.ndim)) if batch else None
+    mse = diff.mean(axis=axes, dtype=np.float64)
+    with np.errstate(divide="ignore"):
+        values = 10 * np.log10((255.0 ** 2) / mse)
+    return np.minimum(values, MAX_PSNR_DB)
+
+
+def _filter(x: np.ndarray) -> np.ndarray:
+    """Separable 'valid' Gaussian filter over the last two axes (shifted-slice sums)."""
+    taps = len(_KERNEL)
+    width = x.shape[-1] - taps + 1
+    rows = _KERNEL[0] * x[..., 0:width]
+    for i in range(1, taps):
+        rows += _KERNEL[i] * x[..., i:i + width]
+    height = x.shape[-2] - taps + 1
+    out = _KERNEL[0] * rows[..., 0:height, :]
+    for i in range(1, taps):
+        out += _KERNEL[i] * rows[..., i:i + height, :]
+    return out
+
+
+def _ssim_terms(a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Mean SSIM and mean contrast-structure term per image, over (..., H, W) float32."""
+    mu_a, mu_b = _filter(a), _filter(b)
+    mu_ab = mu_a * mu_b
+    np.square(mu_a, out=mu_a)
+    np.square(mu_b, out=mu_b)
+    # Variances / covariance reuse the filtered product buffers
+    var_a = _filter(a * a)
+    var_a -= mu_a
+    var_b = _filter(b * b)
+    var_b -= mu_b
+    cov = _filter(a * b)
+    cov -= mu_ab
+
+    cs = 2 * cov + _C2
+    denominator = var_a
+    denominator += var_b
+    denominator += _C2
+    cs /= denominator
+    luminance = 2 * mu_ab + _C1
+    mu_a += mu_b
+    mu_a += _C1
+    luminance /= mu_a
+    luminance *= cs
+    return luminance.mean(axis=(-2, -1), dtype=np.float64), cs.mean(axis=(-2, -1), dtype=np.float64)
+
+
+def ssim(reference: np.ndarray, distorted: np.ndarray) -> np.ndarray:
+    """
+    Mean SSIM (11x11 Gaussian window, sigma 1.5) of uint8 grayscale arrays,
+    (H, W) or batched (N, H, W). Images smaller than the window score
+    1.0 if identical and 0.0 otherwise.
+    """
+    if min(reference.shape[-2:]) < GAUSSIAN_SIZE:
+        return _tiny(reference, distorted)
+    values, _ = _ssim_terms(reference.astype(np.float32), distorted.astype(np.float32))
+    return values
+
+
+def _downsample(x: np.ndarray) -> np.ndarray:
+    """2x2 average pool over the last two axes (odd edges dropped)."""
+    height, width = x.shape[-2] // 2 * 2, x.shape[-1] // 2 * 2
+    x = x[..., :height, :width]
+    out = x[..., 0::2, 0::2] + x[..., 1::2, 0::2]
+    out += x[..., 0::2, 1::2]
+    out += x[..., 1::2, 1::2]
+    out *= 0.25
+    return out
+
+
+def ms_ssim(reference: np.ndarray, distorted: np.ndarray) -> np.ndarray:
+    """
+    Multi-scale SSIM of uint8 grayscale arrays, (H, W) or batched (N, H, W).
+    Uses as many of the five scales as the image size allows (weights are
+    renormalized), so small renditions still get a score.
+    """
+    side = min(reference.shape[-2:])
+    scales = 1
+    while scales < len(MS_SSIM_WEIGHTS) and side >> scales >= GAUSSIAN_SIZE:
+        scales += 1
+    if side < GAUSSIAN_SIZE:
+        return _tiny(reference, distorted)
+    weights = np.array(MS_SSIM_WEIGHTS[:scales], dtype=np.float64)
+    weights /= weights.sum()
+
+    a, b = reference.astype(np.float32), distorted.astype(np.float32)
+    result = 1.0
+    for scale, weight in enumerate(weights):
+        values, cs = _ssim_terms(a, b)
+        if scale == scales - 1:
+            result = result * np.maximum(values, 0) ** weight
+        else:
+            result = result * np.maximum(cs, 0) ** weight
+            a, b = _downsample(a), _downsample(b)
+    return result
+
+
+def _tiny(reference: np.ndarray, distorted: np.ndarray) -> np.ndarray:
+    equal = (reference == distorted).reshape(reference.shape[:-2] + (-1,)).all(axis=-1)
+    return equal.astype(np.float64)
+
+
+def compare_batch(
+    pairs: Sequence[Tuple[Image.Image, Image.Image]],
+    metrics: Sequence[str] = ("psnr", "ssim"),
+    max_side: Optional[int] = None,
+) -> List[Dict[str, float]]:
+    """
+    Metrics for each (reference, distorted) pair. The distorted image is
+    resized to the reference's evaluation size (see evaluation_size); pairs
+    that end up the same size are stacked and scored in one vectorized pass.
+    """
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(sorted(unknown))}")
+
+    groups: Dict[Tuple[int, int], List[int]] = {}
+    for i, (reference, _) in enumerate(pairs):
+        groups.setdefault(evaluation_size(reference.size, max_side), []).append(i)
+
+    results: List[Dict[str, float]] = [{} for _ in pairs]
+    for size, members in groups.items():
+        if "psnr" in metrics:
+            ref = np.stack([prepare(pairs[i][0], size) for i in members])
+            dist = np.stack([prepare(pairs[i][1], size) for i in members])
+            for i, value in zip(members, psnr(ref, dist, batch=True)):
+                results[i]["psnr"] = float(value)
+        luma = [m for m in metrics if m != "psnr"]
+        if luma:
+            ref = np.stack([prepare(pairs[i][0], size, "L") for i in members])
+            dist = np.stack([prepare(pairs[i][1], size, "L") for i in members])
+            for metric in luma:
+                values = ssim(ref, dist) if metric == "ssim" else ms_ssim(ref, dist)
+                for i, value in zip(members, values):
+                    results[i][metric] = float(value)
+    return results
+
+
+def compare(
+    reference: Image.Image,
+    distorted: Image.Image,
+    metrics: Sequence[str] = ("psnr", "ssim"),
+    max_side: Optional[int] = None,
+) -> Dict[str, float]:
+    """Metrics for a single pair (see compare_batch)."""
+    return compare_batch([(reference, distorted)], metrics, max_side)[0]
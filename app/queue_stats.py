@@ -0,0 +1,113 @@
+"""Job queue depth and lag, from indexed aggregate queries, cached for a few seconds."""
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import AsyncSessionLocal, settings
+from app.models import Job, Asset, Tenant
+from app.singleflight import SingleFlight
+from app.usage import as_utc
+
+JOB_STATUSES = ("pending", "processing", "completed", "failed")
+# Jobs a worker still has to finish
+BACKLOG_STATUSES = ("pending", "processing")
+
+
+def _age(moment: Optional[datetime], now: datetime) -> Optional[float]:
+    return max((now - as_utc(moment)).total_seconds(), 0.0) if moment is not None else None
+
+
+async def compute_queue_stats(session: AsyncSession, window: int = 300, tenant_limit: int = 20) -> dict:
+    """
+    Queue snapshot in five aggregate queries, whatever the number of jobs:
+    counts by status, oldest pending/processing job, the tenants with the
+    largest backlog, and jobs finished in the last window seconds
+    (throughput and permanent failure rate). The status filters and
+    MIN/range conditions are served by the jobs (status, created_at) and
+    (status, updated_at) indexes.
+    """
+    now = datetime.now(timezone.utc)
+
+    result = await session.execute(select(Job.status, func.count(Job.id)).group_by(Job.status))
+    counts = dict.fromkeys(JOB_STATUSES, 0)
+    counts.update(result.all())
+
+    # Claiming a job updates updated_at, so that is when processing started
+    oldest_pending = (await session.execute(
+        select(func.min(Job.created_at)).where(Job.status == "pending")
+    )).scalar_one()
+    oldest_processing = (await session.execute(
+        select(func.min(Job.updated_at)).where(Job.status == "processing")
+    )).scalar_one()
+
+    backlog = func.count(Job.id).label("backlog")
+    result = await session.execute(
+        select(Tenant.id, Tenant.name, backlog, func.min(Job.created_at).label("oldest"))
+        .select_from(Job)
+        .join(Asset, Job.asset_id == Asset.id)
+        .join(Tenant, Asset.tenant_id == Tenant.id)
+        .where(Job.status.in_(BACKLOG_STATUSES))
+        .group_by(Tenant.id, Tenant.name)
+        .order_by(backlog.desc(), Tenant.id)
+        .limit(tenant_limit)
+    )
+    tenants = [
+        {"tenant_id": row.id, "tenant_name": row.name, "backlog": row.backlog, "oldest_age_seconds": _age(row.oldest, now)}
+        for row in result.all()
+    ]
+
+    result = await session.execute(
+        select(Job.status, func.count(Job.id))
+        .where(Job.status.in_(("completed", "failed")), Job.updated_at >= now - timedelta(seconds=window))
+        .group_by(Job.status)
+    )
+    finished = dict.fromkeys(("completed", "failed"), 0)
+    finished.update(result.all())
+    done = finished["completed"] + finished["failed"]
+
+    return {
+        "generated_at": now.isoformat(),
+        "counts": counts,
+        "backlog": sum(counts[s] for s in BACKLOG_STATUSES),
+        "oldest_pending_age_seconds": _age(oldest_pending, now),
+        "oldest_processing_age_seconds": _age(oldest_processing, now),
+        "tenants": tenants,
+        "recent": {
+            "window_seconds": window,
+            "completed": finished["completed"],
+            "failed": finished["failed"],
+            "throughput_per_minute": round(finished["completed"] * 60 / window, 3),
+            "failure_rate": round(finished["failed"] / done, 4) if done else 0.0,
+        },
+    }
+
+
+class QueueStats:
+    """
+    compute_queue_stats() cached for ttl seconds; concurrent callers after
+    expiry share one computation, so polling (autoscalers, scrapes,
+    dashboards) costs the database at most one snapshot per ttl.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._cached: Optional[tuple] = None  # (computed_at, stats)
+        self._flight = SingleFlight()
+
+    async def _compute(self) -> dict:
+        async with AsyncSessionLocal() as session:
+            stats = await compute_queue_stats(session)
+        self._cached = (time.monotonic(), stats)
+        return stats
+
+    async def get(self) -> dict:
+        cached = self._cached
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
+        return await self._flight.do("stats", self._compute)
+
+
+queue_stats = QueueStats(ttl=settings.queue_stats_ttl)
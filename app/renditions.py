@@ -0,0 +1,431 @@
+"""Rendition generation shared by the worker and the on-demand request path."""
+import io
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from PIL import Image
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import AsyncSessionLocal, settings
+from app.executor import run_cpu, memory_budget, MemoryBudget, CpuMeter, metering
+from app.hashing import compute_perceptual_hash
+from app.models import Asset, Rendition
+from app.presets import preset_registry
+from app.singleflight import SingleFlight
+from app.storage import storage
+from app.tenant_metrics import record_renditions
+from app.usage import usage_buffer
+from app.utils import (
+    create_rendition, save_rendition, choose_quality, compute_psnr, rendition_formats, preset_output_size,
+    RENDITION_PRESETS, OUTPUT_FORMATS, FORMAT_QUALITY,
+)
+
+
+# Formats generated for every preset (JPEG first, then WebP/AVIF if supported)
+RENDITION_FORMATS = rendition_formats(settings.rendition_formats)
+
+# Coalesces concurrent on-demand renders of the same (asset_id, preset, format)
+_render_flight = SingleFlight()
+
+
+def load_image(relative_path: str) -> Image.Image:
+    """Read and decode a stored image, converted for JPEG output."""
+    if not storage.file_exists(relative_path):
+        raise FileNotFoundError(f"Source file not found: {relative_path}")
+
+    image = Image.open(io.BytesIO(storage.read_file(relative_path)))
+
+    # Convert to RGB if needed (JPEG doesn't support transparency)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    return image
+
+
+def _decode_fully(relative_path: str) -> Image.Image:
+    """load_image, forcing the pixel decode so the image can be shared across threads."""
+    image = load_image(relative_path)
+    image.load()
+    return image
+
+
+def probe_source(relative_path: str, min_size: Optional[Tuple[int, int]] = None) -> Tuple[Tuple[int, int], str]:
+    """
+    Size and mode of a stored image from its header, without decoding pixels.
+    With min_size, the size a JPEG would decode at after DCT draft scaling;
+    other formats (PNG, TIFF, WebP) have no reduced decode, so they report
+    their full size and are estimated at it.
+    """
+    with Image.open(storage.local_path(relative_path)) as image:
+        if min_size and image.format == "JPEG":
+            image.draft("RGB", min_size)
+        return image.size, image.mode
+
+
+def decoded_bytes(size: Tuple[int, int], mode: str) -> int:
+    """Memory held by a decoded image; Pillow stores multi-band pixels in 4 bytes."""
+    bytes_per_pixel = 1 if mode in ("1", "L", "P") else 2 if mode.startswith("I;16") else 4
+    return size[0] * size[1] * bytes_per_pixel
+
+
+def estimate_render_bytes(size: Tuple[int, int], mode: str, working_size: Optional[Tuple[int, int]] = None) -> int:
+    """
+    Rough peak memory to decode an image and render a preset from it:
+    the decoded source plus two working copies (RGB conversion/copy and the
+    resampling buffer) at working_size, which defaults to the source size.
+    """
+    working_w, working_h = working_size or size
+    return decoded_bytes(size, mode) + 2 * working_w * working_h * 4
+
+
+def load_image_reduced(relative_path: str, min_size: Tuple[int, int]) -> Image.Image:
+    """
+    Decode an oversized image straight down to roughly min_size (never below).
+    JPEGs are decoded at reduced scale via draft(); whatever remains is reduced
+    by an integer factor one strip at a time, so no full-size RGB copy exists
+    next to the decoded source.
+    """
+    image = Image.open(storage.local_path(relative_path))
+    image.draft("RGB", min_size)
+    out_mode = image.mode if image.mode in ("RGB", "L") else "RGB"
+
+    factor = max(1, min(image.width // min_size[0], image.height // min_size[1]))
+    if factor == 1:
+        return image.convert(out_mode) if image.mode != out_mode else image
+
+    image.load()
+    width, height = image.size
+    reduced = Image.new(out_mode, (-(-width // factor), -(-height // factor)))
+    strip_rows = factor * 64
+    for top in range(0, height, strip_rows):
+        strip = image.crop((0, top, width, min(top + strip_rows, height)))
+        if strip.mode != out_mode:
+            strip = strip.convert(out_mode)
+        reduced.paste(strip.reduce(factor), (0, top // factor))
+    return reduced
+
+
+def _decode_reduced(relative_path: str, min_size: Tuple[int, int]) -> Image.Image:
+    image = load_image_reduced(relative_path, min_size)
+    image.load()
+    return image
+
+
+class SourceCache:
+    """
+    Small LRU of decoded source images shared by sibling jobs on this worker,
+    so per-preset units of one asset decode the original once.
+    Entries are keyed by what identifies the content (the asset's content
+    hash, a rendition id), not by storage path, which a later upload or
+    re-render may reuse. Concurrent loads of the same key share a single decode.
+
+    With a budget, each entry holds budget for its decoded size until evicted, so
+    idle cached images count against MEMORY_BUDGET_MB too. A decode that
+    doesn't fit in what is free is used once and not kept, and the budget
+    evicts entries (oldest first) before making a reservation wait.
+    """
+
+    def __init__(self, max_items: int, budget: Optional[MemoryBudget] = None):
+        self.max_items = max_items
+        self.budget = budget
+        self._images: "OrderedDict[str, Tuple[Image.Image, int]]" = OrderedDict()  # key -> (image, bytes held)
+        self._flight = SingleFlight()
+        if budget is not None:
+            budget.add_reclaimer(self.reclaim)
+
+    def _evict_oldest(self) -> int:
+        _, (_, charge) = self._images.popitem(last=False)
+        if charge:
+            self.budget.release(charge)
+        return charge
+
+    def reclaim(self, nbytes: int):
+        """Evict entries, oldest first, until nbytes of budget are released (or none are left)."""
+        released = 0
+        while self._images and released < nbytes:
+            released += self._evict_oldest()
+
+    def _store(self, key: str, image: Image.Image):
+        charge = 0
+        if self.budget is not None:
+            charge = decoded_bytes(image.size, image.mode)
+            if not self.budget.try_acquire(charge):
+                return
+        self._images[key] = (image, charge)
+        while len(self._images) > self.max_items:
+            self._evict_oldest()
+
+    async def _load(self, key: str, relative_path: str, reduce_to: Optional[Tuple[int, int]]) -> Image.Image:
+        if reduce_to:
+            image = await run_cpu(_decode_reduced, relative_path, reduce_to)
+        else:
+            image = await run_cpu(_decode_fully, relative_path)
+        self._store(key, image)
+        return image
+
+    async def get(
+        self,
+        relative_path: str,
+        reduce_to: Optional[Tuple[int, int]] = None,
+        source_key: Optional[str] = None,
+    ) -> Image.Image:
+        """Decoded image at relative_path (reduced towards reduce_to if given), cached under source_key."""
+        source_key = source_key or relative_path
+        key = f"{source_key}@{reduce_to[0]}x{reduce_to[1]}" if reduce_to else source_key
+        entry = self._images.get(key)
+        if entry is not None:
+            self._images.move_to_end(key)
+            return entry[0]
+        return await self._flight.do(key, lambda: self._load(key, relative_path, reduce_to))
+
+
+source_cache = SourceCache(max_items=settings.source_cache_size, budget=memory_budget)
+
+
+@asynccontextmanager
+async def admitted_source(relative_path: str, reduce_to: Tuple[int, int], source_key: str):
+    """
+    Decode a source image inside the shared memory budget and yield it
+    (shared with other holders of source_key, see SourceCache).
+    The peak is estimated from the header first; images whose estimate
+    exceeds the whole budget take the reduced decode path (down to reduce_to,
+    which must cover every preset rendered from it). The reservation is held
+    until the block exits, so render work belongs inside it.
+    """
+    size, mode = await run_cpu(probe_source, relative_path)
+    cost = estimate_render_bytes(size, mode)
+    reduce = cost > memory_budget.total_bytes
+    if reduce:
+        draft_size, mode = await run_cpu(probe_source, relative_path, reduce_to)
+        cost = estimate_render_bytes(draft_size, mode, reduce_to)
+        print(f"  ⚠ {relative_path} is {size[0]}x{size[1]}; decoding reduced to {reduce_to[0]}x{reduce_to[1]}+")
+
+    async with memory_budget.reserve(cost):
+        yield await source_cache.get(relative_path, reduce_to if reduce else None, source_key)
+
+
+def source_key(asset: Asset, source: Optional[Rendition] = None) -> str:
+    """SourceCache key of asset's original, or of one of its renditions."""
+    return f"rendition:{source.id}" if source else asset.content_hash
+
+
+def smallest_covering(renditions: Iterable[Rendition], min_width: int, min_height: int) -> Optional[Rendition]:
+    """Smallest stored rendition at least min_width x min_height (None if there is none)."""
+    candidates = [
+        r for r in renditions
+        if r.width >= min_width and r.height >= min_height
+        and storage.file_exists(r.file_path)
+    ]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda r: r.width * r.height)
+
+
+def pick_render_source(
+    asset: Asset,
+    renditions: Iterable[Rendition],
+    preset: str,
+    config: dict,
+) -> Optional[Rendition]:
+    """
+    Existing rendition a preset can be derived from instead of the original
+    (decoding a 1200px zoom is far cheaper than a 24MP original).
+    Renditions of the same preset are skipped to avoid re-encoding lossy output
+    at the same size. None means use the original.
+    """
+    need_w, need_h = preset_output_size((asset.width, asset.height), config)
+    return smallest_covering(
+        (r for r in renditions if r.preset != preset),
+        need_w,
+        need_h
+    )
+
+
+def encode_rendition(
+    image: Image.Image,
+    preset: str,
+    format: str,
+    config: Optional[dict] = None,
+) -> Tuple[bytes, Optional[int]]:
+    """
+    Encode a resized rendition, choosing quality per QUALITY_MODE.
+    Presets without max_bytes use the fixed quality in bytes mode.
+    Returns: (encoded bytes, quality used)
+    """
+    pillow_format = OUTPUT_FORMATS[format][0]
+    default_quality = FORMAT_QUALITY[format]
+    config = config or RENDITION_PRESETS[preset]
+    profile = config.get("profile", "balanced")
+    fixed = settings.quality_mode == "fixed" or (settings.quality_mode == "bytes" and not config.get("max_bytes"))
+    if default_quality is None or fixed:
+        content = save_rendition(image, format=pillow_format, quality=default_quality, profile=profile)
+        return content, default_quality
+
+    if settings.quality_mode == "psnr":
+        quality, content = choose_quality(image, pillow_format, target_psnr=settings.target_psnr, profile=profile)
+    else:
+        quality, content = choose_quality(image, pillow_format, max_bytes=config.get("max_bytes"), profile=profile)
+    return content, quality
+
+
+class EncodedRendition(NamedTuple):
+    """One encoded format of a rendition plus the metrics measured at render time."""
+    content: bytes
+    quality: Optional[int]
+    psnr_db: float  # decoded output vs the resized (pre-encode) image
+    perceptual_hash: str  # of the decoded output
+
+
+def measure_rendition(rendition_image: Image.Image, content: bytes) -> Tuple[float, str]:
+    """
+    Decode an encoded rendition and measure it against the image it was
+    encoded from. Returns: (PSNR in dB, perceptual hash)
+    """
+    decoded = Image.open(io.BytesIO(content))
+    decoded.load()
+    return compute_psnr(rendition_image, decoded), compute_perceptual_hash(decoded)
+
+
+def render_preset(
+    image: Image.Image,
+    preset: str,
+    formats: Sequence[str] = ("jpeg",),
+    config: Optional[dict] = None,
+) -> Tuple[Image.Image, Dict[str, EncodedRendition]]:
+    """
+    Resize one preset and encode it in each requested format (CPU-bound; run via the CPU pool).
+    The resize happens once; only the encode is repeated per format.
+    config is the preset's registry config (defaults to the built-in preset).
+    Returns: (rendition image, {format: EncodedRendition})
+    """
+    # Copy to avoid modifying the shared source image
+    rendition_image = create_rendition(image.copy(), preset, config)
+
+    # Ensure rendition is in RGB mode before saving as JPEG
+    if rendition_image.mode not in ("RGB", "L"):
+        rendition_image = rendition_image.convert("RGB")
+
+    encoded = {}
+    for fmt in formats:
+        content, quality = encode_rendition(rendition_image, preset, fmt, config)
+        encoded[fmt] = EncodedRendition(content, quality, *measure_rendition(rendition_image, content))
+    return rendition_image, encoded
+
+
+def build_rendition(
+    asset: Asset,
+    preset: str,
+    rendition_image: Image.Image,
+    encoded: EncodedRendition,
+    format: str = "jpeg",
+) -> Rendition:
+    """Save rendition bytes to storage and build (but don't add) its DB record."""
+    file_path = storage.save_rendition(encoded.content, preset, asset.id, extension=OUTPUT_FORMATS[format][2])
+    return Rendition(
+        asset_id=asset.id,
+        preset=preset,
+        format=format,
+        file_path=file_path,
+        bytes=len(encoded.content),
+        width=rendition_image.width,
+        height=rendition_image.height,
+        quality=encoded.quality,
+        color_space=rendition_image.mode,
+        psnr_db=encoded.psnr_db,
+        perceptual_hash=encoded.perceptual_hash
+    )
+
+
+async def delete_unstored_files(session: AsyncSession, renditions: Iterable[Rendition]):
+    """
+    Delete the files of renditions whose rows were rolled back, except those
+    a stored row uses too (the same bytes rendered by someone else).
+    """
+    paths = {r.file_path for r in renditions}
+    if not paths:
+        return
+    result = await session.execute(select(Rendition.file_path).where(Rendition.file_path.in_(paths)))
+    for path in paths - set(result.scalars().all()):
+        storage.delete_file(path)
+
+
+async def get_existing_rendition(
+    session: AsyncSession,
+    asset_id: int,
+    preset: str,
+    format: str = "jpeg",
+) -> Optional[Rendition]:
+    """Fetch an existing rendition row, if any."""
+    result = await session.execute(
+        select(Rendition).where(
+            Rendition.asset_id == asset_id,
+            Rendition.preset == preset,
+            Rendition.format == format
+        )
+    )
+    return result.scalar_one_or_none()
+
+
+async def get_existing_formats(session: AsyncSession, asset_id: int, preset: str) -> List[str]:
+    """Formats already rendered for an (asset, preset)."""
+    result = await session.execute(
+        select(Rendition.format).where(
+            Rendition.asset_id == asset_id,
+            Rendition.preset == preset
+        )
+    )
+    return list(result.scalars().all())
+
+
+async def _generate(asset_id: int, preset: str, format: str) -> Optional[Rendition]:
+    """Render and persist one rendition in its own session."""
+    async with AsyncSessionLocal() as session:
+        existing = await get_existing_rendition(session, asset_id, preset, format)
+        if existing:
+            return existing
+
+        result = await session.execute(
+            select(Asset).where(Asset.id == asset_id)
+        )
+        asset = result.scalar_one_or_none()
+        if not asset:
+            return None
+
+        config = await preset_registry.get_preset(session, asset.tenant_id, preset)
+        if not config:
+            return None
+
+        reduce_to = preset_output_size((asset.width, asset.height), config)
+        cpu = CpuMeter()
+        with metering(cpu):
+            async with admitted_source(asset.original_file, reduce_to, source_key(asset)) as image:
+                rendition_image, encoded = await run_cpu(render_preset, image, preset, (format,), config)
+        rendition = build_rendition(asset, preset, rendition_image, encoded[format], format)
+        session.add(rendition)
+        try:
+            # The counter upsert flushes the insert, so it can hit the race too
+            await record_renditions(session, asset.tenant_id, [rendition])
+            await session.commit()
+        except IntegrityError:
+            # The worker stored the same rendition meanwhile; use its row
+            await session.rollback()
+            await delete_unstored_files(session, [rendition])
+            return await get_existing_rendition(session, asset_id, preset, format)
+        usage_buffer.add(asset.tenant_id, renditions=1, bytes=rendition.bytes, cpu_seconds=cpu.seconds)
+
+        print(f"  ✓ Created {preset} ({format}) rendition on demand for asset {asset_id} ({rendition.width}x{rendition.height})")
+        return rendition
+
+
+async def generate_rendition(asset_id: int, preset: str, format: str = "jpeg") -> Optional[Rendition]:
+    """
+    Generate a missing rendition in the request path.
+    Concurrent requests for the same (asset, preset, format) share one render.
+    Returns None if the asset doesn't exist or its tenant lacks the preset.
+    """
+    return await _render_flight.do(
+        (asset_id, preset, format),
+        lambda: _generate(asset_id, preset, format)
+    )
@@ -0,0 +1,155 @@
+"""File responses with HTTP Range support and zero-copy sends."""
+import mimetypes
+import os
+from email.utils import formatdate
+from typing import Mapping, Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from starlette.background import BackgroundTask
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a Range header cannot be satisfied for the file size."""
+
+
+def parse_range_header(range_header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range `Range: bytes=...` header.
+    Returns: (start, end) inclusive, or None if the header should be ignored
+    (unknown unit, malformed, or multiple ranges - we then serve the full file).
+    Raises RangeNotSatisfiable if the range lies outside the file.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec or "," in spec:
+        return None
+
+    start_str, sep, end_str = spec.strip().partition("-")
+    if not sep:
+        return None
+    start_str, end_str = start_str.strip(), end_str.strip()
+
+    try:
+        if not start_str:
+            # Suffix range: last N bytes
+            suffix = int(end_str)
+            if suffix <= 0:
+                raise RangeNotSatisfiable(range_header)
+            return max(file_size - suffix, 0), file_size - 1
+
+        start = int(start_str)
+        end = int(end_str) if end_str else file_size - 1
+    except ValueError:
+        return None
+
+    if start < 0 or (end_str and end < start):
+        return None
+    if start >= file_size:
+        raise RangeNotSatisfiable(range_header)
+
+    return start, min(end, file_size - 1)
+
+
+class RangeFileResponse(Response):
+    """
+    Serve a file from disk with `Range`/`If-Range` support (206 Partial Content).
+    Uses the ASGI `http.response.zerocopysend` extension (os.sendfile) when the
+    server offers it, otherwise streams the requested byte range in chunks.
+    background runs once the response is done, whether or not it completed.
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        media_type: Optional[str] = None,
+        filename: Optional[str] = None,
+        etag: Optional[str] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        background: Optional[BackgroundTask] = None,
+    ):
+        self.path = str(path)
+        self.status_code = 200
+        self.background = background
+        self.media_type = media_type or mimetypes.guess_type(filename or self.path)[0] or "application/octet-stream"
+
+        stat = os.stat(self.path)
+        self.file_size = stat.st_size
+        self.etag = f'"{etag}"' if etag else f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+
+        self.init_headers(headers)
+        self.headers.setdefault("accept-ranges", "bytes")
+        self.headers.setdefault("etag", self.etag)
+        self.headers.setdefault("last-modified", self.last_modified)
+        if filename:
+            self.headers.setdefault("content-disposition", f"attachment; filename*=utf-8''{quote(filename)}")
+
+    def _if_range_matches(self, if_range: Optional[str]) -> bool:
+        """A Range is only honoured if If-Range (when sent) still matches the file."""
+        if not if_range:
+            return True
+        if if_range.startswith(('"', "W/")):
+            return if_range == self.etag
+        return if_range == self.last_modified
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self._respond(scope, send)
+        finally:
+            if self.background is not None:
+                await self.background()
+
+    async def _respond(self, scope: Scope, send: Send) -> None:
+        request_headers = Headers(scope=scope)
+        send_body = scope.get("method", "GET").upper() != "HEAD"
+
+        start, end = 0, self.file_size - 1
+        status_code = self.status_code
+        range_header = request_headers.get("range")
+        if range_header and self._if_range_matches(request_headers.get("if-range")):
+            try:
+                byte_range = parse_range_header(range_header, self.file_size)
+            except RangeNotSatisfiable:
+                await send({
+                    "type": "http.response.start",
+                    "status": 416,
+                    "headers": [(b"content-range", f"bytes */{self.file_size}".encode("latin-1"))],
+                })
+                await send({"type": "http.response.body", "body": b""})
+                return
+            if byte_range:
+                start, end = byte_range
+                status_code = 206
+                self.headers["content-range"] = f"bytes {start}-{end}/{self.file_size}"
+
+        length = end - start + 1 if self.file_size else 0
+        self.headers["content-length"] = str(length)
+        await send({"type": "http.response.start", "status": status_code, "headers": self.raw_headers})
+
+        if not send_body or length == 0:
+            await send({"type": "http.response.body", "body": b""})
+        elif "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f,
+                    "offset": start,
+                    "count": length,
+                })
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as f:
+                await f.seek(start)
+                remaining = length
+                while remaining > 0:
+                    chunk = await f.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                if remaining > 0:
+                    # File shrank underneath us; close the body anyway
+                    await send({"type": "http.response.body", "body": b""})
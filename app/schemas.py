@@ -9,6 +9,7 @@ class RenditionResponse(BaseModel):
     height: int
     bytes: int
     quality: Optional[int] = None
+    format: str = "jpeg"
 
 class AssetResponse(BaseModel):
     asset_id: int
@@ -20,3 +21,12 @@ class AssetResponse(BaseModel):
     color_space: Optional[str] = None
     created_at: datetime
     renditions: List[RenditionResponse]
+
+
+class PresetRequest(BaseModel):
+    width: int
+    height: int
+    fit: bool = True
+    profile: str = "balanced"
+    max_bytes: Optional[int] = None
+    enabled: bool = True
@@ -0,0 +1,44 @@
+"""Backfill missing renditions for existing assets (resumable, throttled)."""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.db import init_db
+from app.backfill import run_backfill
+
+
+async def main(args):
+    await init_db()
+    await run_backfill(
+        name=args.name,
+        presets=args.presets.split(",") if args.presets else None,
+        tenant_name=args.tenant,
+        batch_size=args.batch_size,
+        rate=args.rate,
+        max_pending=args.max_pending,
+        cpu_budget=args.cpu_budget,
+        dry_run=args.dry_run,
+        reset=args.reset,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--name", help="Checkpoint name (rerun with the same name to resume; default: from --presets/--tenant)")
+    parser.add_argument("--presets", help="Comma-separated presets to backfill (default: all of each tenant's presets)")
+    parser.add_argument("--tenant", help="Only backfill this tenant")
+    parser.add_argument("--batch-size", type=int, default=500, help="Assets per keyset page")
+    parser.add_argument("--rate", type=float, default=20.0, help="Max jobs enqueued per second")
+    parser.add_argument("--max-pending", type=int, default=200, help="Pause while more jobs than this are outstanding")
+    parser.add_argument("--cpu-budget", type=float, help="Pause while recent backfill renders average more CPU cores than this")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be enqueued")
+    parser.add_argument("--reset", action="store_true", help="Ignore any saved checkpoint and start over")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        print("\n\nInterrupted - progress is checkpointed, rerun to resume")
+        sys.exit(0)
@@ -0,0 +1,68 @@
+"""Benchmark encoder profiles: encode time and bytes per preset on a reference corpus."""
+import sys
+import time
+from pathlib import Path
+
+from PIL import Image
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.db import settings
+from app.utils import RENDITION_PRESETS, ENCODER_PROFILES, OUTPUT_FORMATS, FORMAT_QUALITY, create_rendition, save_rendition
+from app.renditions import RENDITION_FORMATS
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".tif", ".tiff", ".bmp"}
+
+
+def bench_encoders(corpus_dir: str, repeats: int = 3):
+    """Encode every preset with every profile and report mean ms and total bytes."""
+    paths = sorted(p for p in Path(corpus_dir).rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+    if not paths:
+        print(f"❌ No images found in {corpus_dir}")
+        return False
+
+    # Resize once up front so only the encode is timed
+    renditions = {preset: [] for preset in RENDITION_PRESETS}
+    for path in paths:
+        image = Image.open(path)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        for preset in RENDITION_PRESETS:
+            renditions[preset].append(create_rendition(image.copy(), preset))
+
+    print(f"Benchmarking {len(paths)} image(s) from {corpus_dir} ({repeats} repeats)\n")
+    print(f"{'format':<6} {'preset':<7} {'profile':<10} {'ms/image':>9} {'bytes':>10} {'vs balanced':>12}")
+
+    for fmt in RENDITION_FORMATS:
+        pillow_format = OUTPUT_FORMATS[fmt][0]
+        for preset, images in renditions.items():
+            results = {}
+            for profile in ENCODER_PROFILES:
+                # Warm-up pass so codec initialization isn't timed
+                save_rendition(images[0], format=pillow_format, quality=FORMAT_QUALITY[fmt], profile=profile)
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    total_bytes = sum(
+                        len(save_rendition(img, format=pillow_format, quality=FORMAT_QUALITY[fmt], profile=profile))
+                        for img in images
+                    )
+                elapsed_ms = 1000 * (time.perf_counter() - start) / (repeats * len(images))
+                results[profile] = (elapsed_ms, total_bytes)
+
+            base_bytes = results.get("balanced", next(iter(results.values())))[1] or 1
+            for profile, (elapsed_ms, total_bytes) in results.items():
+                assigned = " *" if RENDITION_PRESETS[preset].get("profile") == profile else ""
+                print(
+                    f"{fmt:<6} {preset:<7} {profile + assigned:<10} {elapsed_ms:>9.2f} {total_bytes:>10} "
+                    f"{100.0 * (total_bytes / base_bytes - 1):>+11.1f}%"
+                )
+        print()
+
+    print("* = profile currently assigned to the preset")
+    return True
+
+
+if __name__ == "__main__":
+    corpus = sys.argv[1] if len(sys.argv) > 1 else str(Path(settings.storage_path) / "originals")
+    bench_encoders(corpus)
@@ -0,0 +1,144 @@
+"""Benchmark tenant metrics (per-tenant queries, aggregated query, maintained counters) on a synthetic database."""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy import insert, select, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.db import Base
+from app.models import Tenant, Asset, Rendition
+from app.tenant_metrics import tenant_metrics_query, tenant_counters_query, reconcile_tenant_metrics
+
+CHUNK = 20000
+
+
+async def seed(session, tenants: int, assets: int, renditions_per_asset: int):
+    """Bulk-insert tenants, assets spread unevenly over them (some get none), and renditions."""
+    rng = random.Random(0)
+    await session.execute(insert(Tenant), [{"id": i, "name": f"tenant_{i}"} for i in range(1, tenants + 1)])
+    # Skewed distribution; tenants with no assets must still be reported
+    weights = [rng.paretovariate(1.2) for _ in range(tenants)]
+    owners = rng.choices(range(1, tenants + 1), weights=weights, k=assets)
+    for start in range(0, assets, CHUNK):
+        await session.execute(insert(Asset), [
+            {
+                "id": i + 1, "tenant_id": owners[i], "filename": f"{i + 1}.jpg",
+                "content_hash": f"{i + 1:064x}", "perceptual_hash": f"{rng.getrandbits(64):016x}",
+                "original_bytes": rng.randint(50_000, 5_000_000), "width": 2000, "height": 1500,
+            }
+            for i in range(start, min(start + CHUNK, assets))
+        ])
+        rows = []
+        for i in range(start, min(start + CHUNK, assets)):
+            for n in range(renditions_per_asset):
+                rows.append({
+                    "asset_id": i + 1, "preset": f"p{n}", "format": "jpeg", "file_path": f"r/{i + 1}_{n}.jpg",
+                    "bytes": rng.randint(2_000, 250_000), "width": 400, "height": 300,
+                })
+        if rows:
+            await session.execute(insert(Rendition), rows)
+        print(f"  seeded {min(start + CHUNK, assets)}/{assets} assets", end="\r")
+    await session.commit()
+    print()
+
+
+async def per_tenant_queries(session, tenant_id: int) -> tuple:
+    """The previous implementation: four aggregate queries per tenant."""
+    asset_count = (await session.execute(select(func.count(Asset.id)).where(Asset.tenant_id == tenant_id))).scalar_one()
+    rendition_count = (await session.execute(
+        select(func.count(Rendition.id)).join(Asset).where(Asset.tenant_id == tenant_id)
+    )).scalar_one()
+    asset_bytes = (await session.execute(
+        select(func.sum(Asset.original_bytes)).where(Asset.tenant_id == tenant_id)
+    )).scalar_one() or 0
+    rendition_bytes = (await session.execute(
+        select(func.sum(Rendition.bytes)).join(Asset).where(Asset.tenant_id == tenant_id)
+    )).scalar_one() or 0
+    return asset_count, rendition_count, asset_bytes + rendition_bytes
+
+
+async def read_all(session, query_for_page, page_size: int) -> tuple:
+    """Every tenant's row, one query per page (as GET /metrics/ pages through them)."""
+    after, rows, queries = 0, [], 0
+    while True:
+        page = select(Tenant.id, Tenant.name).where(Tenant.id > after).order_by(Tenant.id).limit(page_size).subquery()
+        batch = (await session.execute(query_for_page(page))).all()
+        queries += 1
+        rows.extend(batch)
+        if len(batch) < page_size:
+            return rows, queries
+        after = batch[-1].id
+
+
+async def bench_metrics(database_url: str, tenants: int, assets: int, renditions_per_asset: int,
+                        page_size: int, legacy_sample: int):
+    engine = create_async_engine(database_url)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with session_factory() as session:
+        started = time.perf_counter()
+        await seed(session, tenants, assets, renditions_per_asset)
+        print(f"Seeded {tenants} tenants, {assets} assets, {assets * renditions_per_asset} renditions "
+              f"in {time.perf_counter() - started:.1f}s\n")
+
+        started = time.perf_counter()
+        rows, queries = await read_all(session, tenant_metrics_query, page_size)
+        aggregated = time.perf_counter() - started
+        print(f"aggregated: {len(rows)} tenants in {queries} queries, {aggregated:.2f}s "
+              f"({1000 * aggregated / queries:.1f} ms per page of {page_size})")
+
+        # Previous approach on a sample of tenants, extrapolated to all of them
+        sample = random.Random(1).sample(range(1, tenants + 1), min(legacy_sample, tenants))
+        started = time.perf_counter()
+        legacy = {tenant_id: await per_tenant_queries(session, tenant_id) for tenant_id in sample}
+        elapsed = time.perf_counter() - started
+        print(f"per-tenant: {len(sample)} tenants in {4 * len(sample)} queries, {elapsed:.2f}s "
+              f"(~{elapsed * tenants / len(sample):.1f}s extrapolated to {tenants} tenants)")
+
+        # Both approaches must agree
+        by_id = {row.id: row for row in rows}
+        for tenant_id, (asset_count, rendition_count, total_bytes) in legacy.items():
+            row = by_id[tenant_id]
+            assert (row.asset_count, row.rendition_count, row.total_bytes) == \
+                (asset_count, rendition_count, total_bytes), tenant_id
+        print("✓ results match")
+
+        # Seeding bypassed the counters, so reconciliation fills them all in
+        started = time.perf_counter()
+        corrected = await reconcile_tenant_metrics(session, page_size)
+        print(f"reconcile:  {corrected} tenants corrected in {time.perf_counter() - started:.2f}s")
+
+        started = time.perf_counter()
+        counted, queries = await read_all(session, tenant_counters_query, page_size)
+        elapsed = time.perf_counter() - started
+        print(f"counters:   {len(counted)} tenants in {queries} queries, {elapsed:.2f}s "
+              f"({1000 * elapsed / queries:.1f} ms per page of {page_size})")
+        assert [tuple(row) for row in counted] == [tuple(row) for row in rows]
+        print("✓ counters match")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///./bench_metrics.db",
+                        help="Scratch database (its tables are dropped and recreated)")
+    parser.add_argument("--tenants", type=int, default=10_000)
+    parser.add_argument("--assets", type=int, default=1_000_000)
+    parser.add_argument("--renditions-per-asset", type=int, default=3)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--legacy-sample", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(bench_metrics(
+        args.database_url, args.tenants, args.assets, args.renditions_per_asset, args.page_size, args.legacy_sample
+    ))
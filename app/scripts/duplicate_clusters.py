@@ -0,0 +1,29 @@
+"""Report duplicate and near-duplicate asset clusters for a tenant (CSV export)."""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.db import init_db
+from app.clustering import export_duplicate_clusters, MAX_DISTANCE
+
+
+async def main(args):
+    await init_db()
+    await export_duplicate_clusters(
+        tenant_name=args.tenant,
+        max_distance=args.max_distance,
+        output=args.output,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("tenant", help="Tenant to scan")
+    parser.add_argument("--max-distance", type=int, default=4,
+                        help=f"Max perceptual hash distance between linked assets (0-{MAX_DISTANCE})")
+    parser.add_argument("--output", help="Report path relative to storage (default: reports/duplicates_<tenant>_<time>.csv)")
+    asyncio.run(main(parser.parse_args()))
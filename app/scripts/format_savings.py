@@ -0,0 +1,79 @@
+"""Measure WebP/AVIF byte savings over JPEG across a corpus of images."""
+import io
+import sys
+import time
+from pathlib import Path
+
+from PIL import Image
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.db import settings
+from app.utils import RENDITION_PRESETS, OUTPUT_FORMATS, FORMAT_QUALITY, compute_psnr, save_rendition
+from app.renditions import render_preset, RENDITION_FORMATS
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".tif", ".tiff", ".bmp"}
+
+
+def format_savings(corpus_dir: str):
+    """Render every preset in every configured format and report totals per format."""
+    paths = sorted(p for p in Path(corpus_dir).rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+    if not paths:
+        print(f"❌ No images found in {corpus_dir}")
+        return False
+
+    print(f"Measuring {len(paths)} image(s) from {corpus_dir}")
+    print(f"Formats: {RENDITION_FORMATS} (quality {[FORMAT_QUALITY[f] for f in RENDITION_FORMATS]})\n")
+
+    totals = {preset: {fmt: 0 for fmt in RENDITION_FORMATS} for preset in RENDITION_PRESETS}
+    psnr_sums = {fmt: 0.0 for fmt in RENDITION_FORMATS}
+    encode_seconds = {fmt: 0.0 for fmt in RENDITION_FORMATS}
+    samples = 0
+
+    for path in paths:
+        try:
+            image = Image.open(path)
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+        except Exception as e:
+            print(f"  ⚠ Skipping {path.name}: {e}")
+            continue
+
+        for preset in RENDITION_PRESETS:
+            rendition_image, _ = render_preset(image, preset, ())
+            for fmt in RENDITION_FORMATS:
+                start = time.perf_counter()
+                content = save_rendition(rendition_image, format=OUTPUT_FORMATS[fmt][0], quality=FORMAT_QUALITY[fmt])
+                encode_seconds[fmt] += time.perf_counter() - start
+                totals[preset][fmt] += len(content)
+                decoded = Image.open(io.BytesIO(content))
+                psnr = compute_psnr(rendition_image, decoded)
+                psnr_sums[fmt] += min(psnr, 100.0)
+            samples += 1
+
+    print(f"{'preset':<8}" + "".join(f"{fmt:>14}" for fmt in RENDITION_FORMATS))
+    for preset, by_format in totals.items():
+        jpeg_bytes = by_format["jpeg"] or 1
+        cells = []
+        for fmt in RENDITION_FORMATS:
+            change = 100.0 * (by_format[fmt] / jpeg_bytes - 1)
+            cells.append(f"{by_format[fmt]:>8}B" + (f" {change:+3.0f}%" if fmt != "jpeg" else "      "))
+        print(f"{preset:<8}" + "".join(f"{c:>14}" for c in cells))
+
+    jpeg_total = sum(t["jpeg"] for t in totals.values()) or 1
+    print()
+    for fmt in RENDITION_FORMATS:
+        fmt_total = sum(t[fmt] for t in totals.values())
+        print(
+            f"  {fmt:<5} total {fmt_total:>10} bytes "
+            f"({100.0 * (fmt_total / jpeg_total - 1):+.1f}% vs jpeg), "
+            f"mean PSNR {psnr_sums[fmt] / max(samples, 1):.2f} dB, "
+            f"encode {1000 * encode_seconds[fmt] / max(samples, 1):.1f} ms/rendition"
+        )
+    return True
+
+
+if __name__ == "__main__":
+    corpus = sys.argv[1] if len(sys.argv) > 1 else str(Path(settings.storage_path) / "originals")
+    format_savings(corpus)
@@ -0,0 +1,111 @@
+"""In-memory near-duplicate index over 64-bit perceptual hashes (multi-index hashing)."""
+import time
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Asset
+
+HASH_BITS = 64
+
+
+class HashIndex:
+    """
+    Multi-index hashing: each 64-bit hash is split into `chunks` equal
+    substrings, each indexed in its own table. Two hashes within Hamming
+    distance k must nearly agree on at least one substring (pigeonhole), so a
+    lookup probes only the buckets near the query's substrings and verifies
+    those candidates with a popcount.
+    """
+
+    def __init__(self, chunks: int = 4):
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        self._mask = (1 << self.chunk_bits) - 1
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(chunks)]
+        self._hashes: Dict[int, Tuple[int, int]] = {}  # asset_id -> (hash, tenant_id)
+        self.loaded_through = 0  # highest asset id loaded by refresh()
+        self.loaded_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def _substrings(self, value: int) -> List[int]:
+        return [(value >> (i * self.chunk_bits)) & self._mask for i in range(self.chunks)]
+
+    def add(self, asset_id: int, tenant_id: int, perceptual_hash: str):
+        """Index an asset's perceptual hash (hex)."""
+        if asset_id in self._hashes:
+            return
+        value = int(perceptual_hash, 16)
+        self._hashes[asset_id] = (value, tenant_id)
+        for table, substring in zip(self._tables, self._substrings(value)):
+            table.setdefault(substring, []).append(asset_id)
+
+    def _neighbours(self, substring: int, radius: int):
+        """All substring values within radius bits of substring."""
+        yield substring
+        for r in range(1, radius + 1):
+            for bits in combinations(range(self.chunk_bits), r):
+                flipped = substring
+                for bit in bits:
+                    flipped ^= 1 << bit
+                yield flipped
+
+    def search(
+        self,
+        perceptual_hash: str,
+        max_distance: int,
+        tenant_id: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[int, int]]:
+        """(asset_id, distance) pairs within max_distance, nearest first."""
+        value = int(perceptual_hash, 16)
+        # Generalized pigeonhole: with k = chunks * r + a, a match is within r
+        # bits on one of the first a + 1 substrings or within r - 1 on another
+        r, a = divmod(max_distance, self.chunks)
+        matches = {}
+        seen = set()
+        for i, (table, substring) in enumerate(zip(self._tables, self._substrings(value))):
+            radius = r if i <= a else r - 1
+            if radius < 0:
+                continue
+            for probe in self._neighbours(substring, radius):
+                for asset_id in table.get(probe, ()):
+                    if asset_id in seen:
+                        continue
+                    seen.add(asset_id)
+                    other, asset_tenant = self._hashes[asset_id]
+                    if tenant_id is not None and asset_tenant != tenant_id:
+                        continue
+                    distance = (value ^ other).bit_count()
+                    if distance <= max_distance:
+                        matches[asset_id] = distance
+        results = sorted(matches.items(), key=lambda item: (item[1], item[0]))
+        return results[:limit] if limit else results
+
+    async def refresh(self, session: AsyncSession, batch_size: int = 50000):
+        """
+        Load assets added since the last refresh (all of them on first call),
+        including ones uploaded through other processes.
+        """
+        while True:
+            result = await session.execute(
+                select(Asset.id, Asset.tenant_id, Asset.perceptual_hash)
+                .where(Asset.id > self.loaded_through)
+                .order_by(Asset.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            for row in rows:
+                self.add(row.id, row.tenant_id, row.perceptual_hash)
+            if rows:
+                self.loaded_through = rows[-1].id
+            if len(rows) < batch_size:
+                break
+        self.loaded_at = time.monotonic()
+
+
+similarity_index = HashIndex()
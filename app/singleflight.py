@@ -0,0 +1,27 @@
+"""Single-flight helper: concurrent callers for the same key share one in-flight task."""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key onto a single running task."""
+    
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+    
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn() for key unless a call for key is already running, in which
+        case wait for that call's result (or exception) instead.
+        """
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so one cancelled waiter doesn't cancel the work for the others
+        return await asyncio.shield(future)
+    
+    def in_flight(self, key: Hashable) -> bool:
+        """Check whether a call for key is currently running."""
+        return key in self._inflight
@@ -1,10 +1,16 @@
 """Storage adapter for local filesystem with S3 hooks."""
+import hashlib
 import os
 from pathlib import Path
 from typing import Optional
 from app.db import settings
 
 
+def rendition_digest(content: bytes) -> str:
+    """Short content digest used in rendition file names."""
+    return hashlib.sha256(content).hexdigest()[:16]
+
+
 class StorageAdapter:
     """Storage adapter for local filesystem. Includes hooks to swap to S3."""
     
@@ -14,24 +20,45 @@ class StorageAdapter:
         # Create subdirectories for organization
         (self.base_path / "originals").mkdir(exist_ok=True)
         (self.base_path / "renditions").mkdir(exist_ok=True)
+        (self.base_path / "variants").mkdir(exist_ok=True)
+        (self.base_path / "pyramids").mkdir(exist_ok=True)
     
-    def save_original(self, content: bytes, filename: str) -> str:
+    def save_original(self, content: bytes, filename: str, content_hash: str) -> str:
         """
-        Save original image file.
+        Save original image file under its content hash (keeping the extension),
+        so uploads sharing a client filename never overwrite each other.
         Returns: relative file path
         """
-        file_path = self.base_path / "originals" / filename
+        file_path = self.base_path / "originals" / f"{content_hash}{Path(filename).suffix.lower()}"
         file_path.write_bytes(content)
         return str(file_path.relative_to(self.base_path))
     
-    def save_rendition(self, content: bytes, preset: str, asset_id: int) -> str:
+    def save_rendition(self, content: bytes, preset: str, asset_id: int, extension: str = "jpg") -> str:
         """
-        Save rendition file.
+        Save rendition file, named by a digest of its content so a stored
+        file is never overwritten with different bytes (racing renders and
+        re-renders each get their own file). Written to a temporary file and
+        renamed, like variants.
         Returns: relative file path
         """
-        filename = f"{asset_id}_{preset}.jpg"
+        filename = f"{asset_id}_{preset}_{rendition_digest(content)}.{extension}"
         file_path = self.base_path / "renditions" / filename
-        file_path.write_bytes(content)
+        tmp_path = file_path.with_name(f".{filename}.tmp")
+        tmp_path.write_bytes(content)
+        tmp_path.replace(file_path)
+        return str(file_path.relative_to(self.base_path))
+    
+    def save_variant(self, content: bytes, name: str) -> str:
+        """
+        Save a derived (dynamically resized) variant file. Written to a
+        temporary file and renamed, so a response already streaming an older
+        copy keeps reading it intact.
+        Returns: relative file path
+        """
+        file_path = self.base_path / "variants" / name
+        tmp_path = file_path.with_name(f".{name}.tmp")
+        tmp_path.write_bytes(content)
+        tmp_path.replace(file_path)
         return str(file_path.relative_to(self.base_path))
     
     def read_file(self, relative_path: str) -> bytes:
@@ -50,6 +77,10 @@ class StorageAdapter:
     def file_exists(self, relative_path: str) -> bool:
         """Check if file exists."""
         return (self.base_path / relative_path).exists()
+    
+    def local_path(self, relative_path: str) -> Path:
+        """Absolute filesystem path for a stored file (used for zero-copy serving)."""
+        return self.base_path / relative_path
 
 
 # S3 adapter hook (commented out - implement when needed)
@@ -63,13 +94,13 @@ class S3StorageAdapter:
         self.s3_client = boto3.client("s3", region_name=region)
         self.bucket_name = bucket_name
     
-    def save_original(self, content: bytes, filename: str) -> str:
-        key = f"originals/{filename}"
+    def save_original(self, content: bytes, filename: str, content_hash: str) -> str:
+        key = f"originals/{content_hash}{Path(filename).suffix.lower()}"
         self.s3_client.put_object(Bucket=self.bucket_name, Key=key, Body=content)
         return key
     
-    def save_rendition(self, content: bytes, preset: str, asset_id: int) -> str:
-        key = f"renditions/{asset_id}_{preset}.jpg"
+    def save_rendition(self, content: bytes, preset: str, asset_id: int, extension: str = "jpg") -> str:
+        key = f"renditions/{asset_id}_{preset}_{rendition_digest(content)}.{extension}"
         self.s3_client.put_object(Bucket=self.bucket_name, Key=key, Body=content)
         return key
     
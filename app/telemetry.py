@@ -0,0 +1,164 @@
+"""Per-route HTTP metrics collected by an ASGI middleware, rendered in Prometheus text format."""
+from bisect import bisect_left
+from time import perf_counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Histogram upper bounds (le); a final +Inf bucket is implicit
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+# Route label for requests no route matched (404s); raw paths would explode cardinality
+UNMATCHED = "<unmatched>"
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and two additions."""
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class RouteStats:
+    """Everything recorded for one (method, route template)."""
+    __slots__ = ("latency", "request_bytes", "response_bytes", "statuses")
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.request_bytes = Histogram(SIZE_BUCKETS)
+        self.response_bytes = Histogram(SIZE_BUCKETS)
+        self.statuses: Dict[int, int] = {}
+
+
+class HTTPMetrics:
+    """
+    Request metrics of this process, updated from the event loop only (so no
+    locking). Counters are cumulative since startup, as Prometheus expects;
+    with several server processes each is scraped separately.
+    """
+
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], RouteStats] = {}
+        self.in_flight = 0
+
+    def observe(self, method: str, route: str, status: int, seconds: float, request_bytes: int, response_bytes: int):
+        stats = self.routes.get((method, route))
+        if stats is None:
+            stats = self.routes[(method, route)] = RouteStats()
+        stats.latency.observe(seconds)
+        stats.request_bytes.observe(request_bytes)
+        stats.response_bytes.observe(response_bytes)
+        stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+
+http_metrics = HTTPMetrics()
+
+
+class HTTPMetricsMiddleware:
+    """
+    Pure ASGI middleware (BaseHTTPMiddleware would add a task and memory
+    streams per request) recording latency, body sizes and status per route
+    template, as matched by the router, plus the number of requests in flight.
+    """
+
+    def __init__(self, app, metrics: HTTPMetrics = http_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = self.metrics
+        status = 500  # if the app raises before responding
+        request_bytes = 0
+        response_bytes = 0
+
+        async def counting_receive():
+            nonlocal request_bytes
+            message = await receive()
+            request_bytes += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal status, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            elif message["type"] == "http.response.zerocopysend":
+                # File sent by the server (see app.responses); count is its length
+                response_bytes += message.get("count") or 0
+            await send(message)
+
+        metrics.in_flight += 1
+        started = perf_counter()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            elapsed = perf_counter() - started
+            metrics.in_flight -= 1
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            metrics.observe(
+                scope["method"], route.path if route is not None else UNMATCHED,
+                status, elapsed, request_bytes, response_bytes,
+            )
+
+
+def _labels(**labels) -> str:
+    escaped = (
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def metric_family(name: str, kind: str, help: str, samples: Iterable[Tuple[dict, object]]) -> List[str]:
+    """Exposition lines of one metric family; samples are (labels, value) pairs."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(**labels) if labels else ''} {_format(value)}")
+    return lines
+
+
+def _histogram_family(name: str, help: str, series: Iterable[Tuple[dict, Histogram]]) -> List[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+    for labels, histogram in series:
+        cumulative = 0
+        for bound, count in zip(list(histogram.bounds) + ["+Inf"], histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(**labels)} {_format(histogram.sum)}")
+        lines.append(f"{name}_count{_labels(**labels)} {cumulative}")
+    return lines
+
+
+def render_http_metrics(metrics: HTTPMetrics = http_metrics) -> List[str]:
+    """Exposition lines of the HTTP metrics."""
+    routes = sorted(metrics.routes.items())
+
+    def series(attribute: str):
+        return [({"method": method, "route": route}, getattr(stats, attribute)) for (method, route), stats in routes]
+
+    lines = metric_family("http_requests_in_flight", "gauge", "HTTP requests being served", [({}, metrics.in_flight)])
+    lines += metric_family("http_requests_total", "counter", "HTTP requests by route and status", [
+        ({"method": method, "route": route, "status": status}, count)
+        for (method, route), stats in routes
+        for status, count in sorted(stats.statuses.items())
+    ])
+    lines += _histogram_family("http_request_duration_seconds", "HTTP request latency", series("latency"))
+    lines += _histogram_family("http_request_size_bytes", "HTTP request body size", series("request_bytes"))
+    lines += _histogram_family("http_response_size_bytes", "HTTP response body size", series("response_bytes"))
+    return lines
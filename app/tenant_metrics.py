@@ -0,0 +1,167 @@
+"""Per-tenant usage counters (TenantMetrics), maintained incrementally and reconciled periodically."""
+import asyncio
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import AsyncSessionLocal, settings
+from app.models import Tenant, Asset, Rendition, TenantMetrics
+
+
+async def _add_usage(session: AsyncSession, tenant_id: int, assets: int, renditions: int, bytes: int):
+    dialect = postgresql if session.get_bind().dialect.name == "postgresql" else sqlite
+    insert = dialect.insert(TenantMetrics).values(
+        tenant_id=tenant_id, asset_count=assets, rendition_count=renditions, total_bytes=bytes
+    )
+    await session.execute(
+        insert.on_conflict_do_update(
+            index_elements=[TenantMetrics.tenant_id],
+            set_={
+                "asset_count": TenantMetrics.asset_count + insert.excluded.asset_count,
+                "rendition_count": TenantMetrics.rendition_count + insert.excluded.rendition_count,
+                "total_bytes": TenantMetrics.total_bytes + insert.excluded.total_bytes,
+                "updated_at": func.now(),
+            },
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def record_usage(
+    session: AsyncSession,
+    tenant_id: int,
+    assets: int = 0,
+    renditions: int = 0,
+    bytes: int = 0,
+):
+    """
+    Add deltas to a tenant's counters inside the caller's transaction, so they
+    commit (or roll back) together with the rows they count. A single upsert
+    (INSERT ... ON CONFLICT (tenant_id) DO UPDATE SET x = x + delta) creates
+    the row on first use, so concurrent writers neither lose increments nor
+    race to insert a tenant's first row.
+    """
+    if assets or renditions or bytes:
+        await _add_usage(session, tenant_id, assets, renditions, bytes)
+
+
+async def record_renditions(session: AsyncSession, tenant_id: int, renditions):
+    """record_usage for newly added rendition rows."""
+    renditions = list(renditions)
+    await record_usage(session, tenant_id, renditions=len(renditions), bytes=sum(r.bytes for r in renditions))
+
+
+def tenant_metrics_query(tenants):
+    """
+    Exact usage of the tenants selected by `tenants` (a subquery with id and
+    name), recomputed from the assets and renditions tables in one statement.
+    Assets and renditions are aggregated per tenant in separate grouped
+    subqueries (joining both first would count every asset once per
+    rendition), then LEFT JOINed so tenants without assets report zeros.
+    """
+    tenant_ids = select(tenants.c.id)
+    asset_stats = (
+        select(
+            Asset.tenant_id,
+            func.count(Asset.id).label("asset_count"),
+            func.sum(Asset.original_bytes).label("asset_bytes"),
+        )
+        .where(Asset.tenant_id.in_(tenant_ids))
+        .group_by(Asset.tenant_id)
+        .subquery()
+    )
+    rendition_stats = (
+        select(
+            Asset.tenant_id,
+            func.count(Rendition.id).label("rendition_count"),
+            func.sum(Rendition.bytes).label("rendition_bytes"),
+        )
+        .join(Asset, Rendition.asset_id == Asset.id)
+        .where(Asset.tenant_id.in_(tenant_ids))
+        .group_by(Asset.tenant_id)
+        .subquery()
+    )
+    return (
+        select(
+            tenants.c.id,
+            tenants.c.name,
+            func.coalesce(asset_stats.c.asset_count, 0).label("asset_count"),
+            func.coalesce(rendition_stats.c.rendition_count, 0).label("rendition_count"),
+            (
+                func.coalesce(asset_stats.c.asset_bytes, 0) + func.coalesce(rendition_stats.c.rendition_bytes, 0)
+            ).label("total_bytes"),
+        )
+        .outerjoin(asset_stats, asset_stats.c.tenant_id == tenants.c.id)
+        .outerjoin(rendition_stats, rendition_stats.c.tenant_id == tenants.c.id)
+        .order_by(tenants.c.id)
+    )
+
+
+def tenant_counters_query(tenants):
+    """Counter-based usage of the tenants selected by `tenants`: O(tenants), same columns as tenant_metrics_query."""
+    return (
+        select(
+            tenants.c.id,
+            tenants.c.name,
+            func.coalesce(TenantMetrics.asset_count, 0).label("asset_count"),
+            func.coalesce(TenantMetrics.rendition_count, 0).label("rendition_count"),
+            func.coalesce(TenantMetrics.total_bytes, 0).label("total_bytes"),
+        )
+        .outerjoin(TenantMetrics, TenantMetrics.tenant_id == tenants.c.id)
+        .order_by(tenants.c.id)
+    )
+
+
+async def reconcile_tenant_metrics(session: AsyncSession, batch_size: int = 1000) -> int:
+    """
+    Recompute every tenant's usage and correct counters that drifted (or are
+    missing), a page of tenants per transaction. Corrections are applied as
+    deltas against the counters read in the same statement, so increments
+    committed meanwhile are kept. Returns the number of tenants corrected.
+    """
+    corrected = 0
+    after = 0
+    while True:
+        page = select(Tenant.id, Tenant.name).where(Tenant.id > after).order_by(Tenant.id).limit(batch_size).subquery()
+        actual = tenant_metrics_query(page).subquery()
+        result = await session.execute(
+            select(
+                actual,
+                TenantMetrics.id.label("counter_id"),
+                TenantMetrics.asset_count.label("counted_assets"),
+                TenantMetrics.rendition_count.label("counted_renditions"),
+                TenantMetrics.total_bytes.label("counted_bytes"),
+            )
+            .outerjoin(TenantMetrics, TenantMetrics.tenant_id == actual.c.id)
+            .order_by(actual.c.id)
+        )
+        rows = result.all()
+        for row in rows:
+            # A missing counter row counts as zeros (the upsert creates it)
+            counted = (row.counted_assets or 0, row.counted_renditions or 0, row.counted_bytes or 0)
+            if row.counter_id is None or counted != (row.asset_count, row.rendition_count, row.total_bytes):
+                await _add_usage(
+                    session, row.id,
+                    row.asset_count - counted[0],
+                    row.rendition_count - counted[1],
+                    row.total_bytes - counted[2],
+                )
+                corrected += 1
+        await session.commit()
+        if len(rows) < batch_size:
+            return corrected
+        after = rows[-1].id
+
+
+async def reconcile_loop():
+    """Reconcile at startup, then every METRICS_RECONCILE_INTERVAL seconds."""
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                corrected = await reconcile_tenant_metrics(session)
+            if corrected:
+                print(f"✓ Reconciled tenant metrics ({corrected} tenant(s) corrected)")
+        except Exception as e:
+            print(f"⚠ Tenant metrics reconciliation failed: {e}")
+        await asyncio.sleep(settings.metrics_reconcile_interval)
@@ -0,0 +1,232 @@
+"""Time-bucketed per-tenant usage rollups: buffered in memory, flushed periodically, downsampled with age."""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import AsyncSessionLocal, settings
+from app.models import UsageRollup
+
+HOUR = "hour"
+DAY = "day"
+GRANULARITIES = (HOUR, DAY)
+COUNTERS = ("uploads", "renditions", "bytes_stored", "cpu_seconds")
+
+# Seconds between downsampling passes of the flush loop
+DOWNSAMPLE_INTERVAL = 3600
+
+
+def as_utc(moment: datetime) -> datetime:
+    """moment as an aware UTC datetime (naive values are taken to be UTC already)."""
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def bucket_start(moment: datetime, granularity: str = HOUR) -> datetime:
+    """Start (UTC) of the hour or day bucket containing moment."""
+    moment = as_utc(moment).replace(minute=0, second=0, microsecond=0)
+    if granularity == DAY:
+        moment = moment.replace(hour=0)
+    return moment
+
+
+async def add_to_bucket(
+    session: AsyncSession,
+    tenant_id: int,
+    granularity: str,
+    start: datetime,
+    counts: Dict[str, float],
+):
+    """Add counts to a bucket row inside the caller's transaction, creating it if needed."""
+    result = await session.execute(
+        update(UsageRollup)
+        .where(
+            UsageRollup.tenant_id == tenant_id,
+            UsageRollup.granularity == granularity,
+            UsageRollup.bucket_start == start,
+        )
+        .values({name: getattr(UsageRollup, name) + value for name, value in counts.items()})
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        session.add(UsageRollup(tenant_id=tenant_id, granularity=granularity, bucket_start=start, **counts))
+
+
+class UsageBuffer:
+    """
+    Usage increments aggregated in memory per (tenant, hour) and written in
+    one transaction per flush, so recording usage costs a dict update rather
+    than a database write per upload or job. Increments of a failed flush are
+    kept for the next one; whatever is pending when the process dies is lost
+    (at most one flush interval).
+    """
+
+    def __init__(self):
+        self._pending: Dict[Tuple[int, datetime], Dict[str, float]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(
+        self,
+        tenant_id: int,
+        uploads: int = 0,
+        renditions: int = 0,
+        bytes: int = 0,
+        cpu_seconds: float = 0.0,
+        at: Optional[datetime] = None,
+    ):
+        """Record usage in the hour bucket of at (default: now)."""
+        if not (uploads or renditions or bytes or cpu_seconds):
+            return
+        key = (tenant_id, bucket_start(at or datetime.now(timezone.utc)))
+        counts = self._pending.setdefault(key, dict.fromkeys(COUNTERS, 0))
+        counts["uploads"] += uploads
+        counts["renditions"] += renditions
+        counts["bytes_stored"] += bytes
+        counts["cpu_seconds"] += cpu_seconds
+
+    def _restore(self, pending: Dict[Tuple[int, datetime], Dict[str, float]]):
+        for key, counts in pending.items():
+            merged = self._pending.setdefault(key, dict.fromkeys(COUNTERS, 0))
+            for name, value in counts.items():
+                merged[name] += value
+
+    async def flush(self, session: AsyncSession) -> int:
+        """Write pending increments into their hourly rows; returns the number of buckets written."""
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            for (tenant_id, start), counts in pending.items():
+                await add_to_bucket(session, tenant_id, HOUR, start, counts)
+            await session.commit()
+        except BaseException:
+            # Includes another process creating the same bucket first; the
+            # retry next flush finds its row and updates it
+            await session.rollback()
+            self._restore(pending)
+            raise
+        return len(pending)
+
+    async def _flush_loop(self):
+        last_downsample = 0.0
+        while True:
+            await asyncio.sleep(settings.usage_flush_interval)
+            try:
+                async with AsyncSessionLocal() as session:
+                    await self.flush(session)
+                    if time.monotonic() - last_downsample >= DOWNSAMPLE_INTERVAL:
+                        last_downsample = time.monotonic()
+                        folded = await downsample(session, hourly_cutoff())
+                        if folded:
+                            print(f"✓ Folded {folded} hourly usage bucket(s) into daily ones")
+            except Exception as e:
+                print(f"⚠ Usage rollup flush failed: {e}")
+
+    def start(self):
+        """Flush every USAGE_FLUSH_INTERVAL seconds (no-op if already running in this process)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """Stop the flush loop and write what is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        try:
+            async with AsyncSessionLocal() as session:
+                await self.flush(session)
+        except Exception as e:
+            print(f"⚠ Final usage rollup flush failed: {e}")
+
+
+usage_buffer = UsageBuffer()
+
+
+def hourly_cutoff(now: Optional[datetime] = None) -> datetime:
+    """Hourly buckets before this (a day boundary USAGE_HOURLY_DAYS back) get downsampled."""
+    now = now or datetime.now(timezone.utc)
+    return bucket_start(now - timedelta(days=settings.usage_hourly_days), DAY)
+
+
+async def downsample(session: AsyncSession, cutoff: datetime, batch_size: int = 1000) -> int:
+    """
+    Fold hourly buckets starting before cutoff into daily buckets, a batch
+    per transaction. Hourly rows are deleted before their counts are added,
+    and a batch whose rows another process deleted first is rolled back, so
+    concurrent passes never count an hour twice. Returns the rows folded.
+    """
+    cutoff = as_utc(cutoff)
+    folded = 0
+    while True:
+        result = await session.execute(
+            select(UsageRollup)
+            .where(UsageRollup.granularity == HOUR, UsageRollup.bucket_start < cutoff)
+            .order_by(UsageRollup.id)
+            .limit(batch_size)
+        )
+        rows = list(result.scalars().all())
+        if not rows:
+            return folded
+
+        days: Dict[Tuple[int, datetime], Dict[str, float]] = {}
+        for row in rows:
+            counts = days.setdefault((row.tenant_id, bucket_start(row.bucket_start, DAY)), dict.fromkeys(COUNTERS, 0))
+            for name in COUNTERS:
+                counts[name] += getattr(row, name)
+
+        deleted = await session.execute(
+            delete(UsageRollup)
+            .where(UsageRollup.id.in_([row.id for row in rows]))
+            .execution_options(synchronize_session=False)
+        )
+        if deleted.rowcount != len(rows):
+            await session.rollback()
+            return folded
+        for (tenant_id, start), counts in days.items():
+            await add_to_bucket(session, tenant_id, DAY, start, counts)
+        await session.commit()
+        folded += len(rows)
+        # Rows were loaded into the session; drop them before the next batch
+        session.expunge_all()
+
+
+async def usage_buckets(
+    session: AsyncSession,
+    tenant_id: int,
+    start: datetime,
+    end: datetime,
+    granularity: str = HOUR,
+) -> List[dict]:
+    """
+    Buckets of tenant_id starting in [start, end), oldest first. Daily
+    results also fold in hourly buckets not downsampled yet; hourly results
+    only cover the last USAGE_HOURLY_DAYS days.
+    """
+    stored = (HOUR, DAY) if granularity == DAY else (HOUR,)
+    result = await session.execute(
+        select(UsageRollup)
+        .where(
+            UsageRollup.tenant_id == tenant_id,
+            UsageRollup.granularity.in_(stored),
+            UsageRollup.bucket_start >= bucket_start(start, granularity),
+            UsageRollup.bucket_start < as_utc(end),
+        )
+        .order_by(UsageRollup.bucket_start)
+    )
+    buckets: Dict[datetime, Dict[str, float]] = {}
+    for row in result.scalars():
+        counts = buckets.setdefault(bucket_start(row.bucket_start, granularity), dict.fromkeys(COUNTERS, 0))
+        for name in COUNTERS:
+            counts[name] += getattr(row, name)
+    return [{"bucket_start": moment, **counts} for moment, counts in sorted(buckets.items())]
@@ -1,26 +1,119 @@
 """Image processing utilities and quality metrics."""
 import io
 from PIL import Image
-import numpy as np
 from app.hashing import hash_distance
+from app.quality import prepare, psnr, compare as compare_metrics
 
 
-# Rendition presets
+# Rendition presets (max_bytes is the per-rendition budget for QUALITY_MODE=bytes,
+# profile picks the encoder speed/size trade-off from ENCODER_PROFILES)
 RENDITION_PRESETS = {
-    "thumb": {"size": (100, 100), "fit": True},
-    "card": {"size": (400, 400), "fit": True},
-    "zoom": {"size": (1200, 1200), "fit": False},  # max dimension
+    "thumb": {"size": (100, 100), "fit": True, "max_bytes": 6 * 1024, "profile": "fast"},
+    "card": {"size": (400, 400), "fit": True, "max_bytes": 40 * 1024, "profile": "balanced"},
+    "zoom": {"size": (1200, 1200), "fit": False, "max_bytes": 250 * 1024, "profile": "detail"},  # max dimension
 }
 
+# Encoder profiles: JPEG optimize/progressive/subsampling/qtables (qtables None =
+# standard Annex K tables, or a Pillow preset name such as "web_high"; either
+# is scaled by the encode quality), plus the equivalent WebP method and AVIF
+# speed knobs. Chroma subsampling is the only lossy knob besides quality:
+# 4:2:0 halves colour resolution both ways (invisible at thumb/card sizes),
+# 4:4:4 keeps it, for large views where colour edges and text show fringes.
+ENCODER_PROFILES = {
+    # Single Huffman pass: cheapest encode, a few % larger (good for tiny thumbs)
+    "fast": {"optimize": False, "progressive": False, "subsampling": "4:2:0", "qtables": None,
+             "webp_method": 2, "avif_speed": 8},
+    # Optimized Huffman tables (previous default behaviour)
+    "balanced": {"optimize": True, "progressive": False, "subsampling": "4:2:0", "qtables": None,
+                 "webp_method": 4, "avif_speed": 6},
+    # Progressive scans + optimized tables: smallest files, renders coarse-to-fine
+    "smallest": {"optimize": True, "progressive": True, "subsampling": "4:2:0", "qtables": None,
+                 "webp_method": 6, "avif_speed": 4},
+    # As smallest, but with full chroma resolution (zoom)
+    "detail": {"optimize": True, "progressive": True, "subsampling": "4:4:4", "qtables": None,
+               "webp_method": 6, "avif_speed": 4},
+}
+
+# Output formats: name -> (Pillow format, media type, file extension)
+OUTPUT_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+    "webp": ("WEBP", "image/webp", "webp"),
+    "png": ("PNG", "image/png", "png"),
+}
+
+# AVIF only if this Pillow build can encode it
+try:
+    from PIL import features
+    if features.check("avif"):
+        OUTPUT_FORMATS["avif"] = ("AVIF", "image/avif", "avif")
+except Exception:
+    pass
+
+# Default encoder quality per format (roughly equivalent visual quality)
+FORMAT_QUALITY = {"jpeg": 85, "webp": 80, "avif": 60, "png": None}
+
+# Server preference when the client accepts several formats equally
+FORMAT_PREFERENCE = ("avif", "webp", "jpeg")
+
+
+def rendition_formats(configured: str) -> list[str]:
+    """Formats to generate for renditions: configured list minus unsupported ones (JPEG always)."""
+    formats = ["jpeg"]
+    for name in configured.split(","):
+        name = name.strip().lower()
+        if name in OUTPUT_FORMATS and name not in formats:
+            formats.append(name)
+    return formats
+
+
+def negotiate_format(accept: str, available: list[str]) -> str:
+    """
+    Pick the best available format for an `Accept` header.
+    Honours q-values (q=0 excludes a format); falls back to JPEG.
+    Ties are broken by FORMAT_PREFERENCE (smallest files first).
+    """
+    accepted = {}
+    for part in (accept or "").split(","):
+        media_range, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        accepted[media_range.lower()] = q
+
+    def quality_for(name: str) -> float:
+        media_type = OUTPUT_FORMATS[name][1]
+        # Wildcards only vouch for JPEG: many clients send image/* without
+        # being able to decode WebP/AVIF, so those must be listed explicitly
+        keys = (media_type, "image/*", "*/*") if name == "jpeg" else (media_type,)
+        for key in keys:
+            if key in accepted:
+                return accepted[key]
+        return 0.0
+
+    candidates = [
+        (quality_for(name), -FORMAT_PREFERENCE.index(name), name)
+        for name in FORMAT_PREFERENCE
+        if name in available and name in OUTPUT_FORMATS
+    ]
+    candidates = [c for c in candidates if c[0] > 0]
+    if not candidates:
+        return "jpeg"
+    return max(candidates)[2]
+
 
-def create_rendition(image: Image.Image, preset: str) -> Image.Image:
+def create_rendition(image: Image.Image, preset: str, config: dict = None) -> Image.Image:
     """
     Create a rendition from original image based on preset.
     - thumb: 100x100 fit (maintains aspect ratio)
     - card: 400x400 fit (maintains aspect ratio)
     - zoom: max 1200px on longer edge (maintains aspect ratio)
+    config overrides the built-in preset (e.g. from the preset registry).
     """
-    config = RENDITION_PRESETS[preset]
+    config = config or RENDITION_PRESETS[preset]
     size = config["size"]
     fit = config["fit"]
     
@@ -36,65 +129,149 @@ def create_rendition(image: Image.Image, preset: str) -> Image.Image:
     return image
 
 
-def save_rendition(image: Image.Image, format: str = "JPEG", quality: int = 85) -> bytes:
-    """Save image to bytes with specified format and quality."""
+def preset_output_size(original_size: tuple[int, int], config: dict) -> tuple[int, int]:
+    """Dimensions create_rendition will produce for an image of original_size (never upscales)."""
+    width, height = original_size
+    box_w, box_h = config["size"]
+    if not config["fit"]:
+        box_w = box_h = max(config["size"])
+    scale = min(box_w / width, box_h / height, 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def encoder_options(format: str, profile: str = "balanced") -> dict:
+    """Pillow save() keyword arguments for a format under an encoder profile."""
+    config = ENCODER_PROFILES[profile]
+    if format == "JPEG":
+        options = {
+            "optimize": config["optimize"],
+            "progressive": config["progressive"],
+            "subsampling": config["subsampling"],
+        }
+        if config["qtables"]:
+            options["qtables"] = config["qtables"]
+        return options
+    if format == "WEBP":
+        return {"method": config["webp_method"]}
+    if format == "AVIF":
+        return {"speed": config["avif_speed"]}
+    return {"optimize": config["optimize"]}
+
+
+def save_rendition(image: Image.Image, format: str = "JPEG", quality: int = 85, profile: str = "balanced") -> bytes:
+    """Save image to bytes with specified format, quality and encoder profile."""
     buffer = io.BytesIO()
-    image.save(buffer, format=format, quality=quality, optimize=True)
+    image.save(buffer, format=format, quality=quality, **encoder_options(format, profile))
     return buffer.getvalue()
 
 
+def _probe_image(image: Image.Image, probe_size: int) -> Image.Image:
+    """Downsampled copy used to evaluate candidate qualities cheaply."""
+    if max(image.size) <= probe_size:
+        return image
+    probe = image.copy()
+    probe.thumbnail((probe_size, probe_size), Image.Resampling.BILINEAR)
+    return probe
+
+
+def choose_quality(
+    image: Image.Image,
+    format: str = "JPEG",
+    target_psnr: float = None,
+    max_bytes: int = None,
+    min_quality: int = 40,
+    max_quality: int = 95,
+    probe_size: int = 256,
+    profile: str = "balanced",
+) -> tuple[int, bytes]:
+    """
+    Binary-search the encoder quality for one image.
+    - target_psnr: lowest quality whose PSNR vs the source is >= target
+    - max_bytes: highest quality whose output fits in max_bytes
+    The search runs on a downsampled probe; only the final pick is encoded at
+    full size, then checked there and corrected in steps of 5 (down until it
+    fits max_bytes, up until it meets target_psnr), since a probe misses fine
+    detail. PSNR probes use the fast profile since Huffman optimization and
+    progressive scans are lossless.
+    Returns: (quality, encoded bytes at that quality)
+    """
+    if target_psnr is None and max_bytes is None:
+        return max_quality, save_rendition(image, format=format, quality=max_quality, profile=profile)
+
+    probe = _probe_image(image, probe_size)
+    # Bytes scale roughly with pixel count between probe and full size
+    scale = (image.width * image.height) / (probe.width * probe.height)
+    # Probe pixels are converted once, not per search step
+    reference = prepare(probe) if target_psnr is not None else None
+
+    def acceptable(quality: int) -> bool:
+        if target_psnr is not None:
+            content = save_rendition(probe, format=format, quality=quality, profile="fast")
+            decoded = Image.open(io.BytesIO(content))
+            return psnr(reference, prepare(decoded)) >= target_psnr
+        content = save_rendition(probe, format=format, quality=quality, profile=profile)
+        return len(content) * scale <= max_bytes
+
+    lo, hi = min_quality, max_quality
+    if target_psnr is not None:
+        # Lowest acceptable quality (PSNR grows with quality)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if acceptable(mid):
+                hi = mid
+            else:
+                lo = mid + 1
+        quality = lo
+    else:
+        # Highest acceptable quality (size grows with quality)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if acceptable(mid):
+                lo = mid
+            else:
+                hi = mid - 1
+        quality = lo
+
+    content = save_rendition(image, format=format, quality=quality, profile=profile)
+    if target_psnr is not None:
+        # The probe only estimates full-size PSNR; step up until it really meets the target
+        full = prepare(image)
+        while quality < max_quality and psnr(full, prepare(Image.open(io.BytesIO(content)))) < target_psnr:
+            quality = min(max_quality, quality + 5)
+            content = save_rendition(image, format=format, quality=quality, profile=profile)
+    elif max_bytes is not None:
+        # The probe only estimates full-size bytes; step down until it really fits
+        while len(content) > max_bytes and quality > min_quality:
+            quality = max(min_quality, quality - 5)
+            content = save_rendition(image, format=format, quality=quality, profile=profile)
+    return quality, content
+
+
 def compute_psnr(image1: Image.Image, image2: Image.Image) -> float:
     """
     Compute Peak Signal-to-Noise Ratio (PSNR) between two images.
     Higher PSNR = better quality (typically > 30 dB is good).
-    Returns PSNR in decibels.
+    image2 is resized to image1's size if they differ; identical images
+    give MAX_PSNR_DB. Returns PSNR in decibels.
     """
-    # Convert to RGB if needed
-    img1 = image1.convert("RGB")
-    img2 = image2.convert("RGB")
-    
-    # Convert to numpy arrays
-    arr1 = np.array(img1, dtype=np.float64)
-    arr2 = np.array(img2, dtype=np.float64)
-    
-    # Ensure same dimensions
-    if arr1.shape != arr2.shape:
-        # Resize image2 to match image1
-        img2_resized = img2.resize(img1.size, Image.Resampling.LANCZOS)
-        arr2 = np.array(img2_resized, dtype=np.float64)
-    
-    # Compute MSE (Mean Squared Error)
-    mse = np.mean((arr1 - arr2) ** 2)
-    
-    if mse == 0:
-        return float("inf")  # Images are identical
-    
-    # PSNR = 20 * log10(MAX_PIXEL_VALUE / sqrt(MSE))
-    max_pixel = 255.0
-    psnr = 20 * np.log10(max_pixel / np.sqrt(mse))
-    
-    return float(psnr)
+    return float(psnr(prepare(image1), prepare(image2, image1.size)))
 
 
-def compare_images(original: Image.Image, rendition: Image.Image, 
-                  original_hash: str, rendition_hash: str) -> dict:
+def compare_images(original: Image.Image, rendition: Image.Image,
+                  original_hash: str, rendition_hash: str, max_side: int = 1024) -> dict:
     """
     Compare original and rendition images.
-    Returns dict with file size, PSNR, and perceptual hash distance.
+    Returns dict with PSNR, SSIM, MS-SSIM (evaluated at up to max_side
+    pixels) and perceptual hash distance.
     """
-    # Convert rendition to bytes to get file size
-    rendition_bytes = save_rendition(rendition)
-    
-    # Compute PSNR
-    psnr = compute_psnr(original, rendition)
-    
-    # Compute perceptual hash distance
+    metrics = compare_metrics(original, rendition, ("psnr", "ssim", "ms_ssim"), max_side)
     phash_dist = hash_distance(original_hash, rendition_hash)
-    
+
     return {
-        "file_size_bytes": len(rendition_bytes),
-        "psnr_db": psnr,
+        "psnr_db": metrics["psnr"],
+        "ssim": metrics["ssim"],
+        "ms_ssim": metrics["ms_ssim"],
         "perceptual_hash_distance": phash_dist,
-        "note": "PSNR > 30 dB is good quality. Lower hash distance = more similar."
+        "note": "PSNR > 30 dB is good quality. SSIM near 1 = structurally identical. Lower hash distance = more similar."
     }
 
@@ -0,0 +1,253 @@
+"""Dynamic resize variants: allow-list validation, source selection and LRU cache."""
+import asyncio
+import io
+import math
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from PIL import Image, ImageOps
+
+from app.db import settings
+from app.models import Asset, Rendition
+from app.storage import storage
+from app.utils import OUTPUT_FORMATS, save_rendition
+from app.renditions import smallest_covering
+
+
+FIT_MODES = ("contain", "cover")
+
+
+def _parse_int_list(value: str) -> List[int]:
+    return sorted({int(v) for v in value.split(",") if v.strip()})
+
+
+ALLOWED_SIZES = _parse_int_list(settings.resize_widths)
+ALLOWED_QUALITIES = _parse_int_list(settings.resize_qualities)
+
+
+@dataclass(frozen=True)
+class VariantSpec:
+    """Validated dynamic resize parameters."""
+    width: Optional[int]
+    height: Optional[int]
+    fit: str = "contain"
+    format: str = "jpeg"
+    quality: int = 85
+
+    @property
+    def media_type(self) -> str:
+        return OUTPUT_FORMATS[self.format][1]
+
+    def cache_name(self, asset_id: int) -> str:
+        """Deterministic file name for this variant of an asset."""
+        extension = OUTPUT_FORMATS[self.format][2]
+        return f"{asset_id}_w{self.width or 0}_h{self.height or 0}_{self.fit}_q{self.quality}.{extension}"
+
+
+def validate_spec(
+    width: Optional[int],
+    height: Optional[int],
+    fit: str = "contain",
+    format: str = "jpeg",
+    quality: int = 85,
+) -> VariantSpec:
+    """
+    Validate resize parameters against the allow-lists.
+    Arbitrary sizes would let clients bust the cache (and burn CPU) at will.
+    Raises ValueError with a client-facing message.
+    """
+    if width is None and height is None:
+        raise ValueError("At least one of width or height is required")
+    for name, value in (("width", width), ("height", height)):
+        if value is not None and value not in ALLOWED_SIZES:
+            raise ValueError(f"{name} must be one of: {ALLOWED_SIZES}")
+    if fit not in FIT_MODES:
+        raise ValueError(f"fit must be one of: {list(FIT_MODES)}")
+    if fit == "cover" and (width is None or height is None):
+        raise ValueError("fit=cover requires both width and height")
+    if format not in OUTPUT_FORMATS:
+        raise ValueError(f"format must be one of: {list(OUTPUT_FORMATS.keys())}")
+    if quality not in ALLOWED_QUALITIES:
+        raise ValueError(f"quality must be one of: {ALLOWED_QUALITIES}")
+    return VariantSpec(width=width, height=height, fit=fit, format=format, quality=quality)
+
+
+def required_source_size(spec: VariantSpec, original_size: Tuple[int, int]) -> Tuple[int, int]:
+    """
+    Minimum source dimensions needed to render the variant without upscaling
+    (capped at the original size - we never upscale past the original).
+    """
+    orig_w, orig_h = original_size
+    box_w = spec.width or orig_w
+    box_h = spec.height or orig_h
+    if spec.fit == "cover":
+        scale = max(box_w / orig_w, box_h / orig_h)
+    else:
+        scale = min(box_w / orig_w, box_h / orig_h)
+    scale = min(scale, 1.0)
+    return math.ceil(orig_w * scale), math.ceil(orig_h * scale)
+
+
+def choose_source(asset: Asset, renditions: Sequence[Rendition], spec: VariantSpec) -> Optional[Rendition]:
+    """
+    Pick the smallest existing rendition that is at least as large as the
+    variant needs; None means render from the original.
+    """
+    need_w, need_h = required_source_size(spec, (asset.width, asset.height))
+    return smallest_covering(renditions, need_w, need_h)
+
+
+def render_variant(source_bytes: bytes, spec: VariantSpec) -> bytes:
+    """Decode the source and render the variant (CPU-bound; run via the CPU pool)."""
+    image = Image.open(io.BytesIO(source_bytes))
+    box = (spec.width or image.width, spec.height or image.height)
+
+    # Let the JPEG decoder downscale by DCT scaling while decoding
+    image.draft("RGB", box)
+
+    if spec.fit == "cover":
+        image = ImageOps.fit(image, box, Image.Resampling.LANCZOS)
+    else:
+        image.thumbnail(box, Image.Resampling.LANCZOS)
+
+    if spec.format == "jpeg" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    pillow_format = OUTPUT_FORMATS[spec.format][0]
+    return save_rendition(image, format=pillow_format, quality=spec.quality)
+
+
+class VariantCache:
+    """
+    LRU index over variant files in storage, bounded by total bytes.
+    Recency survives restarts through file mtimes, which are bumped on hits.
+    Variants being served are pinned: evicting or removing a pinned variant
+    drops it from the index at once but deletes its file on the last release.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._pins: Dict[str, int] = {}
+        self._doomed: Set[str] = set()  # pinned names whose file goes on release
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self):
+        """Index existing variant files, oldest first."""
+        files = []
+        for entry in os.scandir(self.directory):
+            # Dot files are variants still being written
+            if entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        with self._lock:
+            if self._loaded:
+                return
+            for _, name, size in sorted(files):
+                self._entries[name] = size
+                self.total_bytes += size
+            self._loaded = True
+
+    async def load(self):
+        """Index the variants directory once, in a thread (it may hold many files)."""
+        if not self._loaded:
+            await asyncio.to_thread(self._load)
+
+    def _discard(self, names: Iterable[str]):
+        """Delete files of names dropped from the index, deferring pinned ones."""
+        for name in names:
+            with self._lock:
+                if self._pins.get(name):
+                    self._doomed.add(name)
+                    continue
+            storage.delete_file(f"variants/{name}")
+
+    def acquire(self, name: str) -> Optional[str]:
+        """
+        Relative path of a cached variant, pinned until release(name), and
+        mark it recently used. None if it isn't cached.
+        """
+        if not self._loaded:
+            self._load()
+        with self._lock:
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+            self._pins[name] = self._pins.get(name, 0) + 1
+        relative_path = f"variants/{name}"
+        try:
+            os.utime(storage.local_path(relative_path))
+        except FileNotFoundError:
+            with self._lock:
+                self.total_bytes -= self._entries.pop(name, 0)
+            self.release(name)
+            return None
+        return relative_path
+
+    def release(self, name: str):
+        """Unpin a variant returned by acquire()."""
+        with self._lock:
+            pins = self._pins.get(name, 0) - 1
+            if pins > 0:
+                self._pins[name] = pins
+                return
+            self._pins.pop(name, None)
+            if name not in self._doomed:
+                return
+            self._doomed.discard(name)
+        storage.delete_file(f"variants/{name}")
+
+    def put(self, name: str, content: bytes) -> str:
+        """Store a variant and evict least recently used ones over budget."""
+        relative_path = storage.save_variant(content, name)
+        evicted = []
+        if not self._loaded:
+            self._load()
+        with self._lock:
+            self._doomed.discard(name)
+            self.total_bytes -= self._entries.pop(name, 0)
+            self._entries[name] = len(content)
+            self.total_bytes += len(content)
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_name, old_size = self._entries.popitem(last=False)
+                self.total_bytes -= old_size
+                evicted.append(old_name)
+        self._discard(evicted)
+        return relative_path
+
+    def asset_ids(self) -> Set[int]:
+        """Ids of the assets that have cached variants."""
+        with self._lock:
+            prefixes = {name.split("_", 1)[0] for name in self._entries}
+        return {int(prefix) for prefix in prefixes if prefix.isdigit()}
+
+    def variants_of(self, asset_ids: Iterable[int]) -> List[Tuple[str, int]]:
+        """(name, bytes) of the cached variants of asset_ids."""
+        prefixes = tuple(f"{asset_id}_" for asset_id in asset_ids)
+        with self._lock:
+            return [(name, size) for name, size in self._entries.items() if prefixes and name.startswith(prefixes)]
+
+    def remove(self, names: Iterable[str]) -> int:
+        """Drop variants from the cache and storage; returns the bytes freed."""
+        removed = []
+        freed = 0
+        with self._lock:
+            for name in names:
+                if name in self._entries:
+                    freed += self._entries.pop(name)
+                    removed.append(name)
+            self.total_bytes -= freed
+        self._discard(removed)
+        return freed
+
+
+variant_cache = VariantCache(
+    directory=str(storage.local_path("variants")),
+    max_bytes=settings.variant_cache_mb * 1024 * 1024,
+)
@@ -2,17 +2,23 @@
 import asyncio
 import os
 import json
-from datetime import datetime
-from typing import Optional
-from sqlalchemy import select
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from sqlalchemy import select, update, or_
 from sqlalchemy.ext.asyncio import AsyncSession
-from PIL import Image
-import io
 
 from app.db import AsyncSessionLocal, settings, init_db
 from app.models import Asset, Rendition, Job, PoisonJob
-from app.storage import storage
-from app.utils import create_rendition, save_rendition, RENDITION_PRESETS
+from app.presets import preset_registry
+from app.executor import run_cpu, CpuMeter, metering
+from app.tenant_metrics import record_renditions
+from app.usage import usage_buffer
+from app.renditions import (
+    render_preset, build_rendition, pick_render_source, admitted_source, source_key, delete_unstored_files,
+    RENDITION_FORMATS,
+)
+from app.pyramid import build_pyramid, PYRAMID_PRESET
+from app.utils import preset_output_size
 
 
 # Try to import Redis, fallback if not available
@@ -36,23 +42,31 @@ async def get_redis_client() -> Optional["aioredis.Redis"]:
         return None
 
 
-async def process_job(job_id: int, session: AsyncSession):
+def _due(now: datetime):
+    """Jobs not waiting out a retry backoff."""
+    return or_(Job.not_before.is_(None), Job.not_before <= now)
+
+
+async def process_job(job_id: int, session: AsyncSession, queue_name: Optional[str] = None):
     """
     Process a single job: create renditions for an asset.
-    Implements retry logic with exponential backoff.
+    Jobs with a preset render just that preset (retried and poisoned on their
+    own); legacy jobs without one render every preset of the asset.
+    Implements retry logic with exponential backoff; jobs popped from a Redis
+    queue (queue_name) are pushed back onto it for the retry.
     """
-    # Fetch job with asset
+    # Claim the job atomically so concurrent workers never run it twice
     result = await session.execute(
-        select(Job).where(Job.id == job_id)
+        update(Job)
+        .where(Job.id == job_id, Job.status == "pending", _due(datetime.now(timezone.utc)))
+        .values(status="processing")
     )
-    job = result.scalar_one_or_none()
-    
-    if not job or job.status != "pending":
+    await session.commit()
+    if result.rowcount != 1:
         return
     
-    # Update status to processing
-    job.status = "processing"
-    await session.commit()
+    job = await session.get(Job, job_id)
+    created = []
     
     try:
         # Fetch asset
@@ -64,70 +78,88 @@ async def process_job(job_id: int, session: AsyncSession):
         if not asset:
             raise ValueError(f"Asset {job.asset_id} not found")
         
-        # Read original image
-        original_path = f"originals/{asset.filename}"
-        if not storage.file_exists(original_path):
-            raise FileNotFoundError(f"Original file not found: {original_path}")
+        if job.preset == PYRAMID_PRESET:
+            index = await build_pyramid(asset)
+            job.status = "completed"
+            await session.commit()
+            print(f"✓ Job {job_id} completed for asset {asset.id} - tile pyramid with {len(index['tiles'])} tiles")
+            return
         
-        original_bytes = storage.read_file(original_path)
-        image = Image.open(io.BytesIO(original_bytes))
+        presets = await preset_registry.get_presets(session, asset.tenant_id)
+        # Oversized originals are decoded down to what the largest preset needs
+        # (the same for every sibling job, so they share the decode)
+        output_sizes = [preset_output_size((asset.width, asset.height), c) for c in presets.values()]
+        reduce_to = (max((w for w, _ in output_sizes), default=1), max((h for _, h in output_sizes), default=1))
+        if job.preset is not None:
+            # Preset removed since the job was queued: nothing left to do
+            presets = {job.preset: presets[job.preset]} if job.preset in presets else {}
+        result = await session.execute(
+            select(Rendition).where(Rendition.asset_id == asset.id)
+        )
+        existing = list(result.scalars().all())
         
-        # Convert to RGB if needed (JPEG doesn't support transparency)
-        if image.mode not in ("RGB", "L"):
-            image = image.convert("RGB")
+        # Renditions rendered in this job (unencoded, so deriving smaller
+        # presets from them is lossless)
+        rendered = []
         
-        # Process each rendition preset
-        for preset in RENDITION_PRESETS.keys():
-            # Check if rendition already exists (idempotency)
-            result = await session.execute(
-                select(Rendition).where(
-                    Rendition.asset_id == asset.id,
-                    Rendition.preset == preset
-                )
-            )
-            existing = result.scalar_one_or_none()
-            
-            if existing:
+        # Largest presets first so smaller ones can be derived from them
+        ordered = sorted(
+            presets.items(),
+            key=lambda item: -item[1]["size"][0] * item[1]["size"][1]
+        )
+        for preset, config in ordered:
+            # Only render formats that don't exist yet (idempotency)
+            existing_formats = [r.format for r in existing if r.preset == preset]
+            missing_formats = [f for f in RENDITION_FORMATS if f not in existing_formats]
+            if not missing_formats:
                 continue  # Skip if already exists
             
-            # Create rendition (copy image to avoid modifying original)
-            rendition_image = create_rendition(image.copy(), preset)
+            need_w, need_h = preset_output_size((asset.width, asset.height), config)
+            covering = [img for img in rendered if img.width >= need_w and img.height >= need_h]
+            if covering:
+                source_image = min(covering, key=lambda img: img.width * img.height)
+                source_label = f"{source_image.width}x{source_image.height} rendered"
+                rendition_image, encoded = await run_cpu(render_preset, source_image, preset, missing_formats, config)
+            else:
+                # Smallest existing rendition that is big enough, else the original.
+                # Decoding waits for room in the memory budget; decoded sources
+                # are shared with sibling jobs on this worker.
+                source = pick_render_source(asset, existing, preset, config)
+                source_path = source.file_path if source else asset.original_file
+                source_label = source.preset if source else "original"
+                async with admitted_source(source_path, reduce_to, source_key(asset, source)) as source_image:
+                    rendition_image, encoded = await run_cpu(render_preset, source_image, preset, missing_formats, config)
+            rendered.append(rendition_image)
             
-            # Ensure rendition is in RGB mode before saving as JPEG
-            if rendition_image.mode not in ("RGB", "L"):
-                rendition_image = rendition_image.convert("RGB")
-            
-            rendition_bytes = save_rendition(rendition_image)
-            
-            # Save rendition file
-            file_path = storage.save_rendition(rendition_bytes, preset, asset.id)
-            
-            # Create rendition record
-            rendition = Rendition(
-                asset_id=asset.id,
-                preset=preset,
-                file_path=file_path,
-                bytes=len(rendition_bytes),
-                width=rendition_image.width,
-                height=rendition_image.height,
-                quality=85,
-                color_space=rendition_image.mode
+            # Save rendition files and create rendition records
+            for fmt, result in encoded.items():
+                rendition = build_rendition(asset, preset, rendition_image, result, fmt)
+                session.add(rendition)
+                created.append(rendition)
+            sizes = ", ".join(
+                f"{fmt} q{r.quality} {len(r.content)}B {r.psnr_db:.1f}dB" for fmt, r in encoded.items()
             )
-            session.add(rendition)
-            print(f"  ✓ Created {preset} rendition for asset {asset.id} ({rendition_image.width}x{rendition_image.height})")
+            print(f"  ✓ Created {preset} rendition for asset {asset.id} from {source_label} ({rendition_image.width}x{rendition_image.height}; {sizes})")
         
-        # Mark job as completed
+        # Mark job as completed (usage counters commit with the renditions)
+        await record_renditions(session, asset.tenant_id, created)
         job.status = "completed"
         await session.commit()
-        print(f"✓ Job {job_id} completed for asset {asset.id} - all renditions created")
+        usage_buffer.add(asset.tenant_id, renditions=len(created), bytes=sum(r.bytes for r in created))
+        print(f"✓ Job {job_id} completed for asset {asset.id} - {job.preset or 'all'} renditions created")
         
     except Exception as e:
         import traceback
         error_msg = str(e)
         error_trace = traceback.format_exc()
         
+        # Drop partially added renditions and their files; reload the job's retry state
+        await session.rollback()
+        await delete_unstored_files(session, created)
+        job = await session.get(Job, job_id)
+        
         # Log full error for debugging
-        print(f"✗ ERROR in job {job_id} for asset {job.asset_id}:")
+        print(f"✗ ERROR in job {job_id} for asset {job.asset_id} ({job.preset or 'all presets'}):")
         print(f"  {error_msg}")
         print(f"  Traceback:\n{error_trace}")
         
@@ -139,6 +171,7 @@ async def process_job(job_id: int, session: AsyncSession):
             # Move to poison jobs
             poison = PoisonJob(
                 asset_id=job.asset_id,
+                preset=job.preset,
                 original_job_id=job.id,
                 error_message=error_msg,
                 retry_count=job.retry_count
@@ -146,58 +179,122 @@ async def process_job(job_id: int, session: AsyncSession):
             session.add(poison)
             job.status = "failed"
             print(f"✗ Job {job_id} failed permanently after {job.retry_count} retries: {error_msg}")
+            await session.commit()
         else:
-            # Retry with exponential backoff
-            job.status = "pending"
+            # Retry with exponential backoff. The job is pending again right
+            # away (queue stats, restarts), but no worker claims it before
+            # not_before; Redis only sees it once it is re-pushed.
             backoff_seconds = 2 ** job.retry_count  # 2, 4, 8 seconds
+            job.status = "pending"
+            job.not_before = datetime.now(timezone.utc) + timedelta(seconds=backoff_seconds)
+            await session.commit()
             print(f"⚠ Job {job_id} failed, retrying in {backoff_seconds}s (attempt {job.retry_count}/{job.max_retries}): {error_msg}")
             await asyncio.sleep(backoff_seconds)
-        
-        await session.commit()
+            if queue_name:
+                await enqueue_jobs([job_id], queue_name)
+
+
+async def enqueue_jobs(job_ids: List[int], queue_name: Optional[str] = None):
+    """Push jobs onto the Redis queue; without Redis the worker polls the database."""
+    try:
+        import aioredis
+        if settings.redis_url:
+            redis = await aioredis.from_url(settings.redis_url, decode_responses=True)
+            for job_id in job_ids:
+                await redis.lpush(queue_name or QUEUE_NAME, json.dumps({"job_id": job_id}))
+            await redis.close()
+    except Exception:
+        # Fallback to database polling (worker will pick them up)
+        pass
+
+
+async def _run_job(job_id: int, queue_name: Optional[str] = None):
+    # Each job gets its own session so units can run concurrently
+    async with AsyncSessionLocal() as session:
+        cpu = CpuMeter()
+        with metering(cpu):
+            await process_job(job_id, session, queue_name)
+        if cpu.seconds:
+            # Kept on the job (the backfill's CPU budget reads it) and charged
+            # to the asset's tenant, failed attempts included
+            await session.execute(
+                update(Job).where(Job.id == job_id).values(cpu_seconds=Job.cpu_seconds + cpu.seconds)
+            )
+            await session.commit()
+            tenant_id = await session.scalar(
+                select(Asset.tenant_id).join(Job, Job.asset_id == Asset.id).where(Job.id == job_id)
+            )
+            if tenant_id is not None:
+                usage_buffer.add(tenant_id, cpu_seconds=cpu.seconds)
+
+
+# Redis queues in priority order (BRPOP drains earlier keys first)
+QUEUE_NAME = "image_jobs"
+BACKFILL_QUEUE_NAME = "image_jobs_backfill"
 
 
 async def worker_loop_redis(redis: "aioredis.Redis"):
-    """Worker loop using Redis queue."""
-    queue_name = "image_jobs"
+    """Worker loop using Redis queue; runs up to WORKER_CONCURRENCY jobs at once."""
+    slots = asyncio.Semaphore(settings.worker_concurrency)
+    running = set()
+    
+    def _release(task):
+        running.discard(task)
+        slots.release()
     
     while True:
+        await slots.acquire()
         try:
-            # Blocking pop from queue (timeout 1 second)
-            job_data = await redis.brpop(queue_name, timeout=1)
-            
-            if job_data:
-                _, job_json = job_data
-                job_dict = json.loads(job_json)
-                job_id = job_dict["job_id"]
-                
-                # Create new session for each job
-                async with AsyncSessionLocal() as session:
-                    await process_job(job_id, session)
+            # Blocking pop from queue (timeout 1 second); live uploads before backfill
+            job_data = await redis.brpop([QUEUE_NAME, BACKFILL_QUEUE_NAME], timeout=1)
         except Exception as e:
+            slots.release()
             print(f"Error in Redis worker loop: {e}")
             await asyncio.sleep(1)
+            continue
+        
+        if not job_data:
+            slots.release()
+            continue
+        
+        queue_name, job_json = job_data
+        job_id = json.loads(job_json)["job_id"]
+        task = asyncio.create_task(_run_job(job_id, queue_name))
+        running.add(task)
+        task.add_done_callback(_release)
 
 
 async def worker_loop_fallback():
-    """Fallback worker loop using database polling."""
+    """Fallback worker loop using database polling; runs up to WORKER_CONCURRENCY jobs at once."""
     print("Using fallback database queue (no Redis)")
+    running = {}  # job_id -> task
     
     while True:
         try:
-            # Create new session for each poll
-            async with AsyncSessionLocal() as session:
-                # Poll for pending jobs
-                result = await session.execute(
-                    select(Job).where(Job.status == "pending").limit(1)
-                )
-                job = result.scalar_one_or_none()
-                
-                if job:
-                    print(f"📋 Found pending job {job.id} for asset {job.asset_id}")
-                    await process_job(job.id, session)
-                else:
-                    # No jobs, wait a bit (reduce log spam)
-                    await asyncio.sleep(2)
+            for job_id in [job_id for job_id, task in running.items() if task.done()]:
+                running.pop(job_id)
+            
+            free = settings.worker_concurrency - len(running)
+            job_ids = []
+            if free > 0:
+                # Create new session for each poll
+                async with AsyncSessionLocal() as session:
+                    # Poll for pending jobs (live uploads before low-priority backfill)
+                    query = select(Job.id).where(Job.status == "pending", _due(datetime.now(timezone.utc)))
+                    if running:
+                        query = query.where(Job.id.notin_(list(running)))
+                    result = await session.execute(
+                        query.order_by(Job.priority.desc(), Job.id).limit(free)
+                    )
+                    job_ids = list(result.scalars().all())
+            
+            for job_id in job_ids:
+                print(f"📋 Found pending job {job_id}")
+                running[job_id] = asyncio.create_task(_run_job(job_id))
+            
+            if not job_ids:
+                # No jobs (or no free slots), wait a bit (reduce log spam)
+                await asyncio.sleep(2 if not running else 0.2)
         except Exception as e:
             import traceback
             print(f"❌ Error in fallback worker loop: {e}")
@@ -213,15 +310,21 @@ async def main(skip_init_db=False):
     if not skip_init_db:
         await init_db()
     
-    # Try to connect to Redis
-    redis = await get_redis_client()
+    # Usage rollups are buffered and flushed periodically (shared with the API when in-process)
+    usage_buffer.start()
     
-    if redis:
-        print("✓ Connected to Redis")
-        await worker_loop_redis(redis)
-    else:
-        print("Using fallback database queue")
-        await worker_loop_fallback()
+    try:
+        # Try to connect to Redis
+        redis = await get_redis_client()
+        
+        if redis:
+            print("✓ Connected to Redis")
+            await worker_loop_redis(redis)
+        else:
+            print("Using fallback database queue")
+            await worker_loop_fallback()
+    finally:
+        await usage_buffer.close()
 
 
 if __name__ == "__main__":
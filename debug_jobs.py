@@ -1,94 +1,90 @@
 #!/usr/bin/env python3
 """Debug script to check job status and errors."""
+import argparse
 import asyncio
 import sys
-from sqlalchemy import select
+from sqlalchemy import select, func
 from app.db import AsyncSessionLocal, init_db
 from app.models import Job, Asset, Rendition
+from app.queue_stats import compute_queue_stats
 
-async def debug_jobs():
-    """Check all jobs and their status."""
+
+def _age(seconds):
+    return f"{seconds:.0f}s" if seconds is not None else "-"
+
+
+async def debug_jobs(limit: int, status: str = None):
+    """Print the queue summary, then the most recent jobs (one query for all of them)."""
     await init_db()
     
     async with AsyncSessionLocal() as session:
-        # Get all jobs
-        result = await session.execute(select(Job).order_by(Job.id.desc()))
-        jobs = result.scalars().all()
+        stats = await compute_queue_stats(session)
+        counts = stats["counts"]
         
-        if not jobs:
+        if not any(counts.values()):
             print("❌ No jobs found in database.")
             return
         
-        print(f"\n📊 Found {len(jobs)} job(s) in database\n")
-        print("=" * 80)
+        print(f"\n📈 Summary:")
+        for job_status, count in counts.items():
+            print(f"   {job_status.capitalize()}: {count}")
+        print(f"   Oldest pending: {_age(stats['oldest_pending_age_seconds'])}, "
+              f"longest processing: {_age(stats['oldest_processing_age_seconds'])}")
+        recent = stats["recent"]
+        print(f"   Last {recent['window_seconds']}s: {recent['completed']} completed, {recent['failed']} failed "
+              f"({recent['throughput_per_minute']}/min, failure rate {recent['failure_rate']:.1%})")
+        if stats["tenants"]:
+            print(f"   Backlog by tenant:")
+            for tenant in stats["tenants"]:
+                print(f"     - {tenant['tenant_name']}: {tenant['backlog']} (oldest {_age(tenant['oldest_age_seconds'])})")
+        
+        # Recent jobs with their asset and rendition count in a single query
+        rendition_counts = (
+            select(Rendition.asset_id, func.count(Rendition.id).label("renditions"))
+            .group_by(Rendition.asset_id)
+            .subquery()
+        )
+        query = (
+            select(Job, Asset.filename, func.coalesce(rendition_counts.c.renditions, 0))
+            .outerjoin(Asset, Asset.id == Job.asset_id)
+            .outerjoin(rendition_counts, rendition_counts.c.asset_id == Job.asset_id)
+            .order_by(Job.id.desc())
+            .limit(limit)
+        )
+        if status:
+            query = query.where(Job.status == status)
+        rows = (await session.execute(query)).all()
         
-        for job in jobs:
-            # Get asset info
-            result = await session.execute(
-                select(Asset).where(Asset.id == job.asset_id)
-            )
-            asset = result.scalar_one_or_none()
-            
-            filename = asset.filename if asset else f"asset_{job.asset_id} (NOT FOUND)"
-            
+        print(f"\n📊 {len(rows)} most recent {status + ' ' if status else ''}job(s)\n")
+        print("=" * 80)
+        for job, filename, renditions in rows:
             print(f"\n🔍 Job ID: {job.id}")
             print(f"   Asset ID: {job.asset_id}")
-            print(f"   Filename: {filename}")
+            print(f"   Filename: {filename or f'asset_{job.asset_id} (NOT FOUND)'}")
+            print(f"   Preset: {job.preset or 'all'}")
             print(f"   Status: {job.status}")
             print(f"   Retry Count: {job.retry_count}/{job.max_retries}")
             print(f"   Created: {job.created_at}")
             if job.updated_at:
                 print(f"   Updated: {job.updated_at}")
-            
             if job.error_message:
                 print(f"   ⚠️  ERROR: {job.error_message}")
-            
-            # Check renditions
-            result = await session.execute(
-                select(Rendition).where(Rendition.asset_id == job.asset_id)
-            )
-            renditions = result.scalars().all()
-            
-            print(f"   Renditions: {len(renditions)}/3")
-            for r in renditions:
-                print(f"     - {r.preset}: {r.width}x{r.height} ({r.bytes:,} bytes)")
-            
-            if job.status == "pending":
-                print(f"   💡 Status: PENDING - Worker should pick this up")
-            elif job.status == "processing":
-                print(f"   ⚠️  Status: PROCESSING - Job might be stuck!")
-            elif job.status == "failed":
-                print(f"   ❌ Status: FAILED - Check error message above")
-            elif job.status == "completed":
-                if len(renditions) < 3:
-                    print(f"   ⚠️  Status: COMPLETED but only {len(renditions)}/3 renditions!")
-                else:
-                    print(f"   ✅ Status: COMPLETED - All renditions created")
-            
+            print(f"   Renditions of asset: {renditions}")
             print("=" * 80)
         
-        # Summary
-        pending = [j for j in jobs if j.status == "pending"]
-        processing = [j for j in jobs if j.status == "processing"]
-        completed = [j for j in jobs if j.status == "completed"]
-        failed = [j for j in jobs if j.status == "failed"]
-        
-        print(f"\n📈 Summary:")
-        print(f"   Pending: {len(pending)}")
-        print(f"   Processing: {len(processing)}")
-        print(f"   Completed: {len(completed)}")
-        print(f"   Failed: {len(failed)}")
-        
-        if processing:
-            print(f"\n⚠️  WARNING: {len(processing)} job(s) stuck in 'processing' status!")
-            print(f"   These might need to be reset.")
-        
-        if failed:
-            print(f"\n❌ {len(failed)} job(s) failed. Check error messages above.")
+        if counts["processing"]:
+            print(f"\n⚠️  {counts['processing']} job(s) in 'processing' status "
+                  f"(longest for {_age(stats['oldest_processing_age_seconds'])}); long-running ones might be stuck.")
+        if counts["failed"]:
+            print(f"\n❌ {counts['failed']} job(s) failed. Run with --status failed to see their errors.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--limit", type=int, default=20, help="Recent jobs to list")
+    parser.add_argument("--status", choices=["pending", "processing", "completed", "failed"])
+    args = parser.parse_args()
     try:
-        asyncio.run(debug_jobs())
+        asyncio.run(debug_jobs(args.limit, args.status))
     except KeyboardInterrupt:
         print("\n\nInterrupted by user")
         sys.exit(0)
@@ -0,0 +1,86 @@
+"""Baseline schema (tenants, assets, renditions, jobs, poison_jobs, tenant_metrics).
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# The tables as the first release created them (later revisions alter them)
+metadata = sa.MetaData()
+
+sa.Table(
+    "tenants", metadata,
+    sa.Column("id", sa.Integer, primary_key=True, index=True),
+    sa.Column("name", sa.String(255), unique=True, nullable=False, index=True),
+    sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+)
+sa.Table(
+    "assets", metadata,
+    sa.Column("id", sa.Integer, primary_key=True, index=True),
+    sa.Column("tenant_id", sa.Integer, sa.ForeignKey("tenants.id"), nullable=False, index=True),
+    sa.Column("filename", sa.String(512), nullable=False),
+    sa.Column("content_hash", sa.String(64), unique=True, nullable=False, index=True),
+    sa.Column("perceptual_hash", sa.String(16), nullable=False, index=True),
+    sa.Column("original_bytes", sa.BigInteger, nullable=False),
+    sa.Column("width", sa.Integer, nullable=False),
+    sa.Column("height", sa.Integer, nullable=False),
+    sa.Column("color_space", sa.String(32), nullable=True),
+    sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+)
+sa.Table(
+    "renditions", metadata,
+    sa.Column("id", sa.Integer, primary_key=True, index=True),
+    sa.Column("asset_id", sa.Integer, sa.ForeignKey("assets.id"), nullable=False, index=True),
+    sa.Column("preset", sa.String(32), nullable=False, index=True),
+    sa.Column("file_path", sa.String(1024), nullable=False, unique=True),
+    sa.Column("bytes", sa.BigInteger, nullable=False),
+    sa.Column("width", sa.Integer, nullable=False),
+    sa.Column("height", sa.Integer, nullable=False),
+    sa.Column("quality", sa.Integer, nullable=True),
+    sa.Column("color_space", sa.String(32), nullable=True),
+    sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+)
+sa.Table(
+    "jobs", metadata,
+    sa.Column("id", sa.Integer, primary_key=True, index=True),
+    sa.Column("asset_id", sa.Integer, sa.ForeignKey("assets.id"), nullable=False, index=True),
+    sa.Column("status", sa.String(32), nullable=False, index=True),
+    sa.Column("retry_count", sa.Integer, nullable=False),
+    sa.Column("max_retries", sa.Integer, nullable=False),
+    sa.Column("error_message", sa.Text, nullable=True),
+    sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    sa.Column("updated_at", sa.DateTime(timezone=True)),
+)
+sa.Table(
+    "poison_jobs", metadata,
+    sa.Column("id", sa.Integer, primary_key=True, index=True),
+    sa.Column("asset_id", sa.Integer, nullable=False, index=True),
+    sa.Column("original_job_id", sa.Integer, nullable=True),
+    sa.Column("error_message", sa.Text, nullable=False),
+    sa.Column("retry_count", sa.Integer, nullable=False),
+    sa.Column("failed_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+)
+sa.Table(
+    "tenant_metrics", metadata,
+    sa.Column("id", sa.Integer, primary_key=True, index=True),
+    sa.Column("tenant_id", sa.Integer, sa.ForeignKey("tenants.id"), unique=True, nullable=False, index=True),
+    sa.Column("asset_count", sa.Integer, nullable=False),
+    sa.Column("rendition_count", sa.Integer, nullable=False),
+    sa.Column("total_bytes", sa.BigInteger, nullable=False),
+    sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+)
+
+
+def upgrade():
+    metadata.create_all(op.get_bind())
+
+
+def downgrade():
+    metadata.drop_all(op.get_bind())
@@ -0,0 +1,30 @@
+"""Rendition output format: one rendition row per (asset, preset, format).
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from app.migrate import has_column, has_index
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing renditions are all JPEG
+    with op.batch_alter_table("renditions") as batch:
+        if not has_column("renditions", "format"):
+            batch.add_column(sa.Column("format", sa.String(16), nullable=False, server_default="jpeg"))
+        if not has_index("renditions", "uq_rendition_asset_preset_format"):
+            batch.create_unique_constraint("uq_rendition_asset_preset_format", ["asset_id", "preset", "format"])
+
+
+def downgrade():
+    with op.batch_alter_table("renditions") as batch:
+        batch.drop_constraint("uq_rendition_asset_preset_format", type_="unique")
+        batch.drop_column("format")
@@ -0,0 +1,41 @@
+"""Rendition presets table (global and per-tenant overrides).
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from app.migrate import has_table
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if has_table("rendition_presets"):
+        return
+    op.create_table(
+        "rendition_presets",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("tenant_id", sa.Integer, sa.ForeignKey("tenants.id"), nullable=True),
+        sa.Column("name", sa.String(32), nullable=False),
+        sa.Column("width", sa.Integer, nullable=False),
+        sa.Column("height", sa.Integer, nullable=False),
+        sa.Column("fit", sa.Boolean, nullable=False),
+        sa.Column("profile", sa.String(16), nullable=False),
+        sa.Column("max_bytes", sa.Integer, nullable=True),
+        sa.Column("enabled", sa.Boolean, nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.UniqueConstraint("tenant_id", "name", name="uq_rendition_preset_tenant_name"),
+    )
+    op.create_index("ix_rendition_presets_id", "rendition_presets", ["id"])
+    op.create_index("ix_rendition_presets_tenant_id", "rendition_presets", ["tenant_id"])
+    op.create_index("ix_rendition_presets_name", "rendition_presets", ["name"])
+
+
+def downgrade():
+    op.drop_table("rendition_presets")
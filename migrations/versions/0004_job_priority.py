@@ -0,0 +1,26 @@
+"""Job priority (live uploads before backfill).
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from app.migrate import has_column
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not has_column("jobs", "priority"):
+        with op.batch_alter_table("jobs") as batch:
+            batch.add_column(sa.Column("priority", sa.Integer, nullable=False, server_default="0"))
+
+
+def downgrade():
+    with op.batch_alter_table("jobs") as batch:
+        batch.drop_column("priority")
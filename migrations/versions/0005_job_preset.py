@@ -0,0 +1,28 @@
+"""Per-preset jobs: jobs.preset and poison_jobs.preset (NULL = all presets).
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from app.migrate import has_column
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ("jobs", "poison_jobs"):
+        if not has_column(table, "preset"):
+            with op.batch_alter_table(table) as batch:
+                batch.add_column(sa.Column("preset", sa.String(32), nullable=True))
+
+
+def downgrade():
+    for table in ("jobs", "poison_jobs"):
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column("preset")
@@ -0,0 +1,40 @@
+"""Linked renditions: assets.linked_asset_id; rendition file paths may be shared.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from app.migrate import has_column, has_index
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+# Name the first release's unnamed UNIQUE(file_path) so it can be dropped:
+# Postgres generated renditions_file_path_key, SQLite batch mode uses the convention
+NAMING_CONVENTION = {"uq": "%(table_name)s_%(column_0_name)s_key"}
+
+
+def upgrade():
+    if not has_column("assets", "linked_asset_id"):
+        with op.batch_alter_table("assets") as batch:
+            batch.add_column(sa.Column("linked_asset_id", sa.Integer, nullable=True))
+            batch.create_foreign_key("fk_assets_linked_asset_id", "assets", ["linked_asset_id"], ["id"])
+    if not has_index("renditions", "ix_renditions_file_path"):
+        with op.batch_alter_table("renditions", naming_convention=NAMING_CONVENTION) as batch:
+            if has_index("renditions", "renditions_file_path_key") or op.get_bind().dialect.name == "sqlite":
+                batch.drop_constraint("renditions_file_path_key", type_="unique")
+            batch.create_index("ix_renditions_file_path", ["file_path"])
+
+
+def downgrade():
+    with op.batch_alter_table("renditions", naming_convention=NAMING_CONVENTION) as batch:
+        batch.drop_index("ix_renditions_file_path")
+        batch.create_unique_constraint("renditions_file_path_key", ["file_path"])
+    with op.batch_alter_table("assets") as batch:
+        batch.drop_constraint("fk_assets_linked_asset_id", type_="foreignkey")
+        batch.drop_column("linked_asset_id")
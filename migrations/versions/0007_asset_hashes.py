@@ -0,0 +1,31 @@
+"""64-bit pHash/dHash/wHash columns (signed BIGINT).
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from app.migrate import has_column, has_index
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("assets") as batch:
+        for name in ("phash", "dhash", "whash"):
+            if not has_column("assets", name):
+                batch.add_column(sa.Column(name, sa.BigInteger, nullable=True))
+    if not has_index("assets", "ix_assets_phash"):
+        op.create_index("ix_assets_phash", "assets", ["phash"])
+
+
+def downgrade():
+    op.drop_index("ix_assets_phash", table_name="assets")
+    with op.batch_alter_table("assets") as batch:
+        for name in ("phash", "dhash", "whash"):
+            batch.drop_column(name)
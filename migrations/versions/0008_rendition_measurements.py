@@ -0,0 +1,29 @@
+"""Rendition PSNR and perceptual hash measured at render time.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from app.migrate import has_column
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("renditions") as batch:
+        if not has_column("renditions", "psnr_db"):
+            batch.add_column(sa.Column("psnr_db", sa.Float, nullable=True))
+        if not has_column("renditions", "perceptual_hash"):
+            batch.add_column(sa.Column("perceptual_hash", sa.String(16), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("renditions") as batch:
+        batch.drop_column("perceptual_hash")
+        batch.drop_column("psnr_db")
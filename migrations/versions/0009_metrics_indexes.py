@@ -0,0 +1,26 @@
+"""Covering indexes for per-tenant metrics aggregates.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+from app.migrate import has_index
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not has_index("assets", "ix_assets_tenant_bytes"):
+        op.create_index("ix_assets_tenant_bytes", "assets", ["tenant_id", "original_bytes"])
+    if not has_index("renditions", "ix_renditions_asset_bytes"):
+        op.create_index("ix_renditions_asset_bytes", "renditions", ["asset_id", "bytes"])
+
+
+def downgrade():
+    op.drop_index("ix_renditions_asset_bytes", table_name="renditions")
+    op.drop_index("ix_assets_tenant_bytes", table_name="assets")
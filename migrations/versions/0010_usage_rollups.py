@@ -0,0 +1,38 @@
+"""Hourly/daily per-tenant usage rollups.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from app.migrate import has_table
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if has_table("usage_rollups"):
+        return
+    op.create_table(
+        "usage_rollups",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("tenant_id", sa.Integer, sa.ForeignKey("tenants.id"), nullable=False),
+        sa.Column("granularity", sa.String(8), nullable=False),
+        sa.Column("bucket_start", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("uploads", sa.Integer, nullable=False),
+        sa.Column("renditions", sa.Integer, nullable=False),
+        sa.Column("bytes_stored", sa.BigInteger, nullable=False),
+        sa.Column("cpu_seconds", sa.Float, nullable=False),
+        sa.UniqueConstraint("tenant_id", "granularity", "bucket_start", name="uq_usage_rollup_bucket"),
+    )
+    op.create_index("ix_usage_rollups_id", "usage_rollups", ["id"])
+    op.create_index("ix_usage_rollups_granularity_start", "usage_rollups", ["granularity", "bucket_start"])
+
+
+def downgrade():
+    op.drop_table("usage_rollups")
@@ -0,0 +1,26 @@
+"""Job (status, created_at) and (status, updated_at) indexes for queue stats.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+from app.migrate import has_index
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not has_index("jobs", "ix_jobs_status_created"):
+        op.create_index("ix_jobs_status_created", "jobs", ["status", "created_at"])
+    if not has_index("jobs", "ix_jobs_status_updated"):
+        op.create_index("ix_jobs_status_updated", "jobs", ["status", "updated_at"])
+
+
+def downgrade():
+    op.drop_index("ix_jobs_status_updated", table_name="jobs")
+    op.drop_index("ix_jobs_status_created", table_name="jobs")
@@ -0,0 +1,26 @@
+"""Content-addressed original storage path on assets.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from app.migrate import has_column
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing assets keep NULL and are still found by filename
+    if not has_column("assets", "original_path"):
+        op.add_column("assets", sa.Column("original_path", sa.String(600), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("assets") as batch:
+        batch.drop_column("original_path")
@@ -0,0 +1,33 @@
+"""Unique name among global rendition presets (tenant_id NULL).
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from app.migrate import has_index
+
+revision = "0013"
+down_revision = "0012"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if has_index("rendition_presets", "uq_rendition_preset_global_name"):
+        return
+    # Duplicates could be created before; the newest row is the one that was last saved
+    op.execute(sa.text(
+        "DELETE FROM rendition_presets WHERE tenant_id IS NULL AND id NOT IN "
+        "(SELECT MAX(id) FROM rendition_presets WHERE tenant_id IS NULL GROUP BY name)"
+    ))
+    op.create_index(
+        "uq_rendition_preset_global_name", "rendition_presets", ["name"], unique=True,
+        sqlite_where=sa.text("tenant_id IS NULL"), postgresql_where=sa.text("tenant_id IS NULL"),
+    )
+
+
+def downgrade():
+    op.drop_index("uq_rendition_preset_global_name", table_name="rendition_presets")
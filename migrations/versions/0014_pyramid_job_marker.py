@@ -0,0 +1,25 @@
+"""Move queued pyramid jobs to the ":pyramid" marker, out of the preset namespace.
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0014"
+down_revision = "0013"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Pyramid jobs were the only ones queued at priority -1 (uploads use 0, backfill -10)
+    op.execute(sa.text(
+        "UPDATE jobs SET preset = :marker "
+        "WHERE preset = 'pyramid' AND priority = -1 AND status IN ('pending', 'processing')"
+    ).bindparams(marker=":pyramid"))
+
+
+def downgrade():
+    op.execute(sa.text("UPDATE jobs SET preset = 'pyramid' WHERE preset = :marker").bindparams(marker=":pyramid"))
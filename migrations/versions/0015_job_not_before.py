@@ -0,0 +1,25 @@
+"""Job not_before, so retry backoff holds across workers.
+
+Revision ID: 0015
+Revises: 0014
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from app.migrate import has_column
+
+revision = "0015"
+down_revision = "0014"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not has_column("jobs", "not_before"):
+        op.add_column("jobs", sa.Column("not_before", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("jobs") as batch:
+        batch.drop_column("not_before")
@@ -0,0 +1,25 @@
+"""Job cpu_seconds, for the backfill CPU budget.
+
+Revision ID: 0016
+Revises: 0015
+Create Date: 2026-10-19
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from app.migrate import has_column
+
+revision = "0016"
+down_revision = "0015"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not has_column("jobs", "cpu_seconds"):
+        op.add_column("jobs", sa.Column("cpu_seconds", sa.Float(), server_default="0", nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table("jobs") as batch:
+        batch.drop_column("cpu_seconds")
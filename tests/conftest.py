@@ -0,0 +1,25 @@
+"""Test configuration: point the app at a scratch database and storage directory.
+
+Settings and the storage adapter are created when app.db / app.storage are
+first imported, so this must run before any test module imports the app.
+"""
+import os
+
+os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///./test.db"
+os.environ["STORAGE_PATH"] = "./test_storage"
+os.environ["SECRET_KEY"] = "test_secret"
+
+import pytest_asyncio  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker  # noqa: E402
+
+from app.db import Base  # noqa: E402
+
+
+@pytest_asyncio.fixture
+async def session_factory():
+    """Session factory on a fresh in-memory database with the models' schema."""
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
@@ -0,0 +1,72 @@
+"""Tests for bounded admission of expensive requests."""
+import asyncio
+
+import pytest
+
+from app.executor import AdmissionLimiter, Overloaded
+
+
+def test_limiter_queues_then_rejects():
+    """Test that requests beyond concurrency wait, and beyond the queue are rejected."""
+    limiter = AdmissionLimiter(concurrency=1, max_waiting=1)
+    release = None
+    order = []
+
+    async def request(name):
+        async with limiter.slot():
+            order.append(name)
+            if name == "first":
+                await release.wait()
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        first = asyncio.create_task(request("first"))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(request("queued"))
+        await asyncio.sleep(0)
+        assert (limiter.active, limiter.waiting) == (1, 1)
+
+        with pytest.raises(Overloaded) as rejected:
+            await request("rejected")
+        assert rejected.value.retry_after >= 1
+
+        release.set()
+        await asyncio.gather(first, queued)
+
+    asyncio.run(run())
+    assert order == ["first", "queued"]
+    assert (limiter.active, limiter.waiting) == (0, 0)
+
+
+def test_limiter_frees_slot_on_error():
+    """Test that a failing request gives its slot back."""
+    limiter = AdmissionLimiter(concurrency=1, max_waiting=0)
+
+    async def run():
+        with pytest.raises(ValueError):
+            async with limiter.slot():
+                raise ValueError("boom")
+        async with limiter.slot():
+            return limiter.active
+
+    assert asyncio.run(run()) == 1
+
+
+def test_limiter_holds_slot_for_unfinished_work():
+    """Test that work handed to hold() keeps the slot after the block exits."""
+    limiter = AdmissionLimiter(concurrency=1, max_waiting=0)
+
+    async def run():
+        work = asyncio.get_running_loop().create_future()
+        async with limiter.slot() as hold:
+            hold(work)
+        assert limiter.active == 1
+        with pytest.raises(Overloaded):
+            async with limiter.slot():
+                pass
+        work.set_result(None)
+        await asyncio.sleep(0)
+        return limiter.active
+
+    assert asyncio.run(run()) == 0
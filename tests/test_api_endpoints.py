@@ -6,13 +6,12 @@ from PIL import Image
 import io
 import os
 
-# Set test environment
-os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///./test.db"
-os.environ["STORAGE_PATH"] = "./test_storage"
-os.environ["SECRET_KEY"] = "test_secret"
-
+# DATABASE_URL / STORAGE_PATH point at test.db / ./test_storage (see conftest.py)
 from app.main import app
-from app.db import Base, init_db, engine, AsyncSessionLocal
+from app.db import Base, init_db, engine, AsyncSessionLocal, settings
+from app.storage import storage
+
+STORAGE_DIRS = ("originals", "renditions", "variants", "pyramids")
 
 # Create test client
 client = TestClient(app)
@@ -23,6 +22,9 @@ async def setup_db():
     """Setup test database."""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    # The previous test removed the storage tree
+    for name in STORAGE_DIRS:
+        (storage.base_path / name).mkdir(parents=True, exist_ok=True)
     yield
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
@@ -73,6 +75,46 @@ async def test_upload_endpoint(setup_db):
     assert "content_hash" in data
 
 
+@pytest.mark.asyncio
+async def test_upload_small_image_renders_inline(setup_db, monkeypatch):
+    """Test that small uploads get their renditions during the request."""
+    monkeypatch.setattr(settings, "inline_render_max_pixels", 1_000_000)
+    image_content = create_test_image(color=(12, 34, 56), size=(120, 80))
+    
+    response = client.post(
+        "/upload/",
+        files={"file": ("small.jpg", image_content, "image/jpeg")},
+        params={"tenant_name": "test_tenant"}
+    )
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "uploaded"
+    assert "thumb" in data["ready_presets"]
+    assert data["job_ids"] == []
+    for preset in data["ready_presets"]:
+        assert client.get(f"/retrieve/rendition/{data['asset_id']}/{preset}").status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_failed_upload_removes_inline_renditions(setup_db, monkeypatch):
+    """Test that files rendered inline are deleted when the upload's transaction fails."""
+    from app.api import upload
+
+    async def failing_record_usage(*args, **kwargs):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(settings, "inline_render_max_pixels", 1_000_000)
+    monkeypatch.setattr(upload, "record_usage", failing_record_usage)
+    with pytest.raises(RuntimeError):
+        client.post(
+            "/upload/",
+            files={"file": ("small.jpg", create_test_image(size=(120, 80)), "image/jpeg")},
+            data={"tenant_name": "test_tenant"}
+        )
+    assert list((storage.base_path / "renditions").iterdir()) == []
+
+
 @pytest.mark.asyncio
 async def test_upload_idempotency(setup_db):
     """Test that uploading the same image twice is idempotent."""
@@ -125,6 +167,49 @@ async def test_retrieve_asset(setup_db):
     assert "renditions" in data
 
 
+@pytest.mark.asyncio
+async def test_retrieve_original_same_filename(setup_db):
+    """Uploads sharing a filename keep their own original files."""
+    contents = [create_test_image("red"), create_test_image("blue", size=(120, 80))]
+    asset_ids = []
+    for content in contents:
+        response = client.post(
+            "/upload/",
+            files={"file": ("photo.jpg", content, "image/jpeg")},
+            data={"tenant_name": "test_tenant"}
+        )
+        assert response.status_code == 200
+        asset_ids.append(response.json()["asset_id"])
+
+    for asset_id, content in zip(asset_ids, contents):
+        response = client.get(f"/retrieve/original/{asset_id}")
+        assert response.status_code == 200
+        assert response.content == content
+        assert response.headers["etag"].strip('"') == client.get(
+            f"/retrieve/asset/{asset_id}"
+        ).json()["content_hash"]
+
+
+@pytest.mark.asyncio
+async def test_resize_endpoint(setup_db):
+    """Test that variants are rendered, served from the cache, and not served for missing assets."""
+    response = client.post(
+        "/upload/",
+        files={"file": ("test.jpg", create_test_image(size=(800, 600)), "image/jpeg")},
+        data={"tenant_name": "test_tenant"}
+    )
+    asset_id = response.json()["asset_id"]
+
+    first = client.get(f"/resize/{asset_id}?w=320")
+    second = client.get(f"/resize/{asset_id}?w=320")
+    assert first.status_code == second.status_code == 200
+    assert first.content == second.content
+    assert first.headers["content-type"] == "image/jpeg"
+
+    response = client.get(f"/resize/{asset_id + 1000}?w=320")
+    assert response.status_code == 404
+
+
 @pytest.mark.asyncio
 async def test_retrieve_nonexistent_asset(setup_db):
     """Test retrieving non-existent asset."""
@@ -185,3 +270,131 @@ async def test_compare_endpoint(setup_db):
     # Should work even if renditions aren't ready yet
     assert response.status_code in [200, 404]  # 404 if renditions not ready
 
+
+@pytest.mark.asyncio
+async def test_compare_scores_renditions_against_upload(setup_db):
+    """Test that rendition psnr_db is measured against the upload, next to the stored render PSNR."""
+    from app.models import Rendition
+
+    asset_id = client.post(
+        "/upload/",
+        files={"file": ("red.jpg", create_test_image(), "image/jpeg")},
+        data={"tenant_name": "test_tenant"}
+    ).json()["asset_id"]
+    file_path = storage.save_rendition(create_test_image(size=(100, 100)), "qa", asset_id)
+    async with AsyncSessionLocal() as session:
+        session.add(Rendition(asset_id=asset_id, preset="qa", format="jpeg", file_path=file_path,
+                              bytes=1, width=100, height=100, psnr_db=55.5))
+        await session.commit()
+
+    def compare_card(color):
+        response = client.post(
+            f"/compare/{asset_id}",
+            files={"file": ("compare.jpg", create_test_image(color=color), "image/jpeg")}
+        )
+        assert response.status_code == 200
+        return response.json()["comparisons"]["qa"]
+
+    same, other = compare_card("red"), compare_card("blue")
+    assert same["render_psnr_db"] == other["render_psnr_db"] == 55.5
+    assert same["psnr_db"] > 30 > other["psnr_db"]
+
+
+
+@pytest.mark.asyncio
+async def test_compare_batch_endpoint(setup_db):
+    """Test batch compare: hash pre-filter, pixel metrics for survivors, unknown ids."""
+    red = client.post(
+        "/upload/",
+        files={"file": ("red.jpg", create_test_image(), "image/jpeg")},
+        data={"tenant_name": "test_tenant"}
+    ).json()["asset_id"]
+    blue = client.post(
+        "/upload/",
+        files={"file": ("blue.jpg", create_test_image(color="blue"), "image/jpeg")},
+        data={"tenant_name": "test_tenant"}
+    ).json()["asset_id"]
+
+    response = client.post(
+        f"/compare/batch?asset_ids={red}&asset_ids={blue}&asset_ids=999999&max_distance=0&metrics=psnr,ssim",
+        files={"file": ("compare.jpg", create_test_image(), "image/jpeg")}
+    )
+    assert response.status_code == 200
+    results = {r["asset_id"]: r for r in response.json()["results"]}
+    assert results[red]["psnr_db"] > 30
+    assert results[red]["ssim"] > 0.9
+    assert results[999999]["skipped"] == "not found"
+    # Flat images of different colors share an average hash, so blue is scored too
+    assert "skipped" not in results[blue] and results[blue]["psnr_db"] < results[red]["psnr_db"]
+
+
+@pytest.mark.asyncio
+async def test_metrics_pagination(setup_db):
+    """Test that all-tenant metrics page by tenant id and include tenants without assets."""
+    async with AsyncSessionLocal() as session:
+        from app.models import Tenant
+        session.add_all([Tenant(name=f"metrics_tenant_{i}") for i in range(3)])
+        await session.commit()
+    client.post("/upload/?tenant_name=metrics_tenant_1", files={"file": ("m.jpg", create_test_image(), "image/jpeg")})
+
+    first = client.get("/metrics/?limit=2").json()
+    assert len(first["tenants"]) == 2 and first["next_after"] is not None
+    rest = client.get(f"/metrics/?limit=2&after={first['next_after']}").json()
+    tenants = {t["tenant_name"]: t for t in first["tenants"] + rest["tenants"]}
+    assert tenants["metrics_tenant_0"]["asset_count"] == 0
+    assert tenants["metrics_tenant_1"]["asset_count"] == 1
+    assert tenants["metrics_tenant_1"]["total_bytes"] > 0
+
+    single = client.get("/metrics/tenant/metrics_tenant_1").json()
+    assert single == tenants["metrics_tenant_1"]
+
+
+@pytest.mark.asyncio
+async def test_usage_endpoint(setup_db):
+    """Test the per-tenant usage range endpoint at both granularities."""
+    from datetime import datetime, timedelta, timezone
+    from app.models import Tenant
+    from app.usage import UsageBuffer
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as session:
+        tenant = Tenant(name="usage_tenant")
+        session.add(tenant)
+        await session.commit()
+        buffer = UsageBuffer()
+        buffer.add(tenant.id, uploads=2, bytes=300, at=now - timedelta(hours=2))
+        buffer.add(tenant.id, renditions=4, cpu_seconds=1.5, at=now)
+        await buffer.flush(session)
+
+    hourly = client.get("/metrics/usage/usage_tenant").json()
+    assert hourly["granularity"] == "hour"
+    assert [b["uploads"] for b in hourly["buckets"]] == [2, 0]
+    assert hourly["totals"] == {"uploads": 2, "renditions": 4, "bytes_stored": 300, "cpu_seconds": 1.5}
+
+    daily = client.get("/metrics/usage/usage_tenant?granularity=day").json()
+    assert daily["totals"] == hourly["totals"]
+    assert 1 <= len(daily["buckets"]) <= 2
+
+    assert client.get("/metrics/usage/nobody").json()["buckets"] == []
+    assert client.get("/metrics/usage/usage_tenant?granularity=week").status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_prometheus_endpoint(setup_db):
+    """Test that requests show up per route template next to job and pool gauges."""
+    client.get("/retrieve/asset/999999")
+    text = client.get("/prometheus").text
+    assert 'http_requests_total{method="GET",route="/retrieve/asset/{asset_id}",status="404"}' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/retrieve/asset/{asset_id}",le="+Inf"}' in text
+    assert 'jobs{status="pending"}' in text
+    assert "jobs_oldest_pending_age_seconds" in text
+    assert "db_pool_checkedout" in text
+
+
+@pytest.mark.asyncio
+async def test_queue_endpoint(setup_db):
+    """Test that the queue endpoint reports counts, backlog and recent throughput."""
+    client.post("/upload/?tenant_name=queue_tenant", files={"file": ("q.jpg", create_test_image(size=(2000, 1500)), "image/jpeg")})
+    stats = client.get("/queue/").json()
+    assert set(stats["counts"]) >= {"pending", "processing", "completed", "failed"}
+    assert stats["backlog"] == stats["counts"]["pending"] + stats["counts"]["processing"]
+    assert {"completed", "failed", "throughput_per_minute", "failure_rate"} <= set(stats["recent"])
@@ -0,0 +1,120 @@
+"""Tests for the checkpointed rendition backfill."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select, update
+
+from app import backfill
+from app.models import Asset, Job, Rendition, Tenant
+from app.presets import PresetRegistry
+from app.storage import StorageAdapter
+
+
+@pytest_asyncio.fixture
+async def assets(session_factory, monkeypatch, tmp_path):
+    """Three assets of one tenant; the first already has its thumb."""
+    monkeypatch.setattr(backfill, "AsyncSessionLocal", session_factory)
+    monkeypatch.setattr(backfill, "storage", StorageAdapter(str(tmp_path)))
+    monkeypatch.setattr(backfill, "preset_registry", PresetRegistry(ttl=60))
+
+    async with session_factory() as session:
+        tenant = Tenant(name="acme")
+        session.add(tenant)
+        await session.flush()
+        assets = [
+            Asset(tenant_id=tenant.id, filename=f"{i}.jpg", content_hash=f"h{i}", perceptual_hash="0" * 16,
+                  original_bytes=100, width=800, height=600)
+            for i in range(3)
+        ]
+        session.add_all(assets)
+        await session.flush()
+        session.add(Rendition(asset_id=assets[0].id, preset="thumb", format="jpeg",
+                              file_path="renditions/1_thumb.jpg", bytes=10, width=100, height=75))
+        await session.commit()
+        return [asset.id for asset in assets]
+
+
+async def _jobs(session_factory):
+    async with session_factory() as session:
+        result = await session.execute(select(Job).order_by(Job.id))
+        return [(job.asset_id, job.preset, job.priority) for job in result.scalars()]
+
+
+def test_checkpoint_name_follows_preset_set():
+    """Test that different preset sets and tenants get their own checkpoints."""
+    assert backfill.checkpoint_name() == "all"
+    assert backfill.checkpoint_name(["zoom", "retina"]) == backfill.checkpoint_name(["retina", "zoom"])
+    assert backfill.checkpoint_name(["retina"]) != backfill.checkpoint_name(["zoom"])
+    assert backfill.checkpoint_name(["retina"], "a/b") == "retina@a-b"
+
+
+@pytest.mark.asyncio
+async def test_backfill_enqueues_missing_units_at_low_priority(session_factory, assets):
+    """Test that only missing (asset, preset) units are enqueued, below live upload priority."""
+    checkpoint = await backfill.run_backfill(presets=["thumb"], batch_size=2, rate=1000)
+
+    assert await _jobs(session_factory) == [
+        (2, "thumb", backfill.BACKFILL_PRIORITY), (3, "thumb", backfill.BACKFILL_PRIORITY),
+    ]
+    assert backfill.BACKFILL_PRIORITY < 0  # live upload jobs use the default priority 0
+    assert checkpoint.name == "thumb" and checkpoint.finished
+    assert (checkpoint.scanned, checkpoint.enqueued_assets, checkpoint.missing_pairs) == (3, 2, 2)
+
+
+@pytest.mark.asyncio
+async def test_backfill_resumes_after_checkpoint(session_factory, assets):
+    """Test that a rerun continues after the last checkpointed asset."""
+    backfill.BackfillCheckpoint(name="thumb", last_asset_id=2, scanned=2).save()
+    checkpoint = await backfill.run_backfill(presets=["thumb"], rate=1000)
+    # Finished checkpoints are not run again
+    again = await backfill.run_backfill(presets=["thumb"], rate=1000)
+
+    assert await _jobs(session_factory) == [(3, "thumb", backfill.BACKFILL_PRIORITY)]
+    assert checkpoint.scanned == 3 and checkpoint.finished
+    assert again.finished and again.scanned == 3
+
+
+@pytest.mark.asyncio
+async def test_dry_run_writes_nothing(session_factory, assets, tmp_path):
+    """Test that a dry run neither enqueues jobs nor saves its checkpoint."""
+    checkpoint = await backfill.run_backfill(presets=["thumb"], dry_run=True)
+
+    assert await _jobs(session_factory) == []
+    assert checkpoint.missing_pairs == 2
+    assert not (tmp_path / backfill.BackfillCheckpoint.path("thumb")).exists()
+    assert backfill.BackfillCheckpoint.load("thumb").last_asset_id == 0
+
+
+@pytest.mark.asyncio
+async def test_cpu_budget_waits_for_recent_backfill_cpu(session_factory, assets, monkeypatch):
+    """Test that enqueueing pauses while recent backfill renders used more than the CPU budget."""
+    async with session_factory() as session:
+        session.add_all([
+            Job(asset_id=assets[0], preset="card", status="completed", priority=backfill.BACKFILL_PRIORITY,
+                cpu_seconds=90.0, updated_at=datetime.now(timezone.utc)),
+            # Live jobs and old backfill jobs don't count
+            Job(asset_id=assets[0], preset="zoom", status="completed", cpu_seconds=500.0,
+                updated_at=datetime.now(timezone.utc)),
+            Job(asset_id=assets[0], preset="thumb", status="completed", priority=backfill.BACKFILL_PRIORITY,
+                cpu_seconds=500.0, updated_at=datetime.now(timezone.utc) - timedelta(minutes=5)),
+        ])
+        await session.commit()
+        assert await backfill.CpuBudget(cores=1).used(session) == 90.0
+
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+        # The heavy job ages out of the window
+        async with session_factory() as session:
+            await session.execute(update(Job).where(Job.cpu_seconds == 90.0).values(cpu_seconds=30.0))
+            await session.commit()
+
+    monkeypatch.setattr(backfill.asyncio, "sleep", fake_sleep)
+    await backfill.run_backfill(presets=["thumb"], rate=1000, cpu_budget=1.0)
+
+    assert sleeps == [1]
+    assert [job for job in await _jobs(session_factory) if job[0] != assets[0]] == [
+        (2, "thumb", backfill.BACKFILL_PRIORITY), (3, "thumb", backfill.BACKFILL_PRIORITY),
+    ]
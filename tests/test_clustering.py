@@ -0,0 +1,45 @@
+"""Tests for vectorized near-duplicate clustering."""
+import numpy as np
+
+from app.clustering import cluster_hashes, popcount64, substring_fields, UnionFind
+
+
+def test_popcount64():
+    """Test bit counting on uint64 values, including the top bit."""
+    values = np.array([0, 1, 0xFF, 2 ** 63, 2 ** 64 - 1], dtype=np.uint64)
+    assert popcount64(values).tolist() == [0, 1, 8, 1, 64]
+
+
+def test_substring_fields_cover_all_bits():
+    """Test that substrings are contiguous and cover 64 bits."""
+    fields = substring_fields(5)
+    assert [bits for _, bits in fields] == [13, 13, 13, 13, 12]
+    assert fields[-1][0] + fields[-1][1] == 64
+
+
+def test_clusters_are_transitive_and_collapse_exact_duplicates():
+    """Test that chains within k are merged and distant hashes stay apart."""
+    hashes = np.array([
+        0x0000000000000000,
+        0x0000000000000003,  # 2 bits from the first
+        0x000000000000000F,  # 2 bits from the second, 4 from the first
+        0x0000000000000000,  # exact duplicate of the first
+        0xFFFFFFFF00000000,  # far away
+    ], dtype=np.uint64)
+
+    labels = cluster_hashes(hashes, max_distance=2)
+    assert labels[0] == labels[1] == labels[2] == labels[3]
+    assert labels[4] != labels[0]
+
+    exact = cluster_hashes(hashes, max_distance=0)
+    assert exact[0] == exact[3]
+    assert len(set(exact.tolist())) == 4
+
+
+def test_union_find_merges_pair_arrays():
+    """Test that conflicting unions in one batch still end in one component."""
+    forest = UnionFind(6)
+    forest.union(np.array([5, 4, 3]), np.array([0, 0, 5]))
+    labels = forest.labels()
+    assert labels[0] == labels[3] == labels[4] == labels[5]
+    assert labels[1] != labels[2]
@@ -0,0 +1,91 @@
+"""Tests for batch compare scoring under a time budget."""
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+from app.api import compare
+from app.executor import AdmissionLimiter, MemoryBudget
+from app.models import Asset
+
+
+def _asset(asset_id):
+    return Asset(id=asset_id, tenant_id=1, filename=f"{asset_id}.jpg", content_hash=str(asset_id),
+                 perceptual_hash="0" * 16, original_bytes=1, width=64, height=64)
+
+
+@pytest.fixture
+def blocking_scores(monkeypatch):
+    """Scoring that holds its pool thread until the returned event is set."""
+    release = threading.Event()
+    started = []
+
+    def score(relative_path, size, upload, metrics, deadline):
+        started.append(relative_path)
+        release.wait(5)
+        return {"psnr": 40.0}
+
+    monkeypatch.setattr(compare, "probe_source", lambda relative_path, size: (size, "RGB"))
+    monkeypatch.setattr(compare, "_score_original", score)
+    monkeypatch.setattr(compare, "memory_budget", MemoryBudget(10 ** 9))
+    yield release, started
+    release.set()
+
+
+async def _score(asset_ids, budget):
+    return await compare._score_candidates(
+        asset_ids, {i: _asset(i) for i in asset_ids}, Image.new("RGB", (64, 64)), "0" * 16, 0,
+        max_distance=0, metric_names=["psnr"], max_side=64, budget=budget,
+    )
+
+
+@pytest.mark.asyncio
+async def test_expired_scores_keep_memory_until_their_thread_is_done(blocking_scores):
+    """Test that a score past the budget is skipped but holds its reservation while it still runs."""
+    release, started = blocking_scores
+    results = await _score([1], budget=0.05)
+
+    assert results[1]["skipped"] == "time budget exceeded"
+    assert started == ["originals/1.jpg"]
+    assert compare.memory_budget.available < compare.memory_budget.total_bytes
+
+    release.set()
+    for _ in range(100):
+        if compare.memory_budget.available == compare.memory_budget.total_bytes:
+            break
+        await asyncio.sleep(0.01)
+    assert compare.memory_budget.available == compare.memory_budget.total_bytes
+
+
+def test_score_original_skips_decoding_after_deadline():
+    """Test that scoring queued behind the budget returns without touching the file."""
+    assert compare._score_original("originals/missing.jpg", (64, 64), None, ["psnr"], deadline=0) is None
+
+
+@pytest.mark.asyncio
+async def test_slot_stays_taken_while_expired_scores_run(blocking_scores, monkeypatch):
+    """Test that after the budget expires a new compare still gets 429 until the old threads finish."""
+    release, _ = blocking_scores
+    monkeypatch.setattr(compare, "compare_limiter", AdmissionLimiter(concurrency=1, max_waiting=0))
+
+    async with compare._compare_slot() as hold:
+        results = await compare._score_candidates(
+            [1], {1: _asset(1)}, Image.new("RGB", (64, 64)), "0" * 16, 0,
+            max_distance=0, metric_names=["psnr"], max_side=64, budget=0.05, hold=hold,
+        )
+    assert results[1]["skipped"] == "time budget exceeded"
+
+    with pytest.raises(HTTPException) as rejected:
+        async with compare._compare_slot():
+            pass
+    assert rejected.value.status_code == 429
+
+    release.set()
+    for _ in range(100):
+        if compare.compare_limiter.active == 0:
+            break
+        await asyncio.sleep(0.01)
+    async with compare._compare_slot():
+        assert compare.compare_limiter.active == 1
@@ -0,0 +1,93 @@
+"""Tests for linking renditions of perceptually identical uploads."""
+import pytest
+
+from app.dedupe import find_link_source, link_renditions
+from app.models import Asset, Rendition, Tenant
+from app.storage import storage
+
+
+def _asset(tenant_id, sha, ahash, size=(900, 600), phash=0x1234, dhash=0x5678):
+    return Asset(
+        tenant_id=tenant_id, filename=f"{sha}.jpg", content_hash=sha, perceptual_hash=ahash,
+        phash=phash, dhash=dhash, original_bytes=1000, width=size[0], height=size[1], color_space="RGB"
+    )
+
+
+async def _link(session_factory, max_distance, **upload_hashes):
+    async with session_factory() as session:
+        tenant, other = Tenant(name="a"), Tenant(name="b")
+        session.add_all([tenant, other])
+        await session.flush()
+
+        source = _asset(tenant.id, "s1", "ffff0000ffff0000")
+        other_tenant = _asset(other.id, "s2", "ffff0000ffff0000")
+        resized = _asset(tenant.id, "s3", "ffff0000ffff0000", size=(450, 300))
+        session.add_all([source, other_tenant, resized])
+        await session.flush()
+        session.add(Rendition(asset_id=source.id, preset="card", format="jpeg", file_path="renditions/1_card.jpg",
+                              bytes=10, width=400, height=267))
+        session.add(Rendition(asset_id=other_tenant.id, preset="card", format="jpeg", file_path="renditions/2_card.jpg",
+                              bytes=10, width=400, height=267))
+
+        upload = _asset(tenant.id, "s4", "ffff0000ffff0001", **upload_hashes)
+        session.add(upload)
+        await session.flush()
+
+        found = await find_link_source(session, upload, max_distance)
+        linked = await link_renditions(session, upload, found) if found else []
+        await session.commit()
+        return found.id if found else None, [r.file_path for r in linked], upload.linked_asset_id, source.id
+
+
+@pytest.mark.asyncio
+async def test_links_same_tenant_same_size_within_distance(session_factory):
+    """Test that a near-identical upload shares the source's rendition files."""
+    found_id, paths, linked_asset_id, source_id = await _link(session_factory, max_distance=1)
+    assert found_id == source_id
+    assert linked_asset_id == source_id
+    assert paths == ["renditions/1_card.jpg"]
+
+
+@pytest.mark.asyncio
+async def test_no_link_when_hash_differs(session_factory):
+    """Test that exact-match mode ignores assets at distance > 0."""
+    found_id, paths, linked_asset_id, _ = await _link(session_factory, max_distance=0)
+    assert found_id is None
+    assert paths == []
+    assert linked_asset_id is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("hashes", [{"phash": 0x1234 ^ 0b111}, {"dhash": 0x5678 ^ 0b111}, {"phash": None}])
+async def test_no_link_when_phash_or_dhash_differs(session_factory, hashes):
+    """Test that an average-hash match alone is not enough to link."""
+    found_id, paths, linked_asset_id, _ = await _link(session_factory, max_distance=1, **hashes)
+    assert found_id is None
+    assert linked_asset_id is None
+
+
+@pytest.mark.asyncio
+async def test_rerender_never_touches_linked_files(session_factory, monkeypatch, tmp_path):
+    """Test that renders of the source or the linked asset write new files instead of the shared one."""
+    monkeypatch.setattr(storage, "base_path", tmp_path)
+    (tmp_path / "renditions").mkdir()
+    async with session_factory() as session:
+        tenant = Tenant(name="a")
+        session.add(tenant)
+        await session.flush()
+        source, upload = _asset(tenant.id, "s1", "ffff0000ffff0000"), _asset(tenant.id, "s2", "ffff0000ffff0000")
+        session.add_all([source, upload])
+        await session.flush()
+        shared = storage.save_rendition(b"first render", "card", source.id)
+        session.add(Rendition(asset_id=source.id, preset="card", format="jpeg", file_path=shared,
+                              bytes=12, width=400, height=267))
+        await session.flush()
+        linked = await link_renditions(session, upload, source)
+        await session.commit()
+
+    assert linked[0].file_path == shared
+    rerendered = storage.save_rendition(b"second render", "card", source.id)
+    own = storage.save_rendition(b"third render", "card", upload.id)
+    assert rerendered != shared and own != shared
+    assert own.startswith(f"renditions/{upload.id}_card_")
+    assert storage.read_file(shared) == b"first render"
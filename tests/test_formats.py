@@ -0,0 +1,27 @@
+"""Tests for rendition output formats and content negotiation."""
+from app.utils import negotiate_format, rendition_formats, OUTPUT_FORMATS
+
+
+def test_rendition_formats():
+    """Test configured format parsing."""
+    assert rendition_formats("jpeg,webp") == ["jpeg", "webp"]
+    # JPEG is always generated, unknown formats are dropped
+    assert rendition_formats("webp, bogus") == ["jpeg", "webp"]
+
+
+def test_negotiate_format():
+    """Test Accept header negotiation."""
+    available = ["jpeg", "webp"]
+    assert negotiate_format("image/webp,image/*,*/*;q=0.8", available) == "webp"
+    assert negotiate_format("image/webp;q=0,image/*", available) == "jpeg"
+    assert negotiate_format("", available) == "jpeg"
+
+    # Wildcards don't imply WebP support
+    assert negotiate_format("image/*", available) == "jpeg"
+
+    # Only stored formats are chosen
+    assert negotiate_format("image/webp", ["jpeg"]) == "jpeg"
+
+    if "avif" in OUTPUT_FORMATS:
+        assert negotiate_format("image/avif,image/webp", ["jpeg", "webp", "avif"]) == "avif"
+        assert negotiate_format("image/avif;q=0.5,image/webp", ["jpeg", "webp", "avif"]) == "webp"
@@ -6,8 +6,10 @@ import io
 from app.hashing import (
     compute_sha256,
     compute_perceptual_hash,
+    compute_perceptual_hashes,
     compute_content_hash,
-    hash_distance
+    hash_distance,
+    to_signed64
 )
 
 
@@ -86,3 +88,41 @@ def test_hash_distance():
     # Different images should have positive distance
     assert hash_distance(hash1, hash3) > 0
 
+
+
+def test_compute_perceptual_hashes():
+    """Test pHash/dHash/wHash fit signed BIGINT and survive a resize."""
+    import numpy as np
+    pixels = np.random.RandomState(0).randint(0, 255, (120, 160, 3), dtype="uint8")
+    img = Image.fromarray(pixels)
+
+    hashes = compute_perceptual_hashes(img)
+    assert set(hashes) == {"phash", "dhash", "whash"}
+    for value in hashes.values():
+        assert -(1 << 63) <= value < (1 << 63)
+
+    resized = compute_perceptual_hashes(img.resize((320, 240)))
+    for name in hashes:
+        assert bin((hashes[name] ^ resized[name]) & 0xFFFFFFFFFFFFFFFF).count("1") <= 6
+
+
+def test_to_signed64_keeps_bits():
+    """Test unsigned hashes map to signed values with the same 64 bits."""
+    assert to_signed64(5) == 5
+    assert to_signed64(0xFFFFFFFFFFFFFFFF) == -1
+    assert to_signed64(1 << 63) & 0xFFFFFFFFFFFFFFFF == 1 << 63
+
+
+@pytest.mark.asyncio
+async def test_sql_hamming_distance_on_sqlite(session_factory):
+    """Test the registered SQLite hamming_distance function on signed BIGINTs."""
+    from sqlalchemy import select
+    from app.db import hamming_distance
+
+    async with session_factory() as session:
+        row = (await session.execute(select(
+            hamming_distance(-1, 0),
+            hamming_distance(to_signed64(0xF0), to_signed64(0xFF)),
+        ))).one()
+
+    assert tuple(row) == (64, 4)
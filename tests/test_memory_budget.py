@@ -0,0 +1,70 @@
+"""Tests for memory-aware admission of image decodes."""
+import asyncio
+
+from app.executor import MemoryBudget
+from app.renditions import estimate_render_bytes
+
+
+def test_reservations_wait_for_room_in_order():
+    """Test that a large reservation waits and is not overtaken by later small ones."""
+    budget = MemoryBudget(100)
+    order = []
+
+    async def job(name, nbytes, hold):
+        async with budget.reserve(nbytes):
+            order.append(name)
+            await asyncio.sleep(hold)
+
+    async def run():
+        first = asyncio.create_task(job("a", 60, 0.02))
+        await asyncio.sleep(0)
+        await asyncio.gather(first, job("big", 80, 0), job("small", 10, 0))
+
+    asyncio.run(run())
+    assert order == ["a", "big", "small"]
+    assert budget.available == 100
+
+
+def test_oversized_reservation_is_clamped_to_budget():
+    """Test that a reservation above the budget still runs (alone)."""
+    budget = MemoryBudget(100)
+
+    async def run():
+        async with budget.reserve(500):
+            assert budget.available == 0
+
+    asyncio.run(run())
+    assert budget.available == 100
+
+
+def test_estimate_uses_working_size_for_reduced_decodes():
+    """Test that reduced decodes are estimated from the reduced working size."""
+    full = estimate_render_bytes((10000, 10000), "RGB")
+    reduced = estimate_render_bytes((2500, 2500), "RGB", (1200, 1200))
+    assert full == 3 * 10000 * 10000 * 4
+    assert reduced < full / 10
+
+
+def test_source_cache_charges_budget_until_evicted(monkeypatch):
+    """Test that cached sources hold budget, are evicted for waiting work, and aren't kept without room."""
+    from PIL import Image
+    from app import renditions
+
+    monkeypatch.setattr(renditions, "_decode_fully", lambda path: Image.new("RGB", (10, 10)))
+    budget = MemoryBudget(1000)
+    cache = renditions.SourceCache(max_items=4, budget=budget)
+
+    async def run():
+        await cache.get("originals/a.jpg", source_key="a")
+        assert budget.available == 600  # 10x10 RGB held at 4 bytes per pixel
+        await cache.get("originals/a.jpg", source_key="a")
+        assert budget.available == 600
+
+        # A reservation that only fits without the cached image evicts it
+        async with budget.reserve(900):
+            assert budget.available == 100
+            await cache.get("originals/b.jpg", source_key="b")
+            assert budget.available == 100  # decoded, but no room to keep it
+        assert budget.available == 1000
+
+    asyncio.run(run())
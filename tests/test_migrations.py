@@ -0,0 +1,83 @@
+"""Tests for schema migrations of new, first-release and create_all databases."""
+from sqlalchemy import create_engine, inspect, text
+
+from app.db import Base
+from app.migrate import upgrade
+import app.models  # noqa: F401
+
+
+def _engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'migrate.db'}")
+
+
+def _assert_matches_models(connection):
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        columns = {c["name"] for c in inspector.get_columns(table.name)}
+        assert columns == set(table.columns.keys()), table.name
+        indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        indexes |= {c["name"] for c in inspector.get_unique_constraints(table.name)}
+        expected = {i.name for i in table.indexes}
+        expected |= {c.name for c in table.constraints if c.name and c.__class__.__name__ == "UniqueConstraint"}
+        assert expected <= indexes, (table.name, expected - indexes)
+
+
+def test_new_database_migrates_to_models(tmp_path):
+    """Test that running every migration on an empty database yields the models' schema."""
+    engine = _engine(tmp_path)
+    with engine.begin() as connection:
+        upgrade(connection)
+        _assert_matches_models(connection)
+
+
+def test_first_release_database_is_upgraded(tmp_path):
+    """Test that a database created before migrations existed keeps its rows and gains the new schema."""
+    engine = _engine(tmp_path)
+    with engine.begin() as connection:
+        upgrade(connection, "0001")
+        connection.execute(text("DROP TABLE alembic_version"))
+        connection.execute(text("INSERT INTO tenants (id, name) VALUES (1, 't')"))
+        connection.execute(text(
+            "INSERT INTO assets (id, tenant_id, filename, content_hash, perceptual_hash, original_bytes, width, height) "
+            "VALUES (1, 1, 'a.jpg', 'h', '0000000000000000', 10, 1, 1)"
+        ))
+        connection.execute(text(
+            "INSERT INTO renditions (asset_id, preset, file_path, bytes, width, height) VALUES (1, 'thumb', 'r/1.jpg', 5, 1, 1)"
+        ))
+        connection.execute(text("INSERT INTO jobs (asset_id, status, retry_count, max_retries) VALUES (1, 'pending', 0, 3)"))
+
+    with engine.begin() as connection:
+        upgrade(connection)
+        _assert_matches_models(connection)
+        assert connection.execute(text("SELECT format FROM renditions")).scalar_one() == "jpeg"
+        assert connection.execute(text("SELECT priority, preset FROM jobs")).one() == (0, None)
+        # Linked renditions share files: file_path is no longer unique
+        connection.execute(text(
+            "INSERT INTO renditions (asset_id, preset, format, file_path, bytes, width, height) "
+            "VALUES (1, 'card', 'jpeg', 'r/1.jpg', 5, 1, 1)"
+        ))
+
+
+def test_create_all_database_is_stamped_and_upgraded(tmp_path):
+    """Test that an unversioned database that already has the current schema migrates without errors."""
+    engine = _engine(tmp_path)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        upgrade(connection)
+        upgrade(connection)  # idempotent once versioned
+        assert connection.execute(text("SELECT count(*) FROM alembic_version")).scalar_one() == 1
+        _assert_matches_models(connection)
+
+
+def test_duplicate_global_presets_are_collapsed(tmp_path):
+    """Test that the global preset unique index keeps the newest of duplicate global rows."""
+    engine = _engine(tmp_path)
+    with engine.begin() as connection:
+        upgrade(connection, "0012")
+        for width in (100, 200):
+            connection.execute(text(
+                f"INSERT INTO rendition_presets (tenant_id, name, width, height, fit, profile, enabled) "
+                f"VALUES (NULL, 'retina', {width}, {width}, 1, 'balanced', 1)"
+            ))
+        upgrade(connection)
+        assert connection.execute(text("SELECT width FROM rendition_presets")).scalars().all() == [200]
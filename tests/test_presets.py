@@ -0,0 +1,61 @@
+"""Tests for the rendition preset registry."""
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.models import RenditionPreset, Tenant
+from app.presets import PresetRegistry
+from app.utils import RENDITION_PRESETS
+
+
+@pytest.mark.asyncio
+async def test_preset_resolution(session_factory):
+    """Test built-in < global < tenant precedence and disabling."""
+    async with session_factory() as session:
+        tenant = Tenant(name="thumbs_only")
+        session.add(tenant)
+        await session.flush()
+        session.add_all([
+            # Global default change
+            RenditionPreset(tenant_id=None, name="card", width=500, height=500, fit=True, profile="balanced"),
+            # Tenant hides card and zoom, adds retina
+            RenditionPreset(tenant_id=tenant.id, name="card", width=1, height=1, enabled=False),
+            RenditionPreset(tenant_id=tenant.id, name="zoom", width=1, height=1, enabled=False),
+            RenditionPreset(tenant_id=tenant.id, name="retina", width=800, height=800, fit=True, profile="smallest"),
+        ])
+        await session.commit()
+
+        registry = PresetRegistry(ttl=60)
+        global_presets = await registry.get_presets(session, None)
+        tenant_presets = await registry.get_presets(session, tenant.id)
+
+    assert set(global_presets) == set(RENDITION_PRESETS)
+    assert global_presets["card"]["size"] == (500, 500)
+    assert global_presets["thumb"] == RENDITION_PRESETS["thumb"]
+
+    assert set(tenant_presets) == {"thumb", "retina"}
+    assert tenant_presets["retina"]["profile"] == "smallest"
+
+
+@pytest.mark.asyncio
+async def test_global_preset_names_unique(session_factory):
+    """Test that two global rows (tenant_id NULL) can't share a name."""
+    async with session_factory() as session:
+        session.add(RenditionPreset(tenant_id=None, name="retina", width=800, height=800))
+        await session.commit()
+        session.add(RenditionPreset(tenant_id=None, name="retina", width=900, height=900))
+        with pytest.raises(IntegrityError):
+            await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_registry_returns_copies(session_factory):
+    """Test that editing the returned presets leaves the cached ones untouched."""
+    async with session_factory() as session:
+        registry = PresetRegistry(ttl=60)
+        presets = await registry.get_presets(session, None)
+        presets["thumb"]["size"] = (1, 1)
+        presets.pop("card")
+        presets = await registry.get_presets(session, None)
+
+    assert presets["thumb"] == RENDITION_PRESETS["thumb"]
+    assert "card" in presets
@@ -0,0 +1,36 @@
+"""Tests for Deep Zoom tile pyramid packs."""
+import io
+import struct
+
+from PIL import Image
+
+from app.pyramid import pyramid_levels, write_pyramid, PACK_MAGIC
+
+
+def test_levels_halve_down_to_one_pixel():
+    """Test that level sizes follow Deep Zoom rounding (ceil) down to 1x1."""
+    levels = pyramid_levels(600, 300)
+    assert levels[0] == (1, 1)
+    assert levels[-1] == (600, 300)
+    assert levels[-2] == (300, 150)
+    assert levels[-4] == (75, 38)
+    assert len(levels) == 11
+
+
+def test_pack_index_covers_every_tile():
+    """Test that every tile of every level is written and addressable from the index."""
+    image = Image.new("RGB", (600, 300), "blue")
+    out = io.BytesIO()
+    index = write_pyramid(image, out, tile_size=256)
+    data = out.getvalue()
+
+    length, magic = struct.unpack(">Q4s", data[-12:])
+    assert magic == PACK_MAGIC
+    assert length == len(data) - 12 - sum(size for _, size in index["tiles"].values())
+
+    # Full-size level: 3 x 2 tiles, the last column 88px wide
+    offset, size = index["tiles"]["10/2_1"]
+    tile = Image.open(io.BytesIO(data[offset:offset + size]))
+    assert tile.size == (88, 44)
+    assert "0/0_0" in index["tiles"]
+    assert "10/3_0" not in index["tiles"]
@@ -0,0 +1,63 @@
+"""Tests for the vectorized quality metrics."""
+import io
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from app.quality import MAX_PSNR_DB, compare, compare_batch, evaluation_size, ms_ssim, psnr, ssim
+
+
+def _photo(size=(320, 240)):
+    """Smooth noisy image, roughly photo-like."""
+    rng = np.random.RandomState(0)
+    pixels = (rng.rand(size[1], size[0], 3) * 255).astype(np.uint8)
+    return Image.fromarray(pixels).filter(ImageFilter.GaussianBlur(2))
+
+
+def _jpeg(image, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+
+def test_psnr_matches_float64_reference():
+    """Test float32 PSNR against the textbook float64 formula."""
+    image = _photo()
+    a = np.asarray(image)
+    b = np.asarray(_jpeg(image, 50))
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    assert abs(psnr(a, b) - 10 * np.log10(255 ** 2 / mse)) < 1e-4
+    assert psnr(a, a) == MAX_PSNR_DB
+
+
+def test_ssim_ordering_and_identity():
+    """Test that SSIM and MS-SSIM rank stronger compression lower."""
+    image = _photo()
+    reference = np.asarray(image.convert("L"))
+    good = np.asarray(_jpeg(image, 90).convert("L"))
+    bad = np.asarray(_jpeg(image, 10).convert("L"))
+    assert ssim(reference, reference) == 1.0
+    assert ssim(reference, good) > ssim(reference, bad)
+    assert ms_ssim(reference, reference) == 1.0
+    assert ms_ssim(reference, good) > ms_ssim(reference, bad)
+
+
+def test_compare_batch_matches_single_pairs():
+    """Test that batched pairs score the same as one at a time, across sizes."""
+    image = _photo()
+    small = image.resize((120, 90))
+    pairs = [(image, _jpeg(image, 30)), (image, image), (small, _jpeg(image, 60))]
+    metrics = ("psnr", "ssim", "ms_ssim")
+    batched = compare_batch(pairs, metrics)
+    for pair, result in zip(pairs, batched):
+        single = compare(*pair, metrics)
+        for metric in metrics:
+            assert abs(result[metric] - single[metric]) < 1e-6
+    assert batched[1] == {"psnr": MAX_PSNR_DB, "ssim": 1.0, "ms_ssim": 1.0}
+
+
+def test_evaluation_size():
+    """Test downsampled evaluation keeps aspect ratio and never upsamples."""
+    assert evaluation_size((4000, 3000), 1000) == (1000, 750)
+    assert evaluation_size((400, 300), 1000) == (400, 300)
+    assert evaluation_size((400, 300)) == (400, 300)
@@ -0,0 +1,64 @@
+"""Tests for job queue depth and lag statistics."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models import Asset, Job, Tenant
+from app.queue_stats import compute_queue_stats
+
+
+@pytest.mark.asyncio
+async def test_queue_stats_counts_backlog_and_recent_jobs(session_factory):
+    """Test counts by status, per-tenant backlog ordering, ages and the recent window."""
+    now = datetime.now(timezone.utc)
+    async with session_factory() as session:
+        assets = {}
+        for name in ("busy", "quiet", "idle"):
+            tenant = Tenant(name=name)
+            session.add(tenant)
+            await session.flush()
+            asset = Asset(tenant_id=tenant.id, filename=f"{name}.jpg", content_hash=name,
+                          perceptual_hash="0" * 16, original_bytes=1, width=1, height=1)
+            session.add(asset)
+            await session.flush()
+            assets[name] = asset.id
+
+        def job(name, status, created_minutes_ago, updated_minutes_ago=None):
+            session.add(Job(
+                asset_id=assets[name], status=status,
+                created_at=now - timedelta(minutes=created_minutes_ago),
+                updated_at=now - timedelta(minutes=updated_minutes_ago) if updated_minutes_ago is not None else None,
+            ))
+
+        job("busy", "pending", 30)
+        job("busy", "pending", 1)
+        job("busy", "processing", 5, updated_minutes_ago=2)
+        job("quiet", "pending", 10)
+        job("idle", "completed", 60, updated_minutes_ago=1)
+        job("idle", "completed", 60, updated_minutes_ago=2)
+        job("idle", "completed", 60, updated_minutes_ago=3)
+        job("idle", "failed", 60, updated_minutes_ago=4)
+        job("idle", "completed", 600, updated_minutes_ago=500)  # outside the window
+        await session.commit()
+
+        stats = await compute_queue_stats(session, window=300)
+
+    assert stats["counts"] == {"pending": 3, "processing": 1, "completed": 4, "failed": 1}
+    assert stats["backlog"] == 4
+    assert 29 * 60 < stats["oldest_pending_age_seconds"] < 31 * 60
+    assert 60 < stats["oldest_processing_age_seconds"] < 3 * 60
+    assert [(t["tenant_name"], t["backlog"]) for t in stats["tenants"]] == [("busy", 3), ("quiet", 1)]
+    assert stats["recent"]["completed"] == 3 and stats["recent"]["failed"] == 1
+    assert stats["recent"]["failure_rate"] == 0.25
+    assert stats["recent"]["throughput_per_minute"] == 0.6
+
+
+@pytest.mark.asyncio
+async def test_queue_stats_empty_queue(session_factory):
+    """Test that an empty jobs table reports zeros and no ages."""
+    async with session_factory() as session:
+        stats = await compute_queue_stats(session)
+
+    assert stats["backlog"] == 0 and stats["tenants"] == []
+    assert stats["oldest_pending_age_seconds"] is None
+    assert stats["recent"]["failure_rate"] == 0.0
@@ -0,0 +1,68 @@
+"""Tests for Range request handling."""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.responses import RangeFileResponse, RangeNotSatisfiable, parse_range_header
+
+
+def test_parse_range_header():
+    """Test single-range parsing."""
+    assert parse_range_header("bytes=0-99", 1000) == (0, 99)
+    assert parse_range_header("bytes=500-", 1000) == (500, 999)
+    assert parse_range_header("bytes=-100", 1000) == (900, 999)
+    assert parse_range_header("bytes=900-5000", 1000) == (900, 999)
+
+    # Ignored: other units, multiple ranges, malformed
+    assert parse_range_header("items=0-1", 1000) is None
+    assert parse_range_header("bytes=0-1,5-9", 1000) is None
+    assert parse_range_header("bytes=abc", 1000) is None
+
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header("bytes=1000-", 1000)
+
+
+@pytest.fixture
+def range_client(tmp_path):
+    """Client for an app serving a 1000-byte file."""
+    path = tmp_path / "blob.bin"
+    content = bytes(range(256)) * 4
+    path.write_bytes(content[:1000])
+
+    app = FastAPI()
+
+    @app.get("/file")
+    async def serve():
+        return RangeFileResponse(str(path), etag="abc")
+
+    return TestClient(app), content[:1000]
+
+
+def test_range_response(range_client):
+    """Test 200, 206 and 416 responses."""
+    client, content = range_client
+
+    response = client.get("/file")
+    assert response.status_code == 200
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.content == content
+
+    response = client.get("/file", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 100-199/1000"
+    assert response.content == content[100:200]
+
+    response = client.get("/file", headers={"Range": "bytes=2000-"})
+    assert response.status_code == 416
+
+
+def test_if_range_mismatch_serves_full_file(range_client):
+    """Test that a stale If-Range validator falls back to the full file."""
+    client, content = range_client
+
+    response = client.get("/file", headers={"Range": "bytes=0-9", "If-Range": '"abc"'})
+    assert response.status_code == 206
+
+    response = client.get("/file", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == content
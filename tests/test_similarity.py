@@ -0,0 +1,39 @@
+"""Tests for the in-memory perceptual hash index."""
+import random
+
+from app.hashing import hash_distance
+from app.similarity import HashIndex
+
+
+def test_search_matches_brute_force():
+    """Test that indexed lookups return exactly the assets within distance k."""
+    rng = random.Random(0)
+    index = HashIndex()
+    hashes = {}
+    for asset_id in range(1, 2001):
+        hashes[asset_id] = f"{rng.getrandbits(64):016x}"
+        index.add(asset_id, asset_id % 3, hashes[asset_id])
+
+    for _ in range(50):
+        # Query near an existing hash so there is something to find
+        value = int(hashes[rng.randint(1, 2000)], 16)
+        for bit in rng.sample(range(64), rng.randint(0, 8)):
+            value ^= 1 << bit
+        query = f"{value:016x}"
+        k = rng.randint(0, 9)
+
+        expected = {a for a, h in hashes.items() if hash_distance(h, query) <= k}
+        assert {a for a, _ in index.search(query, k)} == expected
+
+
+def test_search_filters_tenant_and_sorts_by_distance():
+    """Test tenant filtering, nearest-first ordering and limit."""
+    index = HashIndex()
+    index.add(1, 1, "ffffffffffffffff")
+    index.add(2, 1, "fffffffffffffffe")
+    index.add(3, 2, "ffffffffffffffff")
+    index.add(4, 1, "fffffffffffffff0")
+
+    assert index.search("ffffffffffffffff", 4, tenant_id=1) == [(1, 0), (2, 1), (4, 4)]
+    assert index.search("ffffffffffffffff", 4, limit=2) == [(1, 0), (3, 0)]
+    assert len(index) == 4
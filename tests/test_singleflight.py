@@ -0,0 +1,90 @@
+"""Tests for single-flight request coalescing."""
+import asyncio
+
+from app.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    """Test that concurrent callers for a key run the work once."""
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def run():
+        results = await asyncio.gather(*[flight.do("key", work) for _ in range(5)])
+        return results
+
+    results = asyncio.run(run())
+    assert results == ["done"] * 5
+    assert len(calls) == 1
+    assert not flight.in_flight("key")
+
+
+def test_different_keys_run_separately():
+    """Test that different keys are not coalesced."""
+    flight = SingleFlight()
+    calls = []
+
+    async def work(key):
+        calls.append(key)
+        await asyncio.sleep(0)
+        return key
+
+    async def run():
+        return await asyncio.gather(
+            flight.do("a", lambda: work("a")),
+            flight.do("b", lambda: work("b")),
+        )
+
+    assert asyncio.run(run()) == ["a", "b"]
+    assert sorted(calls) == ["a", "b"]
+
+
+def test_source_cache_decodes_once_and_evicts(monkeypatch):
+    """Test that sibling jobs share one decode and the cache stays bounded."""
+    from app import renditions
+
+    decoded = []
+
+    def fake_decode(path):
+        decoded.append(path)
+        return path.upper()
+
+    monkeypatch.setattr(renditions, "_decode_fully", fake_decode)
+    cache = renditions.SourceCache(max_items=1)
+
+    async def run():
+        first = await asyncio.gather(*[cache.get("originals/a.jpg") for _ in range(3)])
+        await cache.get("originals/b.jpg")
+        await cache.get("originals/a.jpg")
+        return first
+
+    assert asyncio.run(run()) == ["ORIGINALS/A.JPG"] * 3
+    assert decoded == ["originals/a.jpg", "originals/b.jpg", "originals/a.jpg"]
+
+
+def test_source_cache_keys_by_source_not_path(monkeypatch):
+    """Test that a path reused for different content is decoded again."""
+    from app import renditions
+
+    decoded = []
+
+    def fake_decode(path):
+        decoded.append(path)
+        return len(decoded)
+
+    monkeypatch.setattr(renditions, "_decode_fully", fake_decode)
+    cache = renditions.SourceCache(max_items=4)
+
+    async def run():
+        return [
+            await cache.get("originals/photo.jpg", source_key="hash-a"),
+            await cache.get("originals/photo.jpg", source_key="hash-b"),
+            await cache.get("originals/photo.jpg", source_key="hash-a"),
+        ]
+
+    assert asyncio.run(run()) == [1, 2, 1]
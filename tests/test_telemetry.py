@@ -0,0 +1,79 @@
+"""Tests for HTTP request metrics and their Prometheus rendering."""
+import asyncio
+
+from app.telemetry import Histogram, HTTPMetrics, HTTPMetricsMiddleware, render_http_metrics, UNMATCHED
+
+
+class _Route:
+    path = "/assets/{asset_id}"
+
+
+def _app(status=200, body=b"hello", fail=False):
+    async def app(scope, receive, send):
+        await receive()
+        if fail:
+            raise RuntimeError("boom")
+        scope["route"] = _Route()
+        await send({"type": "http.response.start", "status": status, "headers": []})
+        await send({"type": "http.response.body", "body": body})
+    return app
+
+
+async def _call(app, body=b""):
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app({"type": "http", "method": "POST"}, receive, send)
+
+
+def test_histogram_buckets_are_upper_bounds():
+    """Test that a value equal to a bound lands in that bound's bucket."""
+    histogram = Histogram((1, 10))
+    for value in (0, 1, 5, 10, 11):
+        histogram.observe(value)
+    assert histogram.counts == [2, 2, 1]
+    assert histogram.sum == 27
+
+
+def test_middleware_records_route_template_status_and_sizes():
+    """Test that requests are labelled by route template and count body bytes."""
+    metrics = HTTPMetrics()
+    asyncio.run(_call(HTTPMetricsMiddleware(_app(), metrics), body=b"x" * 300))
+    asyncio.run(_call(HTTPMetricsMiddleware(_app(status=404), metrics)))
+
+    stats = metrics.routes[("POST", "/assets/{asset_id}")]
+    assert stats.statuses == {200: 1, 404: 1}
+    assert stats.latency.counts[-1] == 0 and sum(stats.latency.counts) == 2
+    assert stats.request_bytes.sum == 300
+    assert stats.response_bytes.sum == 10
+    assert metrics.in_flight == 0
+
+
+def test_middleware_counts_unrouted_failures_as_500():
+    """Test that an exception before any response is recorded as a 500 without a route."""
+    metrics = HTTPMetrics()
+    try:
+        asyncio.run(_call(HTTPMetricsMiddleware(_app(fail=True), metrics)))
+    except RuntimeError:
+        pass
+    assert metrics.routes[("POST", UNMATCHED)].statuses == {500: 1}
+    assert metrics.in_flight == 0
+
+
+def test_render_cumulative_histogram():
+    """Test the exposition format of counters and cumulative histogram buckets."""
+    metrics = HTTPMetrics()
+    metrics.observe("GET", '/a"b', 200, 0.003, 0, 2000)
+    metrics.observe("GET", '/a"b', 200, 0.2, 0, 10)
+    text = "\n".join(render_http_metrics(metrics))
+    labels = 'method="GET",route="/a\\"b"'
+    assert f'http_requests_total{{{labels},status="200"}} 2' in text
+    assert f'http_request_duration_seconds_bucket{{{labels},le="0.005"}} 1' in text
+    assert f'http_request_duration_seconds_bucket{{{labels},le="0.25"}} 2' in text
+    assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f'http_request_duration_seconds_count{{{labels}}} 2' in text
+    assert f'http_response_size_bytes_bucket{{{labels},le="1024"}} 1' in text
+    assert "# TYPE http_request_duration_seconds histogram" in text
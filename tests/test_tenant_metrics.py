@@ -0,0 +1,63 @@
+"""Tests for incrementally maintained tenant usage counters."""
+import pytest
+from sqlalchemy import select
+
+from app.models import Asset, Rendition, Tenant, TenantMetrics
+from app.tenant_metrics import (
+    record_usage, record_renditions, reconcile_tenant_metrics, tenant_metrics_query, tenant_counters_query,
+)
+
+
+def _all_tenants():
+    return select(Tenant.id, Tenant.name).subquery()
+
+
+@pytest.mark.asyncio
+async def test_counters_track_writes_and_roll_back_with_them(session_factory):
+    """Test that deltas accumulate and vanish with a rolled-back transaction."""
+    async with session_factory() as session:
+        tenant = Tenant(name="a")
+        session.add(tenant)
+        await session.flush()
+        asset = Asset(tenant_id=tenant.id, filename="a.jpg", content_hash="a", perceptual_hash="0" * 16,
+                      original_bytes=1000, width=10, height=10)
+        session.add(asset)
+        await session.flush()
+        await record_usage(session, tenant.id, assets=1, bytes=1000)
+        await session.commit()
+
+        rendition = Rendition(asset_id=asset.id, preset="card", format="jpeg", file_path="r.jpg",
+                              bytes=50, width=10, height=10)
+        session.add(rendition)
+        await record_renditions(session, tenant.id, [rendition])
+        await session.commit()
+
+        session.add(Rendition(asset_id=asset.id, preset="thumb", format="jpeg", file_path="t.jpg",
+                              bytes=5, width=5, height=5))
+        await record_usage(session, tenant.id, renditions=1, bytes=5)
+        tenant_id = tenant.id
+        await session.rollback()
+
+        counted = (await session.execute(tenant_counters_query(_all_tenants()))).one()
+        exact = (await session.execute(tenant_metrics_query(_all_tenants()))).one()
+        assert tuple(counted) == tuple(exact) == (tenant_id, "a", 1, 1, 1050)
+
+
+@pytest.mark.asyncio
+async def test_reconcile_fixes_drift_and_missing_counters(session_factory):
+    """Test that reconciliation corrects wrong counters and creates missing ones."""
+    async with session_factory() as session:
+        drifted, missing, empty = Tenant(name="drifted"), Tenant(name="missing"), Tenant(name="empty")
+        session.add_all([drifted, missing, empty])
+        await session.flush()
+        for i, tenant in enumerate((drifted, missing)):
+            session.add(Asset(tenant_id=tenant.id, filename=f"{i}.jpg", content_hash=str(i),
+                              perceptual_hash="0" * 16, original_bytes=700, width=10, height=10))
+        session.add(TenantMetrics(tenant_id=drifted.id, asset_count=5, rendition_count=2, total_bytes=1))
+        await session.commit()
+
+        assert await reconcile_tenant_metrics(session, batch_size=2) == 3
+        counted = (await session.execute(tenant_counters_query(_all_tenants()))).all()
+        exact = (await session.execute(tenant_metrics_query(_all_tenants()))).all()
+        assert [tuple(r) for r in counted] == [tuple(r) for r in exact]
+        assert await reconcile_tenant_metrics(session) == 0
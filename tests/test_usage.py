@@ -0,0 +1,111 @@
+"""Tests for buffered, time-bucketed usage rollups."""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.executor import CpuMeter, metering, run_cpu
+from app.models import Tenant, UsageRollup
+from app.usage import UsageBuffer, downsample, usage_buckets, hourly_cutoff, DAY, HOUR
+
+NOON = datetime(2024, 3, 5, 12, 30, tzinfo=timezone.utc)
+
+
+async def _tenant(session) -> int:
+    tenant = Tenant(name="t")
+    session.add(tenant)
+    await session.commit()
+    return tenant.id
+
+
+@pytest.mark.asyncio
+async def test_buffer_aggregates_per_hour_and_flushes_into_existing_rows(session_factory):
+    """Test that increments merge in memory per hour and add onto rows written by earlier flushes."""
+    async with session_factory() as session:
+        tenant_id = await _tenant(session)
+        buffer = UsageBuffer()
+        buffer.add(tenant_id, uploads=1, bytes=100, at=NOON)
+        buffer.add(tenant_id, renditions=2, bytes=20, cpu_seconds=0.5, at=NOON + timedelta(minutes=10))
+        buffer.add(tenant_id, uploads=1, at=NOON + timedelta(hours=1))
+        buffer.add(tenant_id)  # nothing to record
+        assert len(buffer) == 2
+        assert await buffer.flush(session) == 2
+        assert len(buffer) == 0
+
+        buffer.add(tenant_id, uploads=1, bytes=5, at=NOON)
+        assert await buffer.flush(session) == 1
+
+        rows = (await session.execute(select(UsageRollup).order_by(UsageRollup.bucket_start))).scalars().all()
+        assert [(r.granularity, r.uploads, r.renditions, r.bytes_stored, r.cpu_seconds) for r in rows] == [
+            (HOUR, 2, 2, 125, 0.5),
+            (HOUR, 1, 0, 0, 0.0),
+        ]
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_increments(session_factory):
+    """Test that a flush that fails puts its increments back for the next flush."""
+    buffer = UsageBuffer()
+    buffer.add(1, uploads=3, at=NOON)
+    async with session_factory() as session:
+        async def fail():
+            raise RuntimeError("database unavailable")
+        session.commit = fail
+        with pytest.raises(RuntimeError):
+            await buffer.flush(session)
+    buffer.add(1, uploads=1, at=NOON)
+    async with session_factory() as session:
+        await buffer.flush(session)
+        row = (await session.execute(select(UsageRollup))).scalar_one()
+        assert row.uploads == 4
+
+
+@pytest.mark.asyncio
+async def test_downsample_folds_old_hours_into_days(session_factory):
+    """Test that hourly buckets before the cutoff become daily ones and ranges still add up."""
+    async with session_factory() as session:
+        tenant_id = await _tenant(session)
+        buffer = UsageBuffer()
+        for hour in range(48):
+            buffer.add(tenant_id, uploads=1, bytes=10, at=NOON + timedelta(hours=hour))
+        await buffer.flush(session)
+        day_range = (NOON - timedelta(days=1), NOON + timedelta(days=3))
+        before = await usage_buckets(session, tenant_id, *day_range, DAY)
+
+        # The first two days get folded, the third stays hourly
+        cutoff = datetime(2024, 3, 7, tzinfo=timezone.utc)
+        assert await downsample(session, cutoff, batch_size=5) == 12 + 24
+        assert await downsample(session, cutoff) == 0
+
+        after = await usage_buckets(session, tenant_id, *day_range, DAY)
+        assert after == before
+        assert [(b["bucket_start"].day, b["uploads"]) for b in after] == [(5, 12), (6, 24), (7, 12)]
+        hours = await usage_buckets(session, tenant_id, *day_range, HOUR)
+        assert len(hours) == 12
+        granularities = (await session.execute(select(UsageRollup.granularity))).scalars().all()
+        assert granularities.count(DAY) == 2
+
+
+def test_hourly_cutoff_is_a_day_boundary():
+    """Test that downsampling never splits a day."""
+    cutoff = hourly_cutoff(NOON)
+    assert cutoff < NOON and (cutoff.hour, cutoff.minute) == (0, 0)
+
+
+def test_metering_charges_pool_cpu_time():
+    """Test that run_cpu calls inside metering() add their thread CPU time to the meter."""
+    def spin(seconds):
+        deadline = time.thread_time() + seconds
+        while time.thread_time() < deadline:
+            pass
+
+    async def run():
+        cpu = CpuMeter()
+        with metering(cpu):
+            await asyncio.gather(run_cpu(spin, 0.05), run_cpu(spin, 0.05))
+        await run_cpu(spin, 0.05)  # outside the block: not charged
+        return cpu.seconds
+
+    assert 0.1 <= asyncio.run(run()) < 0.15
@@ -0,0 +1,110 @@
+"""Tests for image processing utilities."""
+import io
+
+import numpy as np
+from PIL import Image
+
+from app.utils import choose_quality, compute_psnr, save_rendition
+
+
+def _textured_image(size=(400, 300)):
+    """Create a noisy test image that compresses poorly."""
+    rng = np.random.RandomState(0)
+    pixels = rng.randint(0, 255, (size[1], size[0], 3)).astype(np.uint8)
+    return Image.fromarray(pixels)
+
+
+def test_choose_quality_byte_budget():
+    """Test that the byte budget is respected."""
+    image = _textured_image()
+    max_bytes = 40 * 1024
+    quality, content = choose_quality(image, "JPEG", max_bytes=max_bytes)
+    assert len(content) <= max_bytes
+    assert 40 <= quality < 95
+    # Highest quality that fits: one step up would not (allowing probe slack)
+    assert len(save_rendition(image, quality=min(quality + 10, 95))) > max_bytes
+
+
+def test_choose_quality_psnr_target():
+    """Test that flat images get low quality and still meet the PSNR target."""
+    flat = Image.new("RGB", (400, 300), color="white")
+    quality, content = choose_quality(flat, "JPEG", target_psnr=38)
+    assert quality == 40
+    decoded = Image.open(io.BytesIO(content))
+    assert compute_psnr(flat, decoded) >= 38
+
+
+def test_choose_quality_psnr_verified_at_full_size():
+    """Test that fine detail the downsampled probe can't see still meets the PSNR target."""
+    rng = np.random.RandomState(1)
+    # 1px grain on grey: flat at probe size, costly to encode at full size
+    grain = (rng.randint(0, 2, (1024, 1024, 1)) * 40).astype(np.uint8)
+    image = Image.fromarray(np.full((1024, 1024, 3), 128, np.uint8) + grain)
+    quality, content = choose_quality(image, "JPEG", target_psnr=38)
+    assert quality > 40
+    assert compute_psnr(image, Image.open(io.BytesIO(content))) >= 38
+
+
+def test_bytes_mode_without_budget_uses_fixed_quality(monkeypatch):
+    """Test that presets without max_bytes fall back to the fixed quality in bytes mode."""
+    from app.db import settings
+    from app.renditions import encode_rendition
+
+    monkeypatch.setattr(settings, "quality_mode", "bytes")
+    config = {"size": (100, 100), "fit": True, "max_bytes": None, "profile": "fast"}
+    content, quality = encode_rendition(_textured_image((100, 75)), "custom", "jpeg", config)
+    assert quality == 85
+    assert content == save_rendition(_textured_image((100, 75)), quality=85, profile="fast")
+
+
+def test_choose_quality_fixed():
+    """Test that no target means max quality."""
+    image = _textured_image((50, 50))
+    quality, content = choose_quality(image, "JPEG")
+    assert quality == 95
+    assert content == save_rendition(image, quality=95)
+
+
+def test_encoder_profiles():
+    """Test that encoder profiles control progressive/optimize output."""
+    image = _textured_image((200, 150))
+    fast = save_rendition(image, quality=85, profile="fast")
+    balanced = save_rendition(image, quality=85, profile="balanced")
+    smallest = save_rendition(image, quality=85, profile="smallest")
+
+    assert not Image.open(io.BytesIO(fast)).info.get("progressive")
+    assert Image.open(io.BytesIO(smallest)).info.get("progressive")
+    # Huffman optimization only ever shrinks the file
+    assert len(balanced) <= len(fast)
+
+
+def test_encoder_profiles_chroma_subsampling():
+    """Test that zoom keeps full chroma resolution while small presets subsample it."""
+    from PIL import JpegImagePlugin
+    from app.utils import RENDITION_PRESETS
+
+    image = _textured_image((200, 150))
+    # get_sampling: 0 = 4:4:4, 2 = 4:2:0
+    expected = {"thumb": 2, "card": 2, "zoom": 0}
+    for preset, sampling in expected.items():
+        content = save_rendition(image, quality=85, profile=RENDITION_PRESETS[preset]["profile"])
+        assert JpegImagePlugin.get_sampling(Image.open(io.BytesIO(content))) == sampling
+
+
+def test_render_preset_measures_output():
+    """Test that each encoded format carries its PSNR and perceptual hash."""
+    from app.hashing import compute_perceptual_hash
+    from app.renditions import render_preset
+
+    image = _textured_image((800, 600))
+    rendition_image, encoded = render_preset(image, "card", ("jpeg",))
+    result = encoded["jpeg"]
+
+    decoded = Image.open(io.BytesIO(result.content))
+    assert result.psnr_db == compute_psnr(rendition_image, decoded)
+    assert result.perceptual_hash == compute_perceptual_hash(decoded)
+
+    # Lossless round trips are capped instead of infinite
+    flat = Image.new("RGB", (400, 300), color="white")
+    _, encoded = render_preset(flat, "card", ("jpeg",))
+    assert encoded["jpeg"].psnr_db <= 100.0
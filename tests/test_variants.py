@@ -0,0 +1,83 @@
+"""Tests for dynamic resize variant validation and source selection."""
+import asyncio
+
+import pytest
+
+from app import variants
+from app.storage import StorageAdapter
+from app.variants import validate_spec, required_source_size, VariantSpec, VariantCache
+
+
+def test_validate_spec_allow_list():
+    """Test that only allow-listed parameters are accepted."""
+    spec = validate_spec(320, None)
+    assert spec == VariantSpec(width=320, height=None, fit="contain", format="jpeg", quality=85)
+    assert spec.cache_name(7) == "7_w320_h0_contain_q85.jpg"
+
+    with pytest.raises(ValueError):
+        validate_spec(333, None)  # Not in allow-list
+    with pytest.raises(ValueError):
+        validate_spec(None, None)
+    with pytest.raises(ValueError):
+        validate_spec(320, None, fit="cover")  # cover needs both dimensions
+    with pytest.raises(ValueError):
+        validate_spec(320, None, format="gif")
+    with pytest.raises(ValueError):
+        validate_spec(320, None, quality=83)
+
+
+def test_required_source_size():
+    """Test minimum source size for contain and cover fits."""
+    # 1600x900 into a 320px wide box
+    assert required_source_size(VariantSpec(320, None), (1600, 900)) == (320, 180)
+    # Cover 320x320 needs the short edge to reach 320
+    assert required_source_size(VariantSpec(320, 320, fit="cover"), (1600, 900)) == (569, 320)
+    # Never larger than the original
+    assert required_source_size(VariantSpec(2048, None), (1600, 900)) == (1600, 900)
+
+
+def _cache(monkeypatch, tmp_path, max_bytes):
+    storage = StorageAdapter(str(tmp_path))
+    monkeypatch.setattr(variants, "storage", storage)
+    return VariantCache(str(storage.local_path("variants")), max_bytes), storage
+
+
+def test_variant_cache_loads_existing_files_in_thread(monkeypatch, tmp_path):
+    """Test that load() indexes stored variants, skipping files still being written."""
+    cache, storage = _cache(monkeypatch, tmp_path, 100)
+    (tmp_path / "variants" / "1_a.jpg").write_bytes(b"123")
+    (tmp_path / "variants" / ".1_b.jpg.tmp").write_bytes(b"12345")
+
+    asyncio.run(cache.load())
+    assert cache.total_bytes == 3
+    assert cache.acquire("1_a.jpg") == "variants/1_a.jpg"
+    assert cache.acquire("1_b.jpg") is None
+
+
+def test_variant_cache_defers_deleting_pinned_variants(monkeypatch, tmp_path):
+    """Test that a variant evicted while being served keeps its file until released."""
+    cache, storage = _cache(monkeypatch, tmp_path, 10)
+    cache.put("1_a.jpg", b"aaaaaa")
+    assert cache.acquire("1_a.jpg") == "variants/1_a.jpg"
+
+    cache.put("1_b.jpg", b"bbbbbb")  # over budget: evicts 1_a.jpg
+    assert cache.total_bytes == 6
+    assert storage.file_exists("variants/1_a.jpg")
+    cache.release("1_a.jpg")
+    assert not storage.file_exists("variants/1_a.jpg")
+
+
+def test_variant_cache_removes_variants_of_assets(monkeypatch, tmp_path):
+    """Test listing and removing the variants of given assets."""
+    cache, storage = _cache(monkeypatch, tmp_path, 100)
+    cache.put("7_w320.jpg", b"1234")
+    cache.put("7_w640.jpg", b"12345678")
+    cache.put("8_w320.jpg", b"12")
+
+    assert cache.asset_ids() == {7, 8}
+    found = cache.variants_of({7})
+    assert sorted(found) == [("7_w320.jpg", 4), ("7_w640.jpg", 8)]
+    assert cache.remove(name for name, _ in found) == 12
+    assert cache.asset_ids() == {8}
+    assert not storage.file_exists("variants/7_w320.jpg")
+    assert storage.file_exists("variants/8_w320.jpg")
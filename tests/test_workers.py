@@ -0,0 +1,142 @@
+"""Tests for job retries in the worker."""
+import io
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from PIL import Image
+from sqlalchemy import select
+
+from app import workers
+from app.api.presets import PRESET_NAME
+from app.models import Asset, Job, Rendition, RenditionPreset, Tenant
+from app.presets import PresetRegistry
+from app.pyramid import PYRAMID_PRESET
+from app.storage import storage
+
+
+@pytest.mark.asyncio
+async def test_failed_job_is_pending_during_backoff_and_requeued(session_factory, monkeypatch):
+    """Test that a retried job is pending while it waits, but not claimed early, and goes back on its Redis queue."""
+    events = []
+    async with session_factory() as session:
+        # Asset 999 does not exist, so the job fails
+        session.add(Job(asset_id=999, preset="thumb", status="pending", max_retries=3))
+        await session.commit()
+
+    async def fake_sleep(seconds):
+        async with session_factory() as other:
+            # Another worker polling or popping the job during the backoff
+            await workers.process_job(1, other)
+            job = await other.get(Job, 1)
+            events.append(("sleep", seconds, job.status, job.retry_count))
+
+    async def fake_enqueue(job_ids, queue_name=None):
+        events.append(("enqueue", job_ids, queue_name))
+
+    monkeypatch.setattr(workers.asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(workers, "enqueue_jobs", fake_enqueue)
+    async with session_factory() as session:
+        await workers.process_job(1, session, workers.BACKFILL_QUEUE_NAME)
+        job = await session.get(Job, 1)
+
+    assert (job.status, job.retry_count) == ("pending", 1)
+    assert events == [("sleep", 2, "pending", 1), ("enqueue", [1], workers.BACKFILL_QUEUE_NAME)]
+
+    # Once the backoff is over the job can be claimed again
+    async with session_factory() as session:
+        job = await session.get(Job, 1)
+        job.not_before = datetime.now(timezone.utc) - timedelta(seconds=1)
+        await session.commit()
+        await workers.process_job(1, session)
+        job = await session.get(Job, 1)
+    assert job.retry_count == 2
+
+
+@pytest.mark.asyncio
+async def test_tenant_preset_named_pyramid_is_rendered(session_factory, monkeypatch, tmp_path):
+    """Test that a tenant preset called "pyramid" gets a rendition, not a tile pyramid."""
+    monkeypatch.setattr(storage, "base_path", tmp_path)
+    for name in ("originals", "renditions"):
+        (tmp_path / name).mkdir()
+    buffer = io.BytesIO()
+    Image.new("RGB", (400, 300), "red").save(buffer, format="JPEG")
+    async with session_factory() as session:
+        tenant = Tenant(name="t")
+        session.add(tenant)
+        await session.flush()
+        asset = Asset(tenant_id=tenant.id, filename="p.jpg", content_hash="pyramid-test", perceptual_hash="0" * 16,
+                      original_bytes=len(buffer.getvalue()), width=400, height=300)
+        asset.original_path = storage.save_original(buffer.getvalue(), asset.filename, asset.content_hash)
+        session.add(asset)
+        await session.flush()
+        session.add(RenditionPreset(tenant_id=tenant.id, name="pyramid", width=200, height=200))
+        session.add(Job(asset_id=asset.id, preset="pyramid", status="pending", max_retries=3))
+        await session.commit()
+
+    async def no_pyramid(asset):
+        raise AssertionError("tile pyramid built for a preset job")
+
+    monkeypatch.setattr(workers, "build_pyramid", no_pyramid)
+    monkeypatch.setattr(workers, "preset_registry", PresetRegistry(ttl=60))
+    async with session_factory() as session:
+        await workers.process_job(1, session)
+        job = await session.get(Job, 1)
+        presets = (await session.execute(select(Rendition.preset))).scalars().all()
+
+    assert job.status == "completed"
+    assert set(presets) == {"pyramid"}
+    assert not PRESET_NAME.match(PYRAMID_PRESET)
+
+
+@pytest.mark.asyncio
+async def test_on_demand_render_losing_to_worker_keeps_its_file(session_factory, monkeypatch, tmp_path):
+    """Test that an on-demand render that loses the insert race leaves the worker's file and row alone."""
+    from app import renditions
+
+    monkeypatch.setattr(storage, "base_path", tmp_path)
+    for name in ("originals", "renditions"):
+        (tmp_path / name).mkdir()
+    buffer = io.BytesIO()
+    Image.new("RGB", (400, 300), "red").save(buffer, format="JPEG")
+    async with session_factory() as session:
+        tenant = Tenant(name="t")
+        session.add(tenant)
+        await session.flush()
+        asset = Asset(tenant_id=tenant.id, filename="r.jpg", content_hash="race-test", perceptual_hash="0" * 16,
+                      original_bytes=len(buffer.getvalue()), width=400, height=300)
+        asset.original_path = storage.save_original(buffer.getvalue(), asset.filename, asset.content_hash)
+        session.add(asset)
+        await session.commit()
+        asset_id = asset.id
+
+    build = renditions.build_rendition
+
+    def build_while_worker_commits(*args, **kwargs):
+        rendition = build(*args, **kwargs)
+        # The worker stores the same rendition between our render and our commit
+        worker_file = storage.save_rendition(b"worker bytes", "thumb", asset_id)
+        worker.update(file_path=worker_file)
+        return rendition
+
+    async def commit_worker_row():
+        async with session_factory() as other:
+            other.add(Rendition(asset_id=asset_id, preset="thumb", format="jpeg", file_path=worker["file_path"],
+                                bytes=12, width=100, height=75))
+            await other.commit()
+
+    worker = {}
+    record = renditions.record_renditions
+
+    async def record_after_worker(*args):
+        await commit_worker_row()
+        await record(*args)
+
+    monkeypatch.setattr(renditions, "AsyncSessionLocal", session_factory)
+    monkeypatch.setattr(renditions, "preset_registry", PresetRegistry(ttl=60))
+    monkeypatch.setattr(renditions, "build_rendition", build_while_worker_commits)
+    monkeypatch.setattr(renditions, "record_renditions", record_after_worker)
+    stored = await renditions._generate(asset_id, "thumb", "jpeg")
+
+    assert stored.file_path == worker["file_path"] and stored.bytes == 12
+    assert storage.read_file(worker["file_path"]) == b"worker bytes"
+    assert [p.name for p in (tmp_path / "renditions").iterdir()] == [worker["file_path"].split("/")[-1]]